@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Measure /search throughput against a single API worker at rising concurrency
+
+Every request uses a unique query so the embedding and response caches do not
+hide upstream latency. Run it against `fake_upstream.py` to avoid API costs:
+
+  python fake_upstream.py &
+  AIMLAPI_BASE_URL=http://localhost:9000/v1 AIMLAPI_KEY=fake uvicorn main:app --workers 1 &
+  python benchmark_concurrency.py --url http://localhost:8000 --levels 1,4,16 --requests 32
+
+With a non-blocking request path, throughput should grow roughly linearly with
+concurrency until the upstream or Mongo saturates. A blocking path stays flat.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+
+
+async def run_level(client: httpx.AsyncClient, url: str, concurrency: int, total: int, condition: str = None):
+    """
+    Send `total` searches with at most `concurrency` in flight
+
+    Returns:
+        (elapsed seconds, per-request latencies in ms, error count)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            payload = {"query": f"bacteria response to spaceflight {uuid.uuid4().hex}", "condition": condition}
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{url}/search", json=payload)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - start, latencies, errors
+
+
+async def main_async(args) -> int:
+    levels = [int(level) for level in args.levels.split(",")]
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        baseline = None
+        print(f"{'concurrency':>11}  {'req/s':>8}  {'speedup':>8}  {'p50 ms':>9}  {'max ms':>9}  {'errors':>6}")
+        for level in levels:
+            elapsed, latencies, errors = await run_level(client, args.url, level, args.requests, args.condition)
+            throughput = args.requests / elapsed
+            baseline = baseline or throughput
+            print(f"{level:>11}  {throughput:>8.2f}  {throughput / baseline:>7.2f}x  "
+                  f"{statistics.median(latencies):>9.1f}  {max(latencies):>9.1f}  {errors:>6}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="requests per level")
+    parser.add_argument("--condition", default=None, help="optional condition filter")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
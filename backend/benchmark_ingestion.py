@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Benchmark ingestion stages on local PDFs, without API or MongoDB calls
+
+Text comes from the PDFs in `--pdf-folder` (or a synthetic document when the
+folder has none), so only CPU-bound work is measured. `context` compares the
+size of the LLM prompt's context block built from these chunks, before and
+after token-budgeted packing.
+
+Usage:
+  python benchmark_ingestion.py chunking --pdf-folder ./pdfs --repeat 3
+  python benchmark_ingestion.py tagger --pdf-folder ./pdfs --corpus-mb 50
+  python benchmark_ingestion.py context --pdf-folder ./pdfs --queries 200 --budgets 600,700,1200
+"""
+
+import argparse
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import tiktoken
+
+from chunking import ChunkingEngine
+from context_builder import TokenCounter, load_tokenizer, pack_context
+from pdf_processor import PDFProcessor
+from tagger import ORGANISM_ALIASES, default_tagger
+
+SYNTHETIC_SENTENCES = [
+    "Escherichia coli cultures were grown aboard the International Space Station for 14 days.",
+    "Gene expression was measured with RNA-seq and compared with ground controls.",
+    "Simulated microgravity increased biofilm formation and antibiotic resistance.",
+    "Arabidopsis thaliana seedlings showed altered root gravitropism under clinorotation.",
+    "Ionizing radiation exposure induced DNA repair pathways in Deinococcus radiodurans.",
+    "These findings suggest that spaceflight alters stress responses across taxa.",
+]
+
+
+def load_documents(pdf_folder: str, max_files: int) -> List[str]:
+    """
+    Extract and clean text from local PDFs, or build a synthetic document
+
+    Args:
+        pdf_folder: Folder with PDF files
+        max_files: Maximum number of PDFs to read
+
+    Returns:
+        List of cleaned document texts
+    """
+    processor = PDFProcessor(pdf_folder)
+    pdf_files = sorted(Path(pdf_folder).glob("*.pdf"))[:max_files] if Path(pdf_folder).exists() else []
+    documents = [text for text in (processor.extract_text_from_pdf(path) for path in pdf_files) if text]
+
+    if not documents:
+        print(f"No PDFs with text in {pdf_folder}, using a synthetic 200k-character document")
+        rng = random.Random(0)
+        text = ""
+        while len(text) < 200000:
+            text += rng.choice(SYNTHETIC_SENTENCES) + " "
+        documents = [text.strip()]
+
+    return documents
+
+
+def legacy_split(tokenizer, text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """
+    Previous chunker: fixed token windows decoded back to text one by one
+    """
+    tokens = tokenizer.encode(text)
+    chunks = []
+    start_idx = 0
+    while start_idx < len(tokens):
+        end_idx = min(start_idx + chunk_size, len(tokens))
+        chunk_text = tokenizer.decode(tokens[start_idx:end_idx])
+        if len(chunk_text.strip()) >= 50:
+            chunks.append(chunk_text.strip())
+        start_idx += chunk_size - chunk_overlap
+    return chunks
+
+
+def legacy_document(tokenizer, text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """
+    Previous per-document work: one encode for the token count stat, one for chunking
+    """
+    len(tokenizer.encode(text))
+    return legacy_split(tokenizer, text, chunk_size, chunk_overlap)
+
+
+LEGACY_ORGANISM_PATTERNS = [
+    r'([A-Z][a-z]+ [a-z]+)',
+    r'([A-Z][a-z]+ coli)',
+    r'(E\.? coli)',
+    r'(Saccharomyces cerevisiae)',
+    r'(Drosophila melanogaster)',
+    r'(Arabidopsis thaliana)',
+    r'(Caenorhabditis elegans)',
+    r'(Danio rerio)',
+    r'(Mus musculus)',
+]
+
+LEGACY_CONDITION_PATTERNS = [
+    r'(microgravity)', r'(radiation)', r'(temperature)', r'(hypoxia)', r'(hypergravity)',
+    r'(space environment)', r'(zero gravity)', r'(cosmic radiation)', r'(thermal stress)', r'(oxidative stress)',
+]
+
+
+def legacy_infer(text: str) -> Dict[str, str]:
+    """
+    Previous inference: up to 19 uncompiled IGNORECASE searches, first match wins
+    """
+    organism_name = "Unknown"
+    condition = "Not specified"
+    for pattern in LEGACY_ORGANISM_PATTERNS:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            organism_name = match.group(1)
+            break
+    for pattern in LEGACY_CONDITION_PATTERNS:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            condition = match.group(1).lower()
+            break
+    return {"organism_name": organism_name, "condition": condition}
+
+
+def legacy_scan(text: str) -> Dict[str, int]:
+    """
+    The previous patterns run over the whole text, as per-chunk tagging would need
+    """
+    return {
+        pattern: len(re.findall(pattern, text, re.IGNORECASE))
+        for pattern in LEGACY_ORGANISM_PATTERNS + LEGACY_CONDITION_PATTERNS
+    }
+
+
+def time_runs(name: str, repeat: int, documents: List[str], run: Callable[[str], List]) -> List[List]:
+    """
+    Time a chunking function over all documents and print throughput
+
+    Returns:
+        Output of the last run for each document
+    """
+    durations = []
+    outputs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = [run(text) for text in documents]
+        durations.append(time.perf_counter() - start)
+
+    best = min(durations)
+    total_chars = sum(len(text) for text in documents)
+    chunks = sum(len(output) for output in outputs)
+    print(f"{name:<28} best {best * 1000:>9.1f} ms  median {statistics.median(durations) * 1000:>9.1f} ms  "
+          f"{total_chars / best / 1e6:>6.2f} MB/s  {chunks:>6} chunks")
+    return outputs
+
+
+def bench_chunking(args, documents: List[str]):
+    tokenizer = tiktoken.get_encoding("cl100k_base")
+
+    def run_legacy(text):
+        return legacy_document(tokenizer, text, args.chunk_size, args.chunk_overlap)
+
+    time_runs("legacy encode/decode", args.repeat, documents, run_legacy)
+
+    for boundary in ("token", "sentence"):
+        def run_engine(text, boundary=boundary):
+            engine = ChunkingEngine(tokenizer, args.chunk_size, args.chunk_overlap, boundary)
+            return [window for window in engine.chunk_text(text) if len(window.text.strip()) >= 50]
+
+        outputs = time_runs(f"engine ({boundary})", args.repeat, documents, run_engine)
+        windows = [window for output in outputs for window in output]
+        if windows:
+            sentence_ends = sum(1 for window in windows if window.text.rstrip()[-1:] in ".!?")
+            print(f"{'':<28} {sentence_ends / len(windows):.0%} of chunks end at a sentence boundary")
+
+
+def bench_tagger(args, documents: List[str]):
+    # Replicate the documents up to the requested corpus size, cut into chunk-sized pieces
+    target = int(args.corpus_mb * 1e6)
+    chunks: List[str] = []
+    size = 0
+    while size < target:
+        for text in documents:
+            for start in range(0, len(text), args.chunk_chars):
+                chunks.append(text[start:start + args.chunk_chars])
+                size += len(chunks[-1])
+    print(f"Tagging {len(chunks)} chunks of up to {args.chunk_chars} characters ({size / 1e6:.1f} MB)")
+
+    # First match only (what the old per-document inference did) vs every mention
+    legacy = [output[0] for output in time_runs("legacy first match", args.repeat, chunks, lambda chunk: [legacy_infer(chunk)])]
+    time_runs("legacy full scan", args.repeat, chunks, lambda chunk: [legacy_scan(chunk)])
+    tagged = [output[0] for output in time_runs("compiled tagger", args.repeat, chunks, lambda chunk: [default_tagger.tag(chunk)])]
+
+    known = {name.lower() for name in ORGANISM_ALIASES.values()} | set(ORGANISM_ALIASES)
+    guessed = sum(1 for result in legacy if result["organism_name"] != "Unknown" and result["organism_name"].lower() not in known)
+    organism_tags = sum(len(tags["organism_tags"]) for tags in tagged)
+    condition_tags = sum(len(tags["condition_tags"]) for tags in tagged)
+    print(f"legacy: {guessed}/{len(legacy)} chunks labelled with a generic two-word match that is not a known organism")
+    print(f"tagger: {organism_tags} organism tags and {condition_tags} condition tags over {len(tagged)} chunks")
+
+
+def legacy_context(chunks: List[Dict]) -> str:
+    """
+    Previous LLM context: the first 3 chunks, each cut to 1000 characters
+    """
+    context_parts = []
+    for i, chunk in enumerate(chunks[:3]):
+        content = chunk.get("content", "").strip()
+        if not content or len(content) < 10:
+            continue
+        if len(content) > 1000:
+            content = content[:1000] + "..."
+        context_parts.append(
+            f"--- Chunk {i+1} ---\n"
+            f"Organism: {chunk.get('organism_name', 'Unknown')}\n"
+            f"Condition: {chunk.get('condition', 'Not specified')}\n"
+            f"Content: {content}"
+        )
+    return "\n\n".join(context_parts)
+
+
+def sample_results(rng: random.Random, chunks: List[Dict], candidates: int) -> List[Dict]:
+    """
+    Fake search results: a hit with its neighbours (as overlapping chunks rank together) and random others
+    """
+    hit = rng.randrange(len(chunks))
+    picked = [index for index in (hit, hit + 1, hit - 1) if 0 <= index < len(chunks)]
+    while len(picked) < min(candidates, len(chunks)):
+        index = rng.randrange(len(chunks))
+        if index not in picked:
+            picked.append(index)
+    return [{**chunks[index], "similarity": 0.9 - 0.02 * rank} for rank, index in enumerate(picked)]
+
+
+def bench_context(args, documents: List[str]):
+    tokenizer = tiktoken.get_encoding("cl100k_base")
+    chunks = []
+    for number, text in enumerate(documents):
+        engine = ChunkingEngine(tokenizer, args.chunk_size, args.chunk_overlap, "sentence")
+        for chunk_index, window in enumerate(engine.chunk_text(text)):
+            if len(window.text.strip()) >= 50:
+                chunks.append({
+                    "_id": len(chunks), "filename": f"document-{number}.pdf", "content": window.text.strip(),
+                    "chunk_index": chunk_index, "start_char": window.start_char, "end_char": window.end_char,
+                    "organism_name": "Escherichia coli", "condition": "microgravity",
+                })
+
+    counter = TokenCounter(load_tokenizer(args.model))
+    if counter.tokenizer is None:
+        print(f"No tokenizer for {args.model}: token counts below are estimated at 4 characters per token")
+    # The system prompt and query template are the same in both versions; only the context block differs
+    print(f"Context tokens over {args.queries} searches of {args.candidates} candidates ({len(chunks)} chunks, {args.model})")
+    print(f"{'variant':<28} {'mean':>7} {'p95':>7} {'max':>7} {'passages':>9}")
+
+    def report(name: str, tokens: List[int], passages: List[int]):
+        ordered = sorted(tokens)
+        print(f"{name:<28} {statistics.mean(tokens):>7.0f} {ordered[int(0.95 * (len(ordered) - 1))]:>7} "
+              f"{ordered[-1]:>7} {statistics.mean(passages):>9.1f}")
+
+    rng = random.Random(0)
+    searches = [sample_results(rng, chunks, args.candidates) for _ in range(args.queries)]
+    legacy = [legacy_context(results) for results in searches]
+    report("legacy 3 x 1000 chars", [counter.count(context) for context in legacy],
+           [context.count("--- Chunk ") for context in legacy])
+    for budget in (int(value) for value in args.budgets.split(",")):
+        packed = [pack_context(results, counter, budget, passage_tokens=args.passage_tokens) for results in searches]
+        report(f"packed, budget {budget}", [result["tokens"] for result in packed],
+               [result["passages"] for result in packed])
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    "chunking": bench_chunking,
+    "context": bench_context,
+    "tagger": bench_tagger,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--pdf-folder", default="./pdfs", help="folder with sample PDFs")
+    parser.add_argument("--max-files", type=int, default=20, help="maximum number of PDFs to read")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per variant (best and median are reported)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="tokens per chunk")
+    parser.add_argument("--chunk-overlap", type=int, default=200, help="tokens shared by consecutive chunks")
+    parser.add_argument("--corpus-mb", type=float, default=20, help="tagger: corpus size, documents are repeated to reach it")
+    parser.add_argument("--chunk-chars", type=int, default=4000, help="tagger: characters per chunk")
+    parser.add_argument("--queries", type=int, default=200, help="context: searches sampled from the chunks")
+    parser.add_argument("--candidates", type=int, default=10, help="context: results per search")
+    parser.add_argument("--budgets", default="600,700,1200", help="context: comma-separated token budgets")
+    parser.add_argument("--passage-tokens", type=int, default=250, help="context: token cap per passage")
+    parser.add_argument("--model", default="gpt-4o", help="context: model whose tokenizer counts tokens")
+    args = parser.parse_args()
+
+    documents = load_documents(args.pdf_folder, args.max_files)
+    print(f"Loaded {len(documents)} documents ({sum(len(text) for text in documents) / 1e6:.2f} M characters)")
+
+    BENCHMARKS[args.benchmark](args, documents)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Benchmark chunk retrieval strategies against the live MongoDB corpus
+
+Query vectors are sampled from stored chunk embeddings (with a little noise),
+so no embedding API calls are made.
+
+Usage:
+  python benchmark_retrieval.py pipeline --queries 20 --limit 5
+  python benchmark_retrieval.py ann --queries 200 --limit 10 --nprobe 1,2,4,8,16,32
+  python benchmark_retrieval.py quantized --queries 200 --limit 10
+  python benchmark_retrieval.py filtered --queries 50
+  python benchmark_retrieval.py matryoshka --queries 200 --limit 10 --dims 256,512 --candidates 100,300,1000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+import bson
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from embedding_codec import STORAGE_FORMATS, decode_embedding, encode_embedding
+from vector_index import (
+    IVFIndex, VectorIndex, aggregation_similarity_pipeline, normalize_rows, normalize_vector, row_count
+)
+
+
+def get_collection():
+    """
+    Connect to the configured MongoDB collection
+    """
+    load_dotenv()
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    db_name = os.getenv("MONGODB_DB_NAME", "nasa_hackathon")
+    collection_name = os.getenv("MONGODB_COLLECTION_NAME", "organism_data")
+    return MongoClient(mongodb_url)[db_name][collection_name]
+
+
+def sample_queries(index: VectorIndex, count: int, noise: float = 0.05, seed: int = 0) -> List[List[float]]:
+    """
+    Sample query vectors near stored chunk embeddings
+
+    Args:
+        index: Loaded vector index
+        count: Number of queries
+        noise: Standard deviation of the Gaussian noise added to each sample
+        seed: Random seed
+
+    Returns:
+        List of query vectors
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(index), size=count, replace=len(index) < count)
+    queries = index.matrix[rows] + rng.normal(0, noise, size=(count, index.dimension)).astype(np.float32)
+    return [normalize_vector(q).tolist() for q in queries]
+
+
+def time_calls(name: str, queries: List[List[float]], run: Callable[[List[float]], List]) -> List[List]:
+    """
+    Time a retrieval function over all queries and print latency stats
+
+    Returns:
+        Result ids for each query
+    """
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(run(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<24} mean {statistics.mean(latencies):9.2f} ms   p50 {statistics.median(latencies):9.2f} ms   p95 {p95:9.2f} ms")
+    return results
+
+
+def overlap(expected: List[List], actual: List[List]) -> float:
+    """
+    Mean fraction of expected ids present in the actual results
+    """
+    fractions = []
+    for exp, act in zip(expected, actual):
+        if exp:
+            fractions.append(len(set(exp) & set(act)) / len(exp))
+    return statistics.mean(fractions) if fractions else 1.0
+
+
+def bench_pipeline(args, collection, index: VectorIndex):
+    """
+    Compare the in-memory index with the `$reduce` aggregation pipeline
+    """
+    queries = sample_queries(index, args.queries)
+
+    def run_aggregation(query):
+        pipeline = aggregation_similarity_pipeline(query, args.condition, args.limit)
+        return [doc["_id"] for doc in collection.aggregate(pipeline)]
+
+    def run_index(query):
+        hits = index.search(query, args.limit, args.condition)
+        ids = [doc_id for doc_id, _ in hits]
+        # Include the `_id` fetch so the comparison is end to end
+        list(collection.find({"_id": {"$in": ids}}, {"content": 1}))
+        return ids
+
+    expected = time_calls("aggregation $reduce", queries, run_aggregation)
+    actual = time_calls("in-memory index", queries, run_index)
+    print(f"top-{args.limit} agreement: {overlap(expected, actual):.3f}")
+
+
+def bench_ann(args, collection, index: VectorIndex):
+    """
+    Report IVF recall@k against exact search for a range of nprobe values
+    """
+    queries = sample_queries(index, args.queries)
+
+    ivf = IVFIndex.build(index, n_lists=args.lists)
+    print(f"IVF index: {ivf.n_lists} lists, mean list size {len(ivf) / ivf.n_lists:.1f}")
+
+    exact = time_calls("exact", queries, lambda q: [i for i, _ in index.search(q, args.limit, args.condition)])
+
+    print(f"\n{'nprobe':>6}  {'recall@' + str(args.limit):>10}  {'scanned':>8}")
+    for nprobe in [int(n) for n in args.nprobe.split(",")]:
+        ivf.nprobe = nprobe
+        approx = time_calls(f"ivf nprobe={nprobe}", queries,
+                            lambda q: [i for i, _ in ivf.search(q, args.limit, args.condition)])
+        scanned = min(1.0, nprobe / ivf.n_lists)
+        print(f"{nprobe:>6}  {overlap(exact, approx):>10.3f}  {scanned:>7.1%}")
+
+
+def bench_quantized(args, collection, index: VectorIndex):
+    """
+    Report recall@k and per-vector size of the compact embedding storage formats
+
+    Every stored vector is round-tripped through `embedding_codec` and searched
+    against full precision. If the collection is already compacted, the
+    baseline is the stored precision.
+    """
+    queries = sample_queries(index, args.queries)
+    exact = time_calls("float32", queries, lambda q: [i for i, _ in index.search(q, args.limit, args.condition)])
+
+    print(f"\n{'format':>8}  {'recall@' + str(args.limit):>10}  {'bytes/vector':>12}  {'vs array':>8}")
+    array_bytes = len(bson.encode(encode_embedding(index.matrix[0].tolist(), "array")))
+    for storage in STORAGE_FORMATS:
+        decoded = np.empty_like(index.matrix)
+        for row, vector in enumerate(index.matrix):
+            decoded[row] = decode_embedding(encode_embedding(vector.tolist(), storage))
+        compact = VectorIndex(index.ids, normalize_rows(decoded), index.condition_values[index.condition_codes])
+
+        approx = time_calls(storage, queries, lambda q: [i for i, _ in compact.search(q, args.limit, args.condition)])
+        size = len(bson.encode(encode_embedding(index.matrix[0].tolist(), storage)))
+        print(f"{storage:>8}  {overlap(exact, approx):>10.3f}  {size:>12}  {array_bytes / size:>7.1f}x")
+
+
+def bench_matryoshka(args, collection, index: VectorIndex):
+    """
+    Report recall@k, latency and scan cost of two-stage prefix search
+
+    Scan cost is the number of multiply-adds relative to a full exact scan:
+    every row over the prefix plus the shortlist over all dimensions.
+    """
+    queries = sample_queries(index, args.queries)
+    exact = time_calls("full scan", queries, lambda q: [i for i, _ in index.search(q, args.limit, args.condition)])
+
+    rows = len(index) if not args.condition else int(index.condition_mask(args.condition).sum())
+    summary = []
+    for dims in [int(d) for d in args.dims.split(",")]:
+        for candidates in [int(c) for c in args.candidates.split(",")]:
+            index.set_prefix(dims, candidates)
+            approx = time_calls(f"prefix {dims} / {candidates}", queries,
+                                lambda q: [i for i, _ in index.search(q, args.limit, args.condition)])
+            shortlist = index.shortlist_size(rows, args.limit)
+            cost = (rows * dims + shortlist * index.dimension) / (rows * index.dimension) if shortlist else 1.0
+            summary.append((dims, candidates, overlap(exact, approx), cost))
+        index.set_prefix(0)
+
+    print(f"\n{'dims':>6}  {'candidates':>10}  {'recall@' + str(args.limit):>10}  {'scan cost':>9}")
+    for dims, candidates, recall, cost in summary:
+        print(f"{dims:>6}  {candidates:>10}  {recall:>10.3f}  {cost:>8.1%}")
+
+
+def bench_filtered(args, collection, index: VectorIndex):
+    """
+    Compare unfiltered search with searches filtered to each condition key
+
+    Also times the MongoDB side: the indexed `condition_key` filter against the
+    old unanchored `$regex` on `condition`.
+    """
+    queries = sample_queries(index, args.queries)
+    time_calls("unfiltered", queries, lambda q: index.search(q, args.limit))
+
+    print()
+    for key in index.condition_values:
+        rows = row_count(index.candidate_rows(None, key), len(index))
+        time_calls(f"{key} ({rows / len(index):.0%})", queries, lambda q: index.search(q, args.limit, key))
+
+    print()
+    for key in index.condition_values[:3]:
+        time_calls(f"mongo $regex {key}", queries[:5],
+                   lambda q: collection.count_documents({"condition": {"$regex": key.replace("_", " "), "$options": "i"}}))
+        time_calls(f"mongo key {key}", queries[:5],
+                   lambda q: collection.count_documents({"condition_key": key}))
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    "pipeline": bench_pipeline,
+    "ann": bench_ann,
+    "quantized": bench_quantized,
+    "matryoshka": bench_matryoshka,
+    "filtered": bench_filtered,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--queries", type=int, default=20, help="number of sampled queries")
+    parser.add_argument("--limit", type=int, default=5, help="results per query (k)")
+    parser.add_argument("--condition", default=None, help="optional condition filter")
+    parser.add_argument("--lists", type=int, default=None, help="IVF lists (default 4 * sqrt(n))")
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32", help="comma-separated nprobe values")
+    parser.add_argument("--dims", default="256,512", help="comma-separated prefix dimensions")
+    parser.add_argument("--candidates", default="100,300,1000", help="comma-separated shortlist sizes")
+    args = parser.parse_args()
+
+    collection = get_collection()
+
+    print("Loading vector index...")
+    start = time.perf_counter()
+    index = VectorIndex.from_collection(collection)
+    print(f"Loaded {len(index)} chunks ({index.matrix.nbytes / 1e6:.1f} MB) in {time.perf_counter() - start:.2f}s")
+
+    if len(index) == 0:
+        print("Error: no embedded chunks found in the collection")
+        return 1
+
+    BENCHMARKS[args.benchmark](args, collection, index)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Measure embedding call latency through the upstream client layer, with and without hedging
+
+Run it against `fake_upstream.py` with a slow tail and some errors:
+
+  EMBEDDING_SLOW_RATE=0.05 EMBEDDING_SLOW_MS=2000 EMBEDDING_ERROR_RATE=0.02 python fake_upstream.py &
+  python benchmark_upstream.py --base-url http://localhost:9000/v1 --requests 400 --concurrency 8
+
+The first `HEDGE_MIN_SAMPLES` calls of the hedged run only warm up the latency
+tracker. After that, calls stuck in the slow tail are answered by the hedge,
+so p99 should drop to roughly p95 plus one normal call.
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import time
+import uuid
+
+from upstream import HEDGE_MIN_SAMPLES, UpstreamCaller, create_async_client
+
+
+async def run(args, hedge: bool):
+    """
+    Send `args.requests` embedding calls with at most `args.concurrency` in flight
+
+    Returns:
+        (latencies in ms after warm-up, error count, caller)
+    """
+    client = create_async_client(base_url=args.base_url, api_key="fake")
+    caller = UpstreamCaller("embedding", deadline=args.deadline, hedge=hedge)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(number: int):
+        nonlocal errors
+        async with semaphore:
+            text = f"bacteria response to spaceflight {uuid.uuid4().hex}"
+            start = time.perf_counter()
+            try:
+                await caller.call(lambda: client.embeddings.create(model="text-embedding-3-large", input=text))
+            except Exception:
+                errors += 1
+            if number >= HEDGE_MIN_SAMPLES:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    # Warm-up calls run first so the tracker has samples before the measured calls
+    await asyncio.gather(*(one(number) for number in range(HEDGE_MIN_SAMPLES)))
+    await asyncio.gather(*(one(number) for number in range(HEDGE_MIN_SAMPLES, args.requests)))
+    await client.close()
+    return latencies, errors, caller
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def main_async(args) -> int:
+    # Retry warnings would drown the table
+    logging.getLogger("upstream").setLevel(logging.ERROR)
+    print(f"{'mode':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>6} {'retried':>7} {'hedged':>6} {'wins':>5}")
+    for hedge in (False, True):
+        latencies, errors, caller = await run(args, hedge)
+        if not latencies:
+            print("No measured calls; raise --requests above HEDGE_MIN_SAMPLES")
+            return 1
+        stats = caller.stats()
+        print(f"{'hedged' if hedge else 'plain':<10} {statistics.median(latencies):>8.0f} {percentile(latencies, 0.95):>8.0f} "
+              f"{percentile(latencies, 0.99):>8.0f} {max(latencies):>8.0f} {errors:>6} {stats['retried']:>7} "
+              f"{stats['hedged']:>6} {stats['hedge_wins']:>5}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:9000/v1", help="OpenAI-compatible base URL")
+    parser.add_argument("--requests", type=int, default=400, help="calls per mode, including warm-up")
+    parser.add_argument("--concurrency", type=int, default=8, help="calls in flight")
+    parser.add_argument("--deadline", type=float, default=10, help="per-call deadline in seconds")
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
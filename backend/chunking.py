@@ -0,0 +1,194 @@
+"""
+Token-window chunking that tokenizes each piece of text exactly once
+
+Text is encoded once and the token start offsets are kept, so windows are cut
+by slicing the original text rather than decoding tokens back to text, and
+document statistics come from the same token array. Windows can be pulled back
+to the nearest sentence or paragraph boundary so chunks don't end mid-sentence.
+
+The engine is incremental: `feed` accepts text piece by piece (e.g. one PDF page
+at a time) and yields windows as soon as they are complete, holding only about
+one window of text in memory.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Iterator, List
+
+BOUNDARY_PATTERNS = {
+    "token": None,
+    "sentence": re.compile(r'(?<=[.!?])\s'),
+    "paragraph": re.compile(r'\n\s*\n'),
+}
+
+
+@dataclass
+class TextWindow:
+    text: str
+    start_token: int  # absolute, inclusive
+    end_token: int  # absolute, exclusive
+    start_char: int  # absolute, inclusive
+    end_char: int  # absolute, exclusive
+
+    @property
+    def token_count(self) -> int:
+        return self.end_token - self.start_token
+
+
+class ChunkingEngine:
+    def __init__(self, tokenizer, chunk_size: int = 1000, chunk_overlap: int = 200,
+                 boundary: str = "sentence", min_fill: float = 0.5):
+        """
+        Initialize chunking engine
+
+        Args:
+            tokenizer: tiktoken encoding
+            chunk_size: Maximum tokens per window
+            chunk_overlap: Tokens shared by consecutive windows
+            boundary: "token" (fixed windows), "sentence" or "paragraph"
+            min_fill: A window is only shortened to a boundary if it keeps at
+                least this fraction of `chunk_size` tokens
+        """
+        if boundary not in BOUNDARY_PATTERNS:
+            raise ValueError(f"Unknown boundary '{boundary}', expected one of {sorted(BOUNDARY_PATTERNS)}")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.boundary_pattern = BOUNDARY_PATTERNS[boundary]
+        self.min_tokens = int(chunk_size * min_fill)
+        self.reset()
+
+    def reset(self):
+        """
+        Start a new document
+        """
+        # Buffered text and its tokens; positions in the buffer are relative to
+        # the absolute token/char position of the buffer start
+        self._text = ""
+        self._offsets: List[int] = []  # char offset of each buffered token
+        self._boundaries: List[int] = []  # buffered token indices that start a sentence/paragraph
+        self._emitted_until = 0  # buffered tokens already covered by an emitted window
+        self._token_base = 0
+        self._char_base = 0
+
+        self.total_tokens = 0
+        self.total_chars = 0
+
+    def feed(self, text: str) -> Iterator[TextWindow]:
+        """
+        Add text to the current document
+
+        Args:
+            text: Next piece of the document, appended verbatim
+
+        Yields:
+            Windows that are now complete
+        """
+        if not text:
+            return
+
+        tokens = self.tokenizer.encode(text)
+        _, offsets = self.tokenizer.decode_with_offsets(tokens)
+        char_base = len(self._text)
+        token_base = len(self._offsets)
+
+        self._text += text
+        self._offsets.extend(offset + char_base for offset in offsets)
+        self.total_tokens += len(tokens)
+        self.total_chars += len(text)
+
+        if self.boundary_pattern is not None:
+            for match in self.boundary_pattern.finditer(text):
+                position = token_base + bisect_left(offsets, match.start())
+                if position < len(self._offsets) and (not self._boundaries or self._boundaries[-1] < position):
+                    self._boundaries.append(position)
+
+        yield from self._emit(final=False)
+
+    def finish(self) -> Iterator[TextWindow]:
+        """
+        End the current document
+
+        Yields:
+            Remaining windows
+        """
+        yield from self._emit(final=True)
+
+    def chunk_text(self, text: str) -> List[TextWindow]:
+        """
+        Chunk a whole document in one call
+
+        Args:
+            text: Document text
+
+        Returns:
+            All windows
+        """
+        self.reset()
+        windows = list(self.feed(text))
+        windows.extend(self.finish())
+        return windows
+
+    def _emit(self, final: bool) -> Iterator[TextWindow]:
+        while True:
+            available = len(self._offsets)
+            if available <= self._emitted_until:
+                # Nothing new since the last window (only overlap remains)
+                break
+            if not final and available < self.chunk_size:
+                break
+
+            end = min(self.chunk_size, available)
+            if end < available or not final:
+                end = self._align_end(end)
+
+            yield self._window(end)
+            self._emitted_until = end
+
+            if final and end == available:
+                break
+            self._trim(self._next_start(end))
+
+    def _align_end(self, end: int) -> int:
+        # Pull the end back to the last boundary, if that keeps the window full enough
+        if self.boundary_pattern is None:
+            return end
+        i = bisect_right(self._boundaries, end) - 1
+        if i >= 0 and self._boundaries[i] >= self.min_tokens:
+            return self._boundaries[i]
+        return end
+
+    def _next_start(self, end: int) -> int:
+        start = max(end - self.chunk_overlap, 1)
+        if self.boundary_pattern is not None:
+            # Start the next window at the first boundary inside the overlap
+            i = bisect_left(self._boundaries, start)
+            if i < len(self._boundaries) and self._boundaries[i] < end:
+                start = self._boundaries[i]
+        return start
+
+    def _window(self, end: int) -> TextWindow:
+        # The buffer always starts at a token boundary, so windows start at char 0
+        end_char = self._offsets[end] if end < len(self._offsets) else len(self._text)
+        return TextWindow(
+            text=self._text[:end_char],
+            start_token=self._token_base,
+            end_token=self._token_base + end,
+            start_char=self._char_base,
+            end_char=self._char_base + end_char,
+        )
+
+    def _trim(self, count: int):
+        # Drop buffered tokens (and their text) that no later window needs
+        cut = self._offsets[count] if count < len(self._offsets) else len(self._text)
+        self._text = self._text[cut:]
+        self._offsets = [offset - cut for offset in self._offsets[count:]]
+        self._boundaries = [b - count for b in self._boundaries if b >= count]
+        self._emitted_until = max(0, self._emitted_until - count)
+        self._token_base += count
+        self._char_base += cut
+
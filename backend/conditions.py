@@ -0,0 +1,116 @@
+"""
+Canonical condition keys
+
+Chunks carry a free-text `condition` label ("microgravity", "zero gravity",
+"cosmic radiation", ...). Filtering on it with an unanchored case-insensitive
+`$regex` cannot use an index, so ingestion also stores a canonical
+`condition_key` keyword, which is indexed in MongoDB and used to partition the
+in-memory vector index.
+"""
+
+import hashlib
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+UNSPECIFIED_KEY = "not_specified"
+
+# Label (lowercase, single spaces) -> canonical key. Keys map to themselves.
+CONDITION_ALIASES: Dict[str, str] = {
+    "microgravity": "microgravity",
+    "simulated microgravity": "microgravity",
+    "zero gravity": "microgravity",
+    "weightlessness": "microgravity",
+    "radiation": "radiation",
+    "cosmic radiation": "radiation",
+    "space radiation": "radiation",
+    "ionizing radiation": "radiation",
+    "temperature": "temperature",
+    "thermal stress": "temperature",
+    "hypoxia": "hypoxia",
+    "hypergravity": "hypergravity",
+    "space environment": "space_environment",
+    "spaceflight": "space_environment",
+    "oxidative stress": "oxidative_stress",
+    "not specified": UNSPECIFIED_KEY,
+}
+
+CANONICAL_KEYS = frozenset(CONDITION_ALIASES.values())
+
+_SEPARATORS = re.compile(r"[\s_\-]+")
+
+
+def aliases_fingerprint() -> str:
+    """
+    Hash of CONDITION_ALIASES; stored keys computed with a different table may be stale
+    """
+    return hashlib.sha1(json.dumps(CONDITION_ALIASES, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def normalize_label(label: str) -> str:
+    """
+    Lowercase a label and collapse whitespace, underscores and hyphens to single spaces
+    """
+    return _SEPARATORS.sub(" ", label).strip().lower()
+
+
+def condition_key(condition: Optional[str]) -> str:
+    """
+    Map a condition label to its canonical key
+
+    Known labels and aliases map to the keys in CONDITION_ALIASES; anything else
+    becomes a lowercase snake_case slug. The mapping is idempotent, so keys can
+    be passed through it again.
+
+    Args:
+        condition: Condition label, or None
+
+    Returns:
+        Canonical key
+    """
+    label = normalize_label(condition or "")
+    if not label:
+        return UNSPECIFIED_KEY
+    return CONDITION_ALIASES.get(label, label.replace(" ", "_"))
+
+
+def matching_keys(condition: str, keys: Iterable[str]) -> List[str]:
+    """
+    Resolve a condition filter against the keys present in the corpus
+
+    A filter naming a key or alias matches exactly that key. Other filters keep
+    the behaviour of the old regex filter and match every key containing them,
+    so "gravity" still finds both microgravity and hypergravity.
+
+    Args:
+        condition: Condition filter from a request
+        keys: Keys present in the corpus
+
+    Returns:
+        Matching keys
+    """
+    keys = list(keys)
+    key = condition_key(condition)
+    if key in keys:
+        return [key]
+    label = normalize_label(condition)
+    return [candidate for candidate in keys if label in candidate.replace("_", " ")]
+
+
+def condition_filter(condition: str) -> Dict[str, Any]:
+    """
+    Build the MongoDB filter for a condition
+
+    Filters naming a canonical condition use the indexed `condition_key`;
+    anything else falls back to the case-insensitive substring match on `condition`.
+
+    Args:
+        condition: Condition filter from a request
+
+    Returns:
+        MongoDB filter
+    """
+    key = condition_key(condition)
+    if key in CANONICAL_KEYS:
+        return {"condition_key": key}
+    return {"condition": {"$regex": re.escape(condition), "$options": "i"}}
@@ -0,0 +1,293 @@
+"""
+Token-budgeted LLM context packing
+
+Retrieval returns more candidates than the prompt needs, and with overlapping
+chunks the top hits are often neighbours from the same paper. The context is
+built in three steps:
+
+1. Maximal marginal relevance (MMR) orders the candidates, trading relevance
+   against similarity to chunks already picked, so near-duplicates sink.
+2. Picked chunks that overlap or touch in the same paper are merged into one
+   passage with the shared text removed.
+3. Passages are rendered in pick order until the token budget is filled.
+   Each passage is first capped so several sources fit; budget left over
+   after the last passage goes back to the passages that were cut.
+"""
+
+import logging
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Characters from the head of a chunk searched for in its neighbour to find the overlap
+OVERLAP_PROBE_CHARS = 64
+
+# Stop adding passages once fewer tokens than this are left
+MIN_PASSAGE_TOKENS = 32
+
+_WORDS = re.compile(r"\w+")
+
+
+def load_tokenizer(model: str):
+    """
+    Load the tiktoken encoding of a chat model
+
+    Args:
+        model: Model name, e.g. "gpt-4o"
+
+    Returns:
+        tiktoken Encoding, or None if it cannot be loaded (token counts are then estimated)
+    """
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer for {model}, estimating tokens from characters: {e}")
+        return None
+
+
+class TokenCounter:
+    def __init__(self, tokenizer=None):
+        """
+        Count and truncate text in tokens
+
+        Args:
+            tokenizer: tiktoken Encoding, or None to estimate 4 characters per token
+        """
+        self.tokenizer = tokenizer
+
+    def count(self, text: str) -> int:
+        if self.tokenizer is None:
+            return (len(text) + 3) // 4
+        return len(self.tokenizer.encode(text))
+
+    def truncate(self, text: str, limit: int) -> str:
+        """
+        Cut text to at most `limit` tokens
+        """
+        if limit <= 0:
+            return ""
+        if self.tokenizer is None:
+            return text[:limit * 4]
+        tokens = self.tokenizer.encode(text)
+        if len(tokens) <= limit:
+            return text
+        return self.tokenizer.decode(tokens[:limit])
+
+
+def word_similarity(chunks: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Pairwise Jaccard similarity of the chunks' word sets, used when embeddings are unavailable
+    """
+    words = [set(_WORDS.findall(chunk.get("content", "").lower())) for chunk in chunks]
+    similarity = np.zeros((len(chunks), len(chunks)), dtype=np.float32)
+    for i in range(len(chunks)):
+        for j in range(i + 1, len(chunks)):
+            union = len(words[i] | words[j])
+            similarity[i, j] = similarity[j, i] = len(words[i] & words[j]) / union if union else 0.0
+    return similarity
+
+
+def mmr_order(relevance: np.ndarray, similarity: np.ndarray, mmr_lambda: float = 0.7) -> List[int]:
+    """
+    Order candidates by maximal marginal relevance
+
+    Each step picks the candidate maximizing
+    `mmr_lambda * relevance - (1 - mmr_lambda) * max similarity to those already picked`.
+
+    Args:
+        relevance: (n,) relevance scores, scaled to [0, 1]
+        similarity: (n, n) pairwise similarity
+        mmr_lambda: 1 ranks by relevance only, lower values favour diversity
+
+    Returns:
+        Candidate positions in pick order
+    """
+    n = relevance.shape[0]
+    if n == 0:
+        return []
+    order: List[int] = []
+    remaining = np.ones(n, dtype=bool)
+    redundancy = np.zeros(n, dtype=np.float32)
+    for _ in range(n):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        remaining[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return order
+
+
+def scaled_relevance(chunks: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Min-max scale the chunks' retrieval scores, which differ in range between retrieval modes
+    """
+    scores = np.array([float(chunk.get("similarity", 0.0) or 0.0) for chunk in chunks], dtype=np.float32)
+    if scores.size == 0:
+        return scores
+    spread = scores.max() - scores.min()
+    if spread <= 0:
+        return np.ones_like(scores)
+    return (scores - scores.min()) / spread
+
+
+def join_overlapping(left: str, right: str) -> str:
+    """
+    Concatenate two consecutive chunk texts, dropping the text they share
+    """
+    if right in left:
+        return left
+    if left in right:
+        return right
+    position = left.rfind(right[:OVERLAP_PROBE_CHARS])
+    if position >= 0 and left[position:] == right[:len(left) - position]:
+        return left[:position] + right
+    return left + " " + right
+
+
+def adjacent(passage: Dict[str, Any], chunk: Dict[str, Any]) -> bool:
+    """
+    Whether a chunk overlaps or touches a passage of the same paper
+    """
+    if not chunk.get("filename") or chunk.get("filename") != passage["filename"]:
+        return False
+    if chunk.get("start_char") is not None and passage["start_char"] is not None:
+        return chunk["start_char"] <= passage["end_char"] and passage["start_char"] <= chunk["end_char"]
+    if chunk.get("chunk_index") is not None and passage["first_index"] is not None:
+        return passage["first_index"] - 1 <= chunk["chunk_index"] <= passage["last_index"] + 1
+    return False
+
+
+def merge_passages(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge chunks into passages, keeping the order in which each passage was first picked
+
+    Args:
+        chunks: Chunks in pick order
+
+    Returns:
+        Passages with "text", "organism_name", "condition" and the merged "chunks"
+    """
+    passages: List[Dict[str, Any]] = []
+    for chunk in chunks:
+        content = chunk.get("content", "").strip()
+        if len(content) < 10:  # Skip very short or empty chunks
+            continue
+
+        passage = next((passage for passage in passages if adjacent(passage, chunk)), None)
+        if passage is None:
+            passages.append({
+                "text": content,
+                "filename": chunk.get("filename"),
+                "organism_name": chunk.get("organism_name", "Unknown"),
+                "condition": chunk.get("condition", "Not specified"),
+                "start_char": chunk.get("start_char"),
+                "end_char": chunk.get("end_char"),
+                "first_index": chunk.get("chunk_index"),
+                "last_index": chunk.get("chunk_index"),
+                "chunks": [chunk],
+            })
+            continue
+
+        # Place the chunk before or after the passage in document order
+        if chunk.get("start_char") is not None and passage["start_char"] is not None:
+            before = chunk["start_char"] < passage["start_char"]
+            passage["start_char"] = min(passage["start_char"], chunk["start_char"])
+            passage["end_char"] = max(passage["end_char"], chunk["end_char"])
+        else:
+            before = chunk["chunk_index"] < passage["first_index"]
+        if chunk.get("chunk_index") is not None and passage["first_index"] is not None:
+            passage["first_index"] = min(passage["first_index"], chunk["chunk_index"])
+            passage["last_index"] = max(passage["last_index"], chunk["chunk_index"])
+        passage["text"] = join_overlapping(content, passage["text"]) if before else join_overlapping(passage["text"], content)
+        passage["chunks"].append(chunk)
+    return passages
+
+
+def format_passage(number: int, passage: Dict[str, Any], text: str) -> str:
+    return (
+        f"--- Chunk {number} ---\n"
+        f"Organism: {passage['organism_name']}\n"
+        f"Condition: {passage['condition']}\n"
+        f"Content: {text}"
+    )
+
+
+def pack_context(chunks: List[Dict[str, Any]], counter: TokenCounter, token_budget: int,
+                 passage_tokens: int = 0, mmr_lambda: float = 0.7,
+                 vectors: Optional[Callable[[List[Any]], Optional[np.ndarray]]] = None) -> Dict[str, Any]:
+    """
+    Build the LLM context from retrieved chunks within a token budget
+
+    Args:
+        chunks: Retrieved chunks, best first, with "similarity" scores
+        counter: Token counter for the LLM's encoding
+        token_budget: Maximum tokens of the returned context
+        passage_tokens: Maximum content tokens per passage, 0 for no cap
+        mmr_lambda: Relevance/diversity trade-off (see `mmr_order`)
+        vectors: Returns normalized embeddings for chunk ids, or None; word
+            overlap is used for redundancy without them
+
+    Returns:
+        Dictionary with "context", "tokens", "passages" and "chunks_used"
+    """
+    if not chunks:
+        return {"context": "", "tokens": 0, "passages": 0, "chunks_used": 0}
+
+    embeddings = vectors([chunk.get("_id") for chunk in chunks]) if vectors is not None else None
+    similarity = embeddings @ embeddings.T if embeddings is not None else word_similarity(chunks)
+    order = mmr_order(scaled_relevance(chunks), similarity, mmr_lambda)
+    passages = merge_passages([chunks[i] for i in order])
+
+    # Allocate content tokens in pick order, each passage capped at `passage_tokens`
+    allocations: List[int] = []
+    lengths: List[int] = []
+    used = 0
+    for number, passage in enumerate(passages, start=1):
+        # Separator and header cost, measured with an empty body
+        overhead = counter.count(("\n\n" if number > 1 else "") + format_passage(number, passage, ""))
+        length = counter.count(passage["text"])
+        available = token_budget - used - overhead
+        allocation = min(length, available, passage_tokens or length)
+        if allocation < min(length, MIN_PASSAGE_TOKENS):
+            break
+        allocations.append(allocation)
+        lengths.append(length)
+        used += overhead + allocation
+
+    # Budget left once every passage has its share goes to the ones that were cut
+    for position, (allocation, length) in enumerate(zip(allocations, lengths)):
+        extra = min(length - allocation, token_budget - used)
+        if extra > 0:
+            allocations[position] += extra
+            used += extra
+
+    parts: List[str] = []
+    chunks_used = 0
+    for number, (passage, allocation, length) in enumerate(zip(passages, allocations, lengths), start=1):
+        text = passage["text"]
+        if allocation < length:
+            text = counter.truncate(text, allocation - 1).rstrip() + "..."
+        parts.append(format_passage(number, passage, text))
+        chunks_used += len(passage["chunks"])
+
+    context = "\n\n".join(parts)
+    tokens = counter.count(context)
+
+    # Token counts of joined parts can differ from the sum by a token or two at the seams
+    while parts and tokens > token_budget:
+        last = parts.pop()
+        trimmed = counter.truncate(last, counter.count(last) - (tokens - token_budget))
+        if trimmed:
+            parts.append(trimmed)
+        context = "\n\n".join(parts)
+        tokens = counter.count(context)
+
+    return {"context": context, "tokens": tokens, "passages": len(parts), "chunks_used": chunks_used}
@@ -0,0 +1,61 @@
+"""
+Corpus version stamp shared by ingestion and the API
+
+Ingestion bumps the version whenever it changes the stored chunks. Anything
+derived from the corpus (cached search responses, the vector index) records
+the version it was built from and is treated as stale once it changes.
+
+Chunks of a file whose ingestion has not been committed yet carry the
+ingestion's id in `PENDING_FIELD`; queries that read chunks directly from
+MongoDB add `COMMITTED_CHUNKS` so they never see a file's old and new chunks
+together, nor the leftovers of an interrupted run.
+"""
+
+import logging
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+CORPUS_META_COLLECTION = "corpus_meta"
+VERSION_DOCUMENT_ID = "corpus_version"
+PENDING_FIELD = "pending_ingestion"
+COMMITTED_CHUNKS = {PENDING_FIELD: {"$exists": False}}
+
+# Fingerprint of the condition alias table the stored condition keys were computed with
+CONDITION_KEYS_DOCUMENT_ID = "condition_keys"
+
+
+def get_corpus_version(db) -> int:
+    """
+    Read the current corpus version
+
+    Args:
+        db: pymongo database
+
+    Returns:
+        Version number, 0 if ingestion has never bumped it
+    """
+    document = db[CORPUS_META_COLLECTION].find_one({"_id": VERSION_DOCUMENT_ID})
+    return int(document["version"]) if document else 0
+
+
+def bump_corpus_version(db) -> int:
+    """
+    Atomically increment the corpus version
+
+    Args:
+        db: pymongo database
+
+    Returns:
+        The new version number
+    """
+    document = db[CORPUS_META_COLLECTION].find_one_and_update(
+        {"_id": VERSION_DOCUMENT_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    version = int(document["version"])
+    logger.info(f"Corpus version bumped to {version}")
+    return version
@@ -0,0 +1,129 @@
+"""
+Storage formats for chunk embeddings
+
+By default chunks keep `embedding` as a BSON array of doubles. Every element
+carries a type byte and its index as a string key, so a text-embedding-3-large
+vector takes about 42 KB. The compact formats store the vector as BinData in
+`embedding_bin` instead:
+
+- "float16": packed little-endian half floats, 2 bytes per dimension
+- "int8": symmetric scalar quantization, 1 byte per dimension plus a float
+  `embedding_scale` per vector (value = code * scale)
+
+Compact vectors are decoded with `np.frombuffer` straight from the BSON bytes.
+Retrieval only needs the direction of each vector, which both formats preserve
+closely; the MongoDB aggregation fallback can only score the array format.
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from bson.binary import Binary
+
+STORAGE_FORMATS = ("array", "float16", "int8")
+
+# Format used for newly ingested chunks
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "array")
+
+# Every field that may hold (part of) a stored embedding
+EMBEDDING_FIELDS = ("embedding", "embedding_bin", "embedding_format", "embedding_scale")
+
+# Matches chunks that have an embedding in any format
+HAS_EMBEDDING_QUERY = {"$or": [{"embedding": {"$exists": True}}, {"embedding_bin": {"$exists": True}}]}
+
+_BINARY_DTYPES = {"float16": np.dtype("<f2"), "int8": np.dtype("i1")}
+
+
+def check_storage_format(storage: str) -> str:
+    """
+    Validate a storage format name
+
+    Args:
+        storage: "array", "float16" or "int8"
+
+    Returns:
+        The same name
+    """
+    if storage not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown embedding storage '{storage}', expected one of {STORAGE_FORMATS}")
+    return storage
+
+
+def encode_embedding(embedding: List[float], storage: str = EMBEDDING_STORAGE) -> Dict[str, Any]:
+    """
+    Convert an embedding into the document fields for a storage format
+
+    Args:
+        embedding: Embedding as returned by the embedding API
+        storage: "array", "float16" or "int8"
+
+    Returns:
+        Fields to set on the chunk document
+    """
+    check_storage_format(storage)
+    if storage == "array":
+        return {"embedding": [float(value) for value in embedding]}
+
+    vector = np.asarray(embedding, dtype=np.float32)
+    if storage == "float16":
+        return {
+            "embedding_bin": Binary(vector.astype(_BINARY_DTYPES["float16"]).tobytes()),
+            "embedding_format": "float16"
+        }
+
+    peak = float(np.abs(vector).max()) if vector.size else 0.0
+    scale = peak / 127 if peak > 0 else 1.0
+    codes = np.clip(np.rint(vector / scale), -127, 127).astype(_BINARY_DTYPES["int8"])
+    return {
+        "embedding_bin": Binary(codes.tobytes()),
+        "embedding_format": "int8",
+        "embedding_scale": scale
+    }
+
+
+def decode_embedding(document: Dict[str, Any]) -> Optional[np.ndarray]:
+    """
+    Read the embedding of a chunk document in whichever format it is stored
+
+    Args:
+        document: Chunk document including the fields in EMBEDDING_FIELDS
+
+    Returns:
+        Embedding as a 1-D array (float16 vectors are a read-only view of the
+        BSON bytes), or None if the document has no embedding
+    """
+    data = document.get("embedding_bin")
+    if data is None:
+        embedding = document.get("embedding")
+        return np.asarray(embedding, dtype=np.float32) if embedding else None
+
+    storage = document.get("embedding_format", "float16")
+    vector = np.frombuffer(data, dtype=_BINARY_DTYPES[storage])
+    if storage == "int8":
+        return vector * np.float32(document.get("embedding_scale", 1.0))
+    return vector
+
+
+def storage_update(document: Dict[str, Any], storage: str) -> Optional[Dict[str, Any]]:
+    """
+    Build the update that converts a stored embedding to another format
+
+    Args:
+        document: Chunk document including the fields in EMBEDDING_FIELDS
+        storage: Target format
+
+    Returns:
+        `$set`/`$unset` update, or None if the document is already in that format
+        or has no embedding
+    """
+    current = document.get("embedding_format") or ("array" if document.get("embedding") else None)
+    if current is None or current == storage:
+        return None
+
+    fields = encode_embedding(decode_embedding(document).astype(np.float32).tolist(), storage)
+    update: Dict[str, Any] = {"$set": fields}
+    stale = [field for field in EMBEDDING_FIELDS if field not in fields and field in document]
+    if stale:
+        update["$unset"] = {field: "" for field in stale}
+    return update
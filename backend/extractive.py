@@ -0,0 +1,117 @@
+"""
+Extractive answers built locally from retrieved chunks
+
+When the LLM cannot answer within a search's latency budget, the API answers
+from the retrieved chunks alone. The organism and condition come from a
+rank-weighted vote over the chunks' metadata. The description is made of the
+chunk sentences that share the most words with the query. Nothing is
+generated, so the answer is only as good as retrieval, and it is marked
+`extractive` so clients can tell it apart.
+"""
+
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+_WORDS = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(])")
+
+# Query words that carry no meaning for sentence scoring
+STOPWORDS = {
+    "the", "and", "for", "with", "how", "what", "which", "does", "are", "was", "were", "from",
+    "that", "this", "into", "under", "during", "about", "their", "its", "can", "effect", "effects",
+}
+
+MIN_SENTENCE_CHARS = 40
+MAX_SENTENCE_CHARS = 400
+
+
+def query_terms(query: str) -> set:
+    return {word for word in _WORDS.findall(query.lower()) if len(word) > 2 and word not in STOPWORDS}
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split chunk text into whole sentences, dropping the fragments chunk boundaries cut
+    """
+    sentences = []
+    for sentence in _SENTENCE_END.split(" ".join(text.split())):
+        if not MIN_SENTENCE_CHARS <= len(sentence) <= MAX_SENTENCE_CHARS:
+            continue
+        # A chunk usually starts mid-sentence and may end mid-sentence
+        if not (sentence[0].isupper() or sentence[0].isdigit()) or sentence[-1] not in ".!?":
+            continue
+        sentences.append(sentence)
+    return sentences
+
+
+def weighted_vote(chunks: List[Dict[str, Any]], field: str, unknown: str) -> Optional[str]:
+    """
+    Most supported value of a metadata field, each chunk weighted 1 / rank
+    """
+    votes: Dict[str, float] = defaultdict(float)
+    for rank, chunk in enumerate(chunks, start=1):
+        value = chunk.get(field)
+        if value and value != unknown:
+            votes[value] += 1.0 / rank
+    return max(votes, key=votes.get) if votes else None
+
+
+def rank_sentences(query: str, chunks: List[Dict[str, Any]]) -> List[str]:
+    """
+    Distinct chunk sentences ordered by query word overlap, ties broken by chunk rank
+
+    Args:
+        query: User query
+        chunks: Retrieved chunks, best first
+
+    Returns:
+        Sentences, best first
+    """
+    terms = query_terms(query)
+    scored = []
+    seen = set()
+    for rank, chunk in enumerate(chunks, start=1):
+        for position, sentence in enumerate(split_sentences(chunk.get("content", ""))):
+            key = sentence.lower()
+            if key in seen:
+                continue  # Overlapping chunks repeat sentences
+            seen.add(key)
+            words = set(_WORDS.findall(key))
+            overlap = len(terms & words) / len(terms) if terms else 0.0
+            scored.append((overlap + 0.1 / rank, -rank, -position, sentence))
+    scored.sort(reverse=True)
+    return [sentence for _, _, _, sentence in scored]
+
+
+def extractive_answer(query: str, chunks: List[Dict[str, Any]], condition: Optional[str] = None,
+                      description_sentences: int = 3, finding_sentences: int = 3) -> Dict[str, Any]:
+    """
+    Build a response dict in the LLM answer's shape from retrieved chunks only
+
+    Args:
+        query: User query
+        chunks: Retrieved chunks, best first
+        condition: Condition filter of the request, used as the condition when set
+        description_sentences: Best sentences used as the description
+        finding_sentences: Following sentences used as experimental findings
+
+    Returns:
+        Response dict with "extractive": True
+    """
+    sentences = rank_sentences(query, chunks)
+    description = " ".join(sentences[:description_sentences])
+    findings = " ".join(sentences[description_sentences:description_sentences + finding_sentences])
+    return {
+        "organism_name": weighted_vote(chunks, "organism_name", "Unknown") or "Unknown",
+        "condition": condition or weighted_vote(chunks, "condition", "Not specified") or "Not specified",
+        "description": description or "No description available",
+        "scientific_details": {
+            "classification": "Unknown",
+            "response_mechanisms": [],
+            "experimental_findings": findings or "No data available",
+            "applications": "No data available"
+        },
+        "relevant_chunks": [],
+        "extractive": True
+    }
@@ -0,0 +1,173 @@
+"""
+Materialized organism / condition facet counts
+
+Browsing filters needs, for each organism and condition, how many papers and
+chunks mention it. Computing that with `distinct` or `$group` scans the whole
+chunk collection, so ingestion keeps a small summary collection up to date
+instead: every ingested, replaced or removed file applies `$inc` deltas to its
+organism, its condition, the organism/condition pair and the totals.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from conditions import condition_key
+from corpus import COMMITTED_CHUNKS
+
+logger = logging.getLogger(__name__)
+
+FACETS_COLLECTION = "facets"
+TOTALS_ID = "totals"
+
+
+def file_facets(organism_name: Optional[str], condition: Optional[str], chunk_count: int) -> Dict[str, Any]:
+    """
+    Describe what one ingested file contributes to the facets
+
+    Stored in the file's manifest entry so the contribution can be subtracted
+    again when the file is re-ingested or deleted.
+
+    Args:
+        organism_name: Organism inferred for the file
+        condition: Condition inferred for the file
+        chunk_count: Number of chunks stored for the file
+
+    Returns:
+        Facet contribution
+    """
+    return {
+        "organism_name": organism_name or "Unknown",
+        "condition": condition or "Not specified",
+        "condition_key": condition_key(condition),
+        "chunks": chunk_count
+    }
+
+
+def facet_documents(facets: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    List the summary documents a file's contribution counts towards
+
+    Returns:
+        (document id, descriptive fields) pairs
+    """
+    organism = facets["organism_name"]
+    key = facets["condition_key"]
+    return [
+        (TOTALS_ID, {"kind": "totals"}),
+        (f"organism:{organism}", {"kind": "organism", "organism_name": organism}),
+        (f"condition:{key}", {"kind": "condition", "condition_key": key, "condition": facets["condition"]}),
+        (f"pair:{organism}|{key}", {"kind": "organism_condition", "organism_name": organism, "condition_key": key}),
+    ]
+
+
+def facet_updates(facets: Dict[str, Any], sign: int) -> List[UpdateOne]:
+    """
+    Build the `$inc` upserts that add (sign=1) or subtract (sign=-1) a file's contribution
+    """
+    inc = {"papers": sign, "chunks": sign * facets["chunks"]}
+    return [
+        UpdateOne({"_id": document_id}, {"$inc": inc, "$set": fields}, upsert=True)
+        for document_id, fields in facet_documents(facets)
+    ]
+
+
+def update_facets(db, previous: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]]):
+    """
+    Replace a file's previous facet contribution with its current one
+
+    Args:
+        db: pymongo database
+        previous: Contribution recorded when the file was last ingested, or None
+        current: Contribution of the newly stored chunks, or None if the file is gone
+    """
+    operations = []
+    if previous and previous.get("chunks"):
+        operations.extend(facet_updates(previous, -1))
+    if current and current.get("chunks"):
+        operations.extend(facet_updates(current, 1))
+    if not operations:
+        return
+
+    facets = db[FACETS_COLLECTION]
+    facets.bulk_write(operations, ordered=True)
+    facets.delete_many({"_id": {"$ne": TOTALS_ID}, "papers": {"$lte": 0}})
+
+
+def rebuild_facets(db, collection) -> int:
+    """
+    Recompute the facets from the stored chunks with one aggregation
+
+    Only needed for corpora ingested before facets existed; afterwards
+    ingestion keeps them current.
+
+    Args:
+        db: pymongo database
+        collection: Chunk collection
+
+    Returns:
+        Number of papers counted
+    """
+    pipeline = [{"$match": COMMITTED_CHUNKS}, {
+        "$group": {
+            "_id": "$filename",
+            "organism_name": {"$first": "$organism_name"},
+            "condition": {"$first": "$condition"},
+            "chunks": {"$sum": 1}
+        }
+    }]
+
+    documents: Dict[str, Dict[str, Any]] = {}
+    papers = 0
+    for paper in collection.aggregate(pipeline, allowDiskUse=True):
+        facets = file_facets(paper.get("organism_name"), paper.get("condition"), paper["chunks"])
+        for document_id, fields in facet_documents(facets):
+            document = documents.setdefault(document_id, {"_id": document_id, "papers": 0, "chunks": 0})
+            document.update(fields)
+            document["papers"] += 1
+            document["chunks"] += facets["chunks"]
+        papers += 1
+
+    facets_collection = db[FACETS_COLLECTION]
+    facets_collection.delete_many({})
+    if documents:
+        facets_collection.insert_many(list(documents.values()))
+    logger.info(f"Rebuilt facets for {papers} papers")
+    return papers
+
+
+def load_facets(db) -> Dict[str, Any]:
+    """
+    Read the facet summary, shaped for the API
+
+    Args:
+        db: pymongo database
+
+    Returns:
+        Dictionary with "totals", "organisms", "conditions" and "organism_conditions",
+        each list sorted by paper count
+    """
+    totals = {"papers": 0, "chunks": 0}
+    organisms, conditions, pairs = [], [], []
+    for document in db[FACETS_COLLECTION].find({}):
+        counts = {"papers": document.get("papers", 0), "chunks": document.get("chunks", 0)}
+        kind = document.get("kind")
+        if kind == "totals":
+            totals = counts
+        elif kind == "organism":
+            organisms.append({"organism_name": document["organism_name"], **counts})
+        elif kind == "condition":
+            conditions.append({"condition_key": document["condition_key"], "condition": document["condition"], **counts})
+        elif kind == "organism_condition":
+            pairs.append({"organism_name": document["organism_name"], "condition_key": document["condition_key"], **counts})
+
+    def by_papers(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return sorted(items, key=lambda item: (-item["papers"], -item["chunks"]))
+
+    return {
+        "totals": totals,
+        "organisms": by_papers(organisms),
+        "conditions": by_papers(conditions),
+        "organism_conditions": by_papers(pairs)
+    }
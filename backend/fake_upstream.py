@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Fake OpenAI-compatible upstream for local benchmarks
+
+Serves `/v1/embeddings`, `/v1/chat/completions` and `/v1/models` with
+configurable artificial latency, so the API can be load tested without
+spending API credits. Embeddings are deterministic per input text.
+
+A fraction of embedding requests can be made slow (`EMBEDDING_SLOW_RATE`,
+`EMBEDDING_SLOW_MS`) or fail with 503 (`EMBEDDING_ERROR_RATE`) to exercise the
+retry and hedging policy in `upstream.py`.
+
+Usage:
+  EMBEDDING_LATENCY_MS=150 LLM_LATENCY_MS=2000 python fake_upstream.py
+  EMBEDDING_SLOW_RATE=0.05 EMBEDDING_SLOW_MS=2000 EMBEDDING_ERROR_RATE=0.02 python fake_upstream.py
+  AIMLAPI_BASE_URL=http://localhost:9000/v1 AIMLAPI_KEY=fake uvicorn main:app
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from typing import List, Union
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+EMBEDDING_LATENCY_MS = float(os.getenv("EMBEDDING_LATENCY_MS", "150"))
+LLM_LATENCY_MS = float(os.getenv("LLM_LATENCY_MS", "2000"))
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "3072"))
+EMBEDDING_SLOW_RATE = float(os.getenv("EMBEDDING_SLOW_RATE", "0"))
+EMBEDDING_SLOW_MS = float(os.getenv("EMBEDDING_SLOW_MS", "2000"))
+EMBEDDING_ERROR_RATE = float(os.getenv("EMBEDDING_ERROR_RATE", "0"))
+
+app = FastAPI(title="Fake upstream")
+
+
+class EmbeddingRequest(BaseModel):
+    model: str
+    input: Union[str, List[str]]
+
+
+class ChatRequest(BaseModel):
+    model: str
+    messages: List[dict]
+    temperature: float = 1.0
+    max_tokens: int = 2000
+    stream: bool = False
+
+
+FAKE_ANSWER = {
+    "organism_name": "Escherichia coli",
+    "condition": "microgravity",
+    "description": "Fake upstream response used for load testing.",
+    "scientific_details": {
+        "classification": "Bacteria",
+        "response_mechanisms": ["gene expression changes"],
+        "experimental_findings": "None, this is a fake response",
+        "applications": "Benchmarking"
+    },
+    "relevant_chunks": []
+}
+
+
+def fake_embedding(text: str) -> List[float]:
+    """
+    Deterministic unit vector derived from the text
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).normal(size=EMBEDDING_DIMENSIONS).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: EmbeddingRequest):
+    slow = random.random() < EMBEDDING_SLOW_RATE
+    await asyncio.sleep((EMBEDDING_SLOW_MS if slow else EMBEDDING_LATENCY_MS) / 1000)
+    if random.random() < EMBEDDING_ERROR_RATE:
+        return JSONResponse(status_code=503, content={"error": {"message": "Fake upstream overloaded"}})
+    inputs = [request.input] if isinstance(request.input, str) else request.input
+    return {
+        "object": "list",
+        "model": request.model,
+        "data": [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+            for i, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": 0, "total_tokens": 0}
+    }
+
+
+def completion_chunk(model: str, delta: dict, finish_reason: str = None) -> str:
+    chunk = {
+        "id": "fake-completion",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+async def stream_completion(model: str):
+    """
+    Send the fake answer in small deltas spread over LLM_LATENCY_MS
+    """
+    content = json.dumps(FAKE_ANSWER, indent=2)
+    pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+    yield completion_chunk(model, {"role": "assistant", "content": ""})
+    for piece in pieces:
+        await asyncio.sleep(LLM_LATENCY_MS / 1000 / len(pieces))
+        yield completion_chunk(model, {"content": piece})
+    yield completion_chunk(model, {}, "stop")
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: ChatRequest):
+    if request.stream:
+        return StreamingResponse(stream_completion(request.model), media_type="text/event-stream")
+    await asyncio.sleep(LLM_LATENCY_MS / 1000)
+    return {
+        "id": "fake-completion",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": json.dumps(FAKE_ANSWER)},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "gpt-4o", "object": "model", "owned_by": "fake"}]}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("FAKE_UPSTREAM_PORT", "9000")))
@@ -0,0 +1,114 @@
+"""
+Lexical retrieval and rank fusion for hybrid search
+
+Exact names such as "Caenorhabditis elegans" are often matched better by the
+MongoDB text index (on organism_name, condition and content) than by embeddings.
+Hybrid search ranks chunks both ways and merges the two rankings with
+reciprocal-rank fusion (RRF), which only uses ranks, so text scores and cosine
+similarities never have to be put on the same scale.
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from conditions import condition_filter
+from corpus import COMMITTED_CHUNKS
+from tagger import organism_filter
+
+# vector: embeddings only; lexical: text index only (no embedding call);
+# hybrid: both, fused with RRF; auto: lexical for keyword lookups, hybrid otherwise
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical", "auto")
+
+# Standard RRF damping constant; larger values flatten the gap between top ranks
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Queries with at most this many terms and no question words count as keyword lookups
+KEYWORD_MAX_TERMS = int(os.getenv("KEYWORD_MAX_TERMS", "3"))
+
+QUESTION_WORDS = {
+    "how", "what", "why", "which", "when", "where", "who", "does", "do", "is", "are", "can",
+    "explain", "describe", "compare", "effect", "effects", "impact", "affect", "affects",
+}
+
+_TERM_PATTERN = re.compile(r"[A-Za-z0-9][\w\-]*\.?")
+
+
+def is_keyword_query(query: str) -> bool:
+    """
+    Decide whether a query is a plain keyword lookup, e.g. a species name
+
+    Args:
+        query: User query
+
+    Returns:
+        True for short queries without question words or a question mark
+    """
+    if "?" in query:
+        return False
+    terms = _TERM_PATTERN.findall(query)
+    if not terms or len(terms) > KEYWORD_MAX_TERMS:
+        return False
+    return not any(term.rstrip(".").lower() in QUESTION_WORDS for term in terms)
+
+
+def resolve_retrieval_mode(mode: str, query: str) -> str:
+    """
+    Turn "auto" into the concrete mode for a query
+
+    Args:
+        mode: One of RETRIEVAL_MODES
+        query: User query
+
+    Returns:
+        "vector", "hybrid" or "lexical"
+    """
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}")
+    if mode == "auto":
+        return "lexical" if is_keyword_query(query) else "hybrid"
+    return mode
+
+
+def text_search_filter(query: str, condition: Optional[str] = None, organism: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build the `$text` filter for a query
+
+    Quotes are stripped because a quoted phrase makes `$text` require it,
+    turning ranking into filtering.
+
+    Args:
+        query: User query
+        condition: Optional condition filter (see `conditions.condition_filter`)
+        organism: Optional organism filter (see `tagger.organism_filter`)
+
+    Returns:
+        MongoDB filter
+    """
+    text_filter: Dict[str, Any] = {"$text": {"$search": query.replace('"', " ")}, **COMMITTED_CHUNKS}
+    if condition:
+        text_filter.update(condition_filter(condition))
+    if organism:
+        text_filter.update(organism_filter(organism))
+    return text_filter
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[Any, float]]], k: int = RRF_K) -> List[Tuple[Any, float]]:
+    """
+    Merge rankings with reciprocal-rank fusion
+
+    Each document scores sum(1 / (k + rank)) over the rankings it appears in,
+    with ranks starting at 1.
+
+    Args:
+        rankings: Lists of (document id, score), best first; scores are ignored
+        k: Damping constant
+
+    Returns:
+        List of (document id, fused score), best first
+    """
+    fused: Dict[Any, float] = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,14 +1,35 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import os
 from dotenv import load_dotenv
 import logging
-from openai import OpenAI
 import pymongo
 from pymongo import MongoClient
 import json
+import hashlib
+import base64
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import time
+from pathlib import Path
+from cache import TTLCache, normalize_query
+from context_builder import TokenCounter, load_tokenizer, pack_context
+from corpus import get_corpus_version
+from extractive import extractive_answer
+from facets import load_facets
+from hybrid_search import reciprocal_rank_fusion, resolve_retrieval_mode, text_search_filter
+from metrics import REGISTRY, MetricsMiddleware, record_stage, stage
+from response_cache import ResponseCache, response_cache_key
+from singleflight import SingleFlight
+from stream_json import ObjectStreamParser
+from upstream import UpstreamCaller, create_async_client
+from vector_index import DEFAULT_INDEX_PATH, RESCORE_CANDIDATES, VectorIndex, aggregation_similarity_pipeline, load_index
 
 # Load environment variables
 load_dotenv()
@@ -30,12 +51,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
-# Initialize OpenAI client with AI/ML API
-openai_client = OpenAI(
-    base_url="https://api.aimlapi.com/v1",
-    api_key=os.getenv("AIMLAPI_KEY"),
+# Per-stage timings in a Server-Timing header, request latency and in-flight metrics
+app.add_middleware(MetricsMiddleware, paths=["/search", "/search/stream", "/search/batch", "/retrieve"])
+
+# Initialize OpenAI client with AI/ML API (async so requests never block the event loop)
+openai_client = create_async_client()
+
+# Deadline, jittered retries and optional hedging for query embeddings (idempotent, so safe to repeat)
+embedding_caller = UpstreamCaller("embedding")
+
+# pymongo, NumPy scoring and SQLite are synchronous; they run here instead of on the event loop
+blocking_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BLOCKING_POOL_SIZE", "16")),
+    thread_name_prefix="blocking"
+)
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a synchronous call on the bounded blocking executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, partial(func, *args, **kwargs))
+
+async def timed(name: str, awaitable):
+    """Await a call, recording its duration as a request stage"""
+    with stage(name):
+        return await awaitable
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+
+# Query embeddings are reused for repeated searches, skipping the embedding API round trip
+embedding_cache = TTLCache(
+    max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
 )
 
 # MongoDB connection
@@ -52,10 +101,124 @@ except Exception as e:
     logger.error(f"Failed to connect to MongoDB: {e}")
     mongo_client = None
 
+# In-memory vector index, loaded at startup
+vector_index: Optional[VectorIndex] = None
+use_vector_index = os.getenv("USE_VECTOR_INDEX", "true").lower() == "true"
+ann_nprobe = int(os.getenv("ANN_NPROBE")) if os.getenv("ANN_NPROBE") else None
+# Overrides the two-stage prefix saved with the index (0 disables it)
+matryoshka_dims = int(os.getenv("MATRYOSHKA_DIMS")) if os.getenv("MATRYOSHKA_DIMS") else None
+
+vector_index_lock = threading.Lock()
+
+# Corpus version the in-memory state was built from, re-read at most every CORPUS_VERSION_TTL seconds
+corpus_version = 0
+corpus_version_checked_at = 0.0
+# Newer corpus version whose index is being loaded; it is adopted only once the load succeeds
+corpus_version_loading: Optional[int] = None
+CORPUS_VERSION_TTL = float(os.getenv("CORPUS_VERSION_TTL", "5"))
+
+# Finished search responses, in memory and in a SQLite file shared by all workers
+use_response_cache = os.getenv("USE_RESPONSE_CACHE", "true").lower() == "true"
+response_cache = ResponseCache(
+    path=os.getenv("RESPONSE_CACHE_PATH", str(Path(__file__).parent / "response_cache.sqlite3")),
+    memory_size=int(os.getenv("RESPONSE_CACHE_SIZE", "512")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+)
+
+# Identical searches in flight at the same time share one computation, keyed on the response cache key
+search_flight = SingleFlight()
+
+# Serialized facet summary as (corpus version, ETag, JSON body), reloaded when the corpus version changes
+facets_snapshot: Optional[tuple] = None
+
+# Batch search limits
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "256"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+# Hybrid retrieval: default mode and how many candidates each ranking contributes to fusion
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+# LLM context packing: candidates retrieved per search, the prompt's context token
+# budget, the cap per passage and the MMR relevance/diversity trade-off
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "10"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "700"))
+CONTEXT_PASSAGE_TOKENS = int(os.getenv("CONTEXT_PASSAGE_TOKENS", "250"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+# Latency budget of a /search in milliseconds, 0 for none. A search whose LLM answer is not
+# ready by then gets an extractive answer; LLM_OVERRUN decides whether the LLM call is then
+# cancelled ("cancel") or left to finish and fill the response cache ("background")
+SEARCH_LATENCY_BUDGET_MS = float(os.getenv("SEARCH_LATENCY_BUDGET_MS", "12000"))
+LLM_OVERRUN = os.getenv("LLM_OVERRUN", "background")
+
+# LLM calls still running for searches that already got an extractive answer
+background_llm_tasks = set()
+latency_budget_stats = {"extractive_answers": 0, "background_completions": 0, "cancelled": 0}
+
+# Prometheus metrics served on /metrics; stage and request timings are defined in metrics.py
+EMBEDDING_IN_FLIGHT = REGISTRY.gauge("api_embedding_calls_in_flight", "Embedding API calls in progress")
+LLM_IN_FLIGHT = REGISTRY.gauge("api_llm_calls_in_flight", "LLM completions being streamed")
+LLM_TOKENS = REGISTRY.counter("api_llm_tokens_total", "Context tokens sent to and completion tokens received from the LLM", ("kind",))
+REGISTRY.callback(
+    "api_cache_requests_total", "Cache lookups by cache and result", "counter", ("cache", "result"),
+    lambda: {
+        ("embedding", "hit"): embedding_cache.hits,
+        ("embedding", "miss"): embedding_cache.misses,
+        ("response", "hit"): response_cache.memory.hits + response_cache.disk_hits,
+        ("response", "miss"): response_cache.disk_misses,
+    }
+)
+REGISTRY.callback(
+    "api_search_executions_total", "Searches computed, and searches that joined one already running", "counter", ("result",),
+    lambda: {("executed",): search_flight.executions, ("coalesced",): search_flight.coalesced}
+)
+REGISTRY.callback(
+    "api_extractive_answers_total", "Searches answered extractively because the LLM missed the latency budget", "counter", (),
+    lambda: {(): latency_budget_stats["extractive_answers"]}
+)
+REGISTRY.callback(
+    "api_embedding_upstream_events_total", "Embedding call retries, hedged requests and deadline misses", "counter", ("event",),
+    lambda: {
+        ("retry",): embedding_caller.retried,
+        ("hedge",): embedding_caller.hedged,
+        ("hedge_win",): embedding_caller.hedge_wins,
+        ("deadline_exceeded",): embedding_caller.deadline_exceeded,
+    }
+)
+
+# Counts context tokens in the LLM's encoding; loaded at startup
+token_counter: Optional[TokenCounter] = None
+
+# Fields returned for retrieved chunks (never the embedding itself)
+RESULT_PROJECTION = {
+    "_id": 1,
+    "organism_name": 1,
+    "condition": 1,
+    "description": 1,
+    "scientific_details": 1,
+    "content": 1,
+    "filename": 1,
+    "title": 1,
+    "author": 1,
+    "organism_tags": 1,
+    "condition_tags": 1,
+    "chunk_index": 1,
+    "start_char": 1,
+    "end_char": 1
+}
+
+# /retrieve page size limit, and how deep pagination may go into the ranking
+RETRIEVE_MAX_LIMIT = int(os.getenv("RETRIEVE_MAX_LIMIT", "50"))
+RETRIEVE_MAX_DEPTH = int(os.getenv("RETRIEVE_MAX_DEPTH", "200"))
+
 # Request/Response models
 class SearchRequest(BaseModel):
     query: str
     condition: Optional[str] = None  # microgravity, radiation, temperature
+    organism: Optional[str] = None  # Only chunks mentioning this organism, e.g. "C. elegans"
+    retrieval_mode: Optional[str] = None  # vector, hybrid, lexical or auto; defaults to RETRIEVAL_MODE
+    latency_budget_ms: Optional[float] = None  # Overrides SEARCH_LATENCY_BUDGET_MS for /search, 0 for none
 
 class SearchResponse(BaseModel):
     organism_name: str
@@ -63,140 +226,233 @@ class SearchResponse(BaseModel):
     description: str
     scientific_details: dict
     relevant_chunks: List[str]
+    extractive: bool = False  # Built from the chunks alone because the LLM missed the latency budget
+
+class BatchSearchRequest(BaseModel):
+    searches: List[SearchRequest]
+
+class BatchSearchItem(BaseModel):
+    index: int
+    result: Optional[SearchResponse] = None
+    error: Optional[str] = None
+    status_code: int = 200
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchItem]
+
+class RetrieveRequest(BaseModel):
+    query: str
+    condition: Optional[str] = None
+    organism: Optional[str] = None
+    retrieval_mode: Optional[str] = None
+    limit: int = 10  # Chunks per page, at most RETRIEVE_MAX_LIMIT
+    cursor: Optional[str] = None  # next_cursor of the previous page
+
+class RetrievedChunk(BaseModel):
+    id: str
+    rank: int
+    score: float  # Cosine similarity, fused RRF score or text score, depending on the retrieval mode
+    content: str
+    filename: Optional[str] = None
+    title: Optional[str] = None
+    author: Optional[str] = None
+    organism_name: Optional[str] = None
+    condition: Optional[str] = None
+    organism_tags: List[str] = []
+    condition_tags: List[str] = []
+    chunk_index: Optional[int] = None
+    start_char: Optional[int] = None
+    end_char: Optional[int] = None
+
+class RetrieveResponse(BaseModel):
+    chunks: List[RetrievedChunk]
+    next_cursor: Optional[str] = None
 
 class ErrorResponse(BaseModel):
     error: str
     detail: str
 
-def get_embedding(text: str) -> List[float]:
+async def get_embedding(text: str) -> List[float]:
     """Get embedding for text using OpenAI embedding model"""
+    cache_key = (EMBEDDING_MODEL, normalize_query(text))
+    cached = embedding_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     try:
-        response = openai_client.embeddings.create(
-            model="text-embedding-3-large",
-            input=text
-        )
-        return response.data[0].embedding
+        with stage("embedding"), EMBEDDING_IN_FLIGHT.track():
+            response = await embedding_caller.call(lambda: openai_client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=text
+            ))
+        embedding = response.data[0].embedding
+        embedding_cache.set(cache_key, embedding)
+        return embedding
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Embedding request timed out")
     except Exception as e:
         logger.error(f"Error getting embedding: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate embedding")
 
-def query_mongodb_with_embedding(query_embedding: List[float], condition: Optional[str] = None, limit: int = 5):
+async def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """Get embeddings for many texts with a single embedding request for the uncached ones"""
+    cache_keys = [(EMBEDDING_MODEL, normalize_query(text)) for text in texts]
+    embeddings = [embedding_cache.get(key) for key in cache_keys]
+    
+    # Embed each distinct missing text once
+    missing = {}
+    for text, key, embedding in zip(texts, cache_keys, embeddings):
+        if embedding is None and key not in missing:
+            missing[key] = text
+    
+    if missing:
+        try:
+            inputs = list(missing.values())
+            with stage("embedding"), EMBEDDING_IN_FLIGHT.track():
+                response = await embedding_caller.call(lambda: openai_client.embeddings.create(
+                    model=EMBEDDING_MODEL,
+                    input=inputs
+                ))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Embedding request timed out")
+        except Exception as e:
+            logger.error(f"Error getting embeddings: {e}")
+            raise HTTPException(status_code=500, detail="Failed to generate embedding")
+        
+        missing_keys = list(missing)
+        fresh = {}
+        for item in response.data:
+            fresh[missing_keys[item.index]] = item.embedding
+            embedding_cache.set(missing_keys[item.index], item.embedding)
+        embeddings = [embedding if embedding is not None else fresh[key] for key, embedding in zip(cache_keys, embeddings)]
+    
+    return embeddings
+
+def query_mongodb_with_aggregation(query_embedding: List[float], condition: Optional[str] = None, limit: int = 5,
+                                   organism: Optional[str] = None):
+    """Query MongoDB by scoring every document inside an aggregation pipeline"""
+    pipeline = aggregation_similarity_pipeline(query_embedding, condition, limit, organism, RESULT_PROJECTION)
+    return list(collection.aggregate(pipeline))
+
+def query_mongodb_with_embedding(query_embedding: List[float], condition: Optional[str] = None, limit: int = 5,
+                                 organism: Optional[str] = None):
     """Query MongoDB using vector similarity search"""
     try:
-        # MongoDB aggregation pipeline for vector search
-        pipeline = []
+        if vector_index is None or len(vector_index) == 0:
+            return query_mongodb_with_aggregation(query_embedding, condition, limit, organism)
         
-        # Add condition filter if provided
-        if condition:
-            pipeline.append({
-                "$match": {
-                    "condition": {"$regex": condition, "$options": "i"}
-                }
-            })
-        
-        # Vector similarity search using $vectorSearch (if available) or manual cosine similarity
-        pipeline.extend([
-            {
-                "$addFields": {
-                    "similarity": {
-                        "$reduce": {
-                            "input": {"$range": [0, {"$size": "$embedding"}]},
-                            "initialValue": 0,
-                            "in": {
-                                "$add": [
-                                    "$$value",
-                                    {
-                                        "$multiply": [
-                                            {"$arrayElemAt": ["$embedding", "$$this"]},
-                                            {"$arrayElemAt": [query_embedding, "$$this"]}
-                                        ]
-                                    }
-                                ]
-                            }
-                        }
-                    }
-                }
-            },
-            {"$sort": {"similarity": -1}},
-            {"$limit": limit},
-            {
-                "$project": {
-                    "_id": 1,
-                    "organism_name": 1,
-                    "condition": 1,
-                    "description": 1,
-                    "scientific_details": 1,
-                    "content": 1,
-                    "similarity": 1
-                }
-            }
-        ])
-        
-        results = list(collection.aggregate(pipeline))
-        return results
+        # Score in memory, then fetch only the winning documents
+        hits = vector_index.search(query_embedding, limit, condition, organism)
+        return fetch_chunks([hits])[0]
         
     except Exception as e:
         logger.error(f"Error querying MongoDB: {e}")
         raise HTTPException(status_code=500, detail="Failed to query database")
 
-def get_llm_response(user_query: str, chunks: List[dict], condition: Optional[str] = None) -> dict:
-    """Get response from LLM with system prompt and retrieved chunks"""
-    
-    # Validate chunks
-    if not chunks:
-        logger.warning("No chunks provided to LLM")
-        return {
-            "organism_name": "Unknown",
-            "condition": condition if condition else "Not specified",
-            "description": "No relevant data found",
-            "scientific_details": {
-                "classification": "Unknown",
-                "response_mechanisms": [],
-                "experimental_findings": "No data available",
-                "applications": "No data available"
-            },
-            "relevant_chunks": []
-        }
-    
-    # Prepare context from chunks - limit to first 3 chunks to avoid token limits
-    limited_chunks = chunks[:3]  # Take only top 3 chunks
-    context_parts = []
-    
-    for i, chunk in enumerate(limited_chunks):
-        content = chunk.get('content', '').strip()
-        if not content or len(content) < 10:  # Skip very short or empty chunks
-            continue
-            
-        context_part = f"--- Chunk {i+1} ---\n"
-        context_part += f"Organism: {chunk.get('organism_name', 'Unknown')}\n"
-        context_part += f"Condition: {chunk.get('condition', 'Not specified')}\n"
+def query_mongodb_with_embeddings(query_embeddings: List[List[float]], conditions: List[Optional[str]], limit: int = 5,
+                                  organisms: Optional[List[Optional[str]]] = None) -> List[List[dict]]:
+    """Query MongoDB for many query embeddings, scoring them together"""
+    if organisms is None:
+        organisms = [None] * len(query_embeddings)
+    try:
+        if vector_index is None or len(vector_index) == 0:
+            return [
+                query_mongodb_with_aggregation(query_embedding, condition, limit, organism)
+                for query_embedding, condition, organism in zip(query_embeddings, conditions, organisms)
+            ]
         
-        # Limit content length to avoid token issues
-        if len(content) > 1000:
-            content = content[:1000] + "..."
-        context_part += f"Content: {content}"
+        return fetch_chunks(vector_index.search_batch(query_embeddings, limit, conditions, organisms=organisms))
         
-        context_parts.append(context_part)
-    
-    context = "\n\n".join(context_parts)
+    except Exception as e:
+        logger.error(f"Error querying MongoDB: {e}")
+        raise HTTPException(status_code=500, detail="Failed to query database")
+
+def vector_hits(query_embeddings: List[List[float]], conditions: List[Optional[str]], limit: int,
+                organisms: Optional[List[Optional[str]]] = None) -> List[List[tuple]]:
+    """Rank chunks by vector similarity, returning (id, similarity) hits per query"""
+    if organisms is None:
+        organisms = [None] * len(query_embeddings)
+    if vector_index is None or len(vector_index) == 0:
+        return [
+            [
+                (document["_id"], document["similarity"])
+                for document in query_mongodb_with_aggregation(query_embedding, condition, limit, organism)
+            ]
+            for query_embedding, condition, organism in zip(query_embeddings, conditions, organisms)
+        ]
+    return vector_index.search_batch(query_embeddings, limit, conditions, organisms=organisms)
+
+def lexical_hits(query: str, condition: Optional[str] = None, limit: int = 5, organism: Optional[str] = None) -> List[tuple]:
+    """Rank chunks with the MongoDB text index, returning (id, text score) hits"""
+    cursor = collection.find(text_search_filter(query, condition, organism), {"score": {"$meta": "textScore"}})
+    cursor = cursor.sort([("score", {"$meta": "textScore"})]).limit(limit)
+    return [(document["_id"], document["score"]) for document in cursor]
+
+def query_mongodb_with_text(query: str, condition: Optional[str] = None, limit: int = 5,
+                            organism: Optional[str] = None) -> List[dict]:
+    """Query MongoDB with the text index only, without an embedding"""
+    try:
+        return fetch_chunks([lexical_hits(query, condition, limit, organism)])[0]
+    except Exception as e:
+        logger.error(f"Error querying MongoDB text index: {e}")
+        raise HTTPException(status_code=500, detail="Failed to query database")
+
+def query_mongodb_hybrid(query_embeddings: List[List[float]], lexical_hit_lists: List[List[tuple]],
+                         conditions: List[Optional[str]], limit: int = 5,
+                         organisms: Optional[List[Optional[str]]] = None) -> List[List[dict]]:
+    """Fuse vector and lexical rankings with reciprocal-rank fusion; `similarity` holds the fused score"""
+    try:
+        vector_hit_lists = vector_hits(query_embeddings, conditions, max(limit, HYBRID_CANDIDATES), organisms)
+        fused = [
+            reciprocal_rank_fusion([vector_ranking, lexical_ranking])[:limit]
+            for vector_ranking, lexical_ranking in zip(vector_hit_lists, lexical_hit_lists)
+        ]
+        return fetch_chunks(fused)
+    except Exception as e:
+        logger.error(f"Error querying MongoDB: {e}")
+        raise HTTPException(status_code=500, detail="Failed to query database")
+
+def fetch_chunks(hit_lists: List[List[tuple]]) -> List[List[dict]]:
+    """Fetch the documents for lists of (id, similarity) hits with one query, keeping hit order"""
+    all_ids = list({doc_id for hits in hit_lists for doc_id, _ in hits})
+    if not all_ids:
+        return [[] for _ in hit_lists]
     
-    # If no valid content found, return fallback
-    if not context.strip():
-        logger.warning("No valid content found in chunks")
-        return {
-            "organism_name": "Unknown",
-            "condition": condition if condition else "Not specified", 
-            "description": "No valid scientific content found",
-            "scientific_details": {
-                "classification": "Unknown",
-                "response_mechanisms": [],
-                "experimental_findings": "No data available",
-                "applications": "No data available"
-            },
-            "relevant_chunks": []
-        }
+    documents = {
+        document["_id"]: document
+        for document in collection.find({"_id": {"$in": all_ids}}, RESULT_PROJECTION)
+    }
     
-    system_prompt = """You are an expert scientific research assistant. Your ONLY job is to return a valid JSON object.
+    results = []
+    for hits in hit_lists:
+        chunks = []
+        for doc_id, similarity in hits:
+            document = documents.get(doc_id)
+            if document is None:
+                continue  # Deleted since the index was loaded
+            chunks.append({**document, "similarity": similarity})
+        results.append(chunks)
+    return results
+
+def fallback_response(condition: Optional[str], description: str, experimental_findings: str = "No data available") -> dict:
+    """Build the placeholder response returned when the LLM cannot produce an answer"""
+    return {
+        "organism_name": "Unknown",
+        "condition": condition if condition else "Not specified",
+        "description": description,
+        "scientific_details": {
+            "classification": "Unknown",
+            "response_mechanisms": [],
+            "experimental_findings": experimental_findings,
+            "applications": "No data available"
+        },
+        "relevant_chunks": [],
+        "is_fallback": True
+    }
+
+LLM_MODEL = "gpt-4o"
+
+SYSTEM_PROMPT = """You are an expert scientific research assistant. Your ONLY job is to return a valid JSON object.
 
 STRICT REQUIREMENTS:
 1. Return ONLY valid JSON - no text before or after
@@ -234,6 +490,29 @@ EXAMPLE VALID RESPONSE:
 
 RESPOND WITH ONLY THE JSON OBJECT. NO OTHER TEXT."""
 
+def get_token_counter() -> TokenCounter:
+    """Return the context token counter, loading the LLM's tokenizer on first use"""
+    global token_counter
+    if token_counter is None:
+        token_counter = TokenCounter(load_tokenizer(LLM_MODEL))
+    return token_counter
+
+def build_llm_context(chunks: List[dict]) -> str:
+    """Pack retrieved chunks into the context block of the LLM prompt, within CONTEXT_TOKEN_BUDGET tokens"""
+    packed = pack_context(
+        chunks,
+        get_token_counter(),
+        CONTEXT_TOKEN_BUDGET,
+        passage_tokens=CONTEXT_PASSAGE_TOKENS,
+        mmr_lambda=MMR_LAMBDA,
+        vectors=vector_index.vectors if vector_index is not None else None
+    )
+    LLM_TOKENS.inc(packed["tokens"], kind="context")
+    logger.info(f"Packed {packed['chunks_used']} of {len(chunks)} chunks into {packed['passages']} passages, {packed['tokens']} tokens")
+    return packed["context"]
+
+def build_llm_messages(user_query: str, context: str, condition: Optional[str] = None) -> List[dict]:
+    """Build the chat messages sent to the LLM"""
     user_message = f"""Analyze this scientific data and return ONLY a JSON object:
 
 Query: {user_query}
@@ -244,200 +523,644 @@ Data:
 
 Return JSON only."""
 
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_message}
+    ]
+
+# Defaults of the answer's fields, applied while the LLM response streams in
+LLM_FIELD_DEFAULTS = {
+    "organism_name": "Unknown",
+    "condition": "Not specified",
+    "description": "No description available",
+    "scientific_details": {
+        "classification": "Unknown",
+        "response_mechanisms": [],
+        "experimental_findings": "No data available",
+        "applications": "No data available"
+    },
+    "relevant_chunks": []
+}
+
+def llm_answer(parser: ObjectStreamParser, received: bool, user_query: str, condition: Optional[str] = None) -> dict:
+    """Turn a finished parser into the response dict, or a fallback if the LLM produced no usable object"""
+    if not received:
+        logger.error("LLM returned empty response")
+        return fallback_response(condition, f"Unable to process query: {user_query}", "LLM returned empty response")
+    if not parser.started:
+        logger.error("Could not find JSON object in LLM response")
+        return fallback_response(condition, f"Error processing query: {user_query}", "Error in LLM processing")
+    if not parser.fields:
+        logger.error("Failed to parse any field of the LLM response")
+        return fallback_response(condition, f"Error processing response for query: {user_query}", "Error in LLM response processing")
+    
+    response = parser.close()
+    if not parser.complete:
+        # Cut off (e.g. at max_tokens): keep the fields that closed, but never cache the answer
+        logger.warning(f"LLM response ended inside the JSON object, keeping {len(parser.fields)} complete fields")
+        response["is_fallback"] = True
+    return response
+
+async def stream_llm_fields(user_query: str, context: str, condition: Optional[str], parser: ObjectStreamParser):
+    """Stream the LLM completion, yielding each delta with the top-level fields it closed"""
+    counter = get_token_counter()
+    start = time.perf_counter()
+    first_delta = True
+    parse_seconds = 0.0
+    completion_tokens = 0
+    with LLM_IN_FLIGHT.track():
+        try:
+            stream = await openai_client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=build_llm_messages(user_query, context, condition),
+                temperature=0.1,
+                max_tokens=2000,
+                stream=True
+            )
+            async for event in stream:
+                delta = event.choices[0].delta.content if event.choices else None
+                if delta:
+                    if first_delta:
+                        record_stage("llm_first_token", time.perf_counter() - start)
+                        first_delta = False
+                    completion_tokens += counter.count(delta)
+                    parse_start = time.perf_counter()
+                    fields = parser.feed(delta)
+                    parse_seconds += time.perf_counter() - parse_start
+                    yield delta, fields
+        finally:
+            record_stage("llm", time.perf_counter() - start)
+            record_stage("parse", parse_seconds)
+            LLM_TOKENS.inc(completion_tokens, kind="completion")
+
+async def get_llm_response(user_query: str, chunks: List[dict], condition: Optional[str] = None) -> dict:
+    """Get response from LLM with system prompt and retrieved chunks"""
+    
+    # Validate chunks
+    if not chunks:
+        logger.warning("No chunks provided to LLM")
+        return fallback_response(condition, "No relevant data found")
+    
+    # Tokenizing and MMR scoring are CPU-bound; keep them off the event loop
+    context = await timed("context", run_blocking(build_llm_context, chunks))
+    
+    # If no valid content found, return fallback
+    if not context.strip():
+        logger.warning("No valid content found in chunks")
+        return fallback_response(condition, "No valid scientific content found")
+    
     try:
         logger.info(f"Sending request to LLM with {len(context)} characters of context")
         
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.1,
-            max_tokens=2000
-        )
+        # Fields are parsed as the completion streams in, so nothing is left to parse at the end
+        parser = ObjectStreamParser(LLM_FIELD_DEFAULTS)
+        parts = []
+        async for delta, _ in stream_llm_fields(user_query, context, condition, parser):
+            parts.append(delta)
         
-        # Parse JSON response
-        content = response.choices[0].message.content.strip()
+        content = "".join(parts).strip()
         logger.info(f"LLM response length: {len(content)} characters")
         logger.info(f"LLM response preview: {content[:200]}...")
+        # Formatted only when debug logging is on
+        logger.debug("Full LLM response: %r", content)
         
-        print(f"DEBUG - Full LLM response: {repr(content)}")
-        
-        # Check if response is empty
-        if not content:
-            logger.error("LLM returned empty response")
-            logger.info("Returning fallback response due to empty LLM response")
-            return {
-                "organism_name": "Unknown",
-                "condition": condition if condition else "Not specified",
-                "description": f"Unable to process query: {user_query}",
-                "scientific_details": {
-                    "classification": "Unknown",
-                    "response_mechanisms": [],
-                    "experimental_findings": "LLM returned empty response",
-                    "applications": "No data available"
-                },
-                "relevant_chunks": []
-            }
-        
-        # Remove any markdown formatting if present
-        if content.startswith("```json"):
-            content = content[7:]
-        elif content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        
-        # Try to find JSON object in the response
-        content = content.strip()
-        
-        # If response doesn't start with {, try to find the JSON object
-        if not content.startswith("{"):
-            # Find the first { and last }
-            start_idx = content.find("{")
-            end_idx = content.rfind("}")
-            if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                content = content[start_idx:end_idx+1]
-            else:
-                logger.error(f"Could not find JSON object in response: {content}")
-                raise HTTPException(status_code=500, detail="Could not find valid JSON in LLM response")
-        
-        try:
-            parsed_response = json.loads(content)
-            
-            # Validate required fields
-            required_fields = ["organism_name", "condition", "description", "scientific_details"]
-            for field in required_fields:
-                if field not in parsed_response:
-                    logger.warning(f"Missing required field '{field}' in LLM response")
-                    if field == "organism_name":
-                        parsed_response[field] = "Unknown"
-                    elif field == "condition":
-                        parsed_response[field] = "Not specified"
-                    elif field == "description":
-                        parsed_response[field] = "No description available"
-                    elif field == "scientific_details":
-                        parsed_response[field] = {
-                            "classification": "Unknown",
-                            "response_mechanisms": [],
-                            "experimental_findings": "No data available",
-                            "applications": "No data available"
-                        }
-            
-            # Ensure scientific_details has required structure
-            if "scientific_details" in parsed_response and isinstance(parsed_response["scientific_details"], dict):
-                sd = parsed_response["scientific_details"]
-                if "classification" not in sd:
-                    sd["classification"] = "Unknown"
-                if "response_mechanisms" not in sd:
-                    sd["response_mechanisms"] = []
-                if "experimental_findings" not in sd:
-                    sd["experimental_findings"] = "No data available"
-                if "applications" not in sd:
-                    sd["applications"] = "No data available"
-            
-            # Ensure relevant_chunks exists
-            if "relevant_chunks" not in parsed_response:
-                parsed_response["relevant_chunks"] = []
-            
-            return parsed_response
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse LLM response as JSON: {e}")
-            logger.error(f"LLM response content: '{content}'")
-            
-            # Return a fallback response instead of raising an exception
-            logger.info("Returning fallback response due to JSON parsing error")
-            return {
-                "organism_name": "Unknown",
-                "condition": condition if condition else "Not specified",
-                "description": f"Error processing response for query: {user_query}",
-                "scientific_details": {
-                    "classification": "Unknown",
-                    "response_mechanisms": [],
-                    "experimental_findings": "Error in LLM response processing",
-                    "applications": "No data available"
-                },
-                "relevant_chunks": []
-            }
+        return llm_answer(parser, bool(content), user_query, condition)
         
     except Exception as e:
         logger.error(f"Error getting LLM response: {e}")
         # Return a fallback response instead of raising an exception
         logger.info("Returning fallback response due to LLM error")
-        return {
-            "organism_name": "Unknown",
-            "condition": condition if condition else "Not specified",
-            "description": f"Error processing query: {user_query}",
-            "scientific_details": {
-                "classification": "Unknown",
-                "response_mechanisms": [],
-                "experimental_findings": "Error in LLM processing",
-                "applications": "No data available"
-            },
-            "relevant_chunks": []
-        }
+        return fallback_response(condition, f"Error processing query: {user_query}", "Error in LLM processing")
+
+def load_vector_index() -> bool:
+    """Load chunk embeddings into the in-memory vector index, returning False if loading failed"""
+    global vector_index
+    if not use_vector_index or mongo_client is None:
+        logger.info("In-memory vector index disabled, using aggregation pipeline")
+        return True
+    with vector_index_lock:
+        try:
+            # Prefer the index saved by the ingestion pipeline, otherwise load embeddings directly
+            if os.path.exists(DEFAULT_INDEX_PATH):
+                vector_index = load_index(DEFAULT_INDEX_PATH, nprobe=ann_nprobe)
+            else:
+                vector_index = VectorIndex.from_collection(collection)
+            if matryoshka_dims is not None:
+                vector_index.set_prefix(matryoshka_dims, RESCORE_CANDIDATES)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to load vector index, falling back to aggregation pipeline: {e}")
+            vector_index = None
+            return False
+
+def reload_corpus(version: int):
+    """Load the index of a new corpus version, then adopt the version and drop responses of older ones"""
+    global corpus_version, corpus_version_loading
+    try:
+        # Until the new index is live, searches keep using the old version's cache keys
+        if load_vector_index() and version > corpus_version:
+            corpus_version = version
+            response_cache.purge(version)
+            logger.info(f"Now serving corpus version {version}")
+    finally:
+        if corpus_version_loading == version:
+            corpus_version_loading = None
+
+def current_corpus_version() -> int:
+    """Return the corpus version, refreshing derived state when ingestion has bumped it"""
+    global corpus_version_checked_at, corpus_version_loading
+    now = time.monotonic()
+    if mongo_client is None or now - corpus_version_checked_at < CORPUS_VERSION_TTL:
+        return corpus_version
+    corpus_version_checked_at = now
+    
+    try:
+        version = get_corpus_version(db)
+    except Exception as e:
+        logger.warning(f"Could not read corpus version: {e}")
+        return corpus_version
+    
+    if version > corpus_version and version != corpus_version_loading:
+        logger.info(f"Corpus version changed from {corpus_version} to {version}, reloading")
+        corpus_version_loading = version
+        # Keep serving from the old index, under the old version, while the new one loads
+        threading.Thread(target=reload_corpus, args=(version,), daemon=True).start()
+    return corpus_version
+
+@app.on_event("startup")
+def startup():
+    """Record the corpus version and load the vector index"""
+    global corpus_version, corpus_version_checked_at
+    if mongo_client is not None:
+        try:
+            corpus_version = get_corpus_version(db)
+            corpus_version_checked_at = time.monotonic()
+            response_cache.purge(corpus_version)
+        except Exception as e:
+            logger.warning(f"Could not read corpus version: {e}")
+    load_vector_index()
+    get_token_counter()
 
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {"message": "NASA Hackathon API is running", "status": "healthy"}
 
+async def lookup_cached_response(request: SearchRequest):
+    """Return (cache key, corpus version, cached response or None) for a search"""
+    with stage("cache"):
+        version = await run_blocking(current_corpus_version)
+        cache_key = response_cache_key(request.query, request.condition, version, request.retrieval_mode or RETRIEVAL_MODE,
+                                       request.organism)
+        cached = None
+        if use_response_cache:
+            cached = await run_blocking(response_cache.get, cache_key)
+    return cache_key, version, cached
+
+async def store_cached_response(cache_key: str, version: int, response: SearchResponse, llm_response: dict):
+    """Cache a finished response unless it is a fallback produced by an LLM error or an extractive answer"""
+    if use_response_cache and not llm_response.get("is_fallback") and not llm_response.get("extractive"):
+        await run_blocking(response_cache.set, cache_key, jsonable_encoder(response), version)
+
+def retrieval_mode_for(request: SearchRequest) -> str:
+    """Resolve the concrete retrieval mode of a request, raising 400 for unknown modes"""
+    try:
+        return resolve_retrieval_mode(request.retrieval_mode or RETRIEVAL_MODE, request.query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def find_chunks(request: SearchRequest, limit: int = CONTEXT_CANDIDATES) -> List[dict]:
+    """Retrieve up to `limit` chunks for a search, best first"""
+    mode = retrieval_mode_for(request)
+    chunks = []
+    
+    if mode == "lexical":
+        # Keyword lookups skip the embedding call entirely
+        logger.info("Querying MongoDB text index...")
+        chunks = await timed("retrieval", run_blocking(query_mongodb_with_text, request.query, request.condition, limit, request.organism))
+        if not chunks and (request.retrieval_mode or RETRIEVAL_MODE) == "auto":
+            # An "auto" keyword guess found nothing lexically; fall back to embeddings
+            mode = "vector"
+    
+    if mode == "hybrid":
+        # The text search runs while the query is being embedded
+        logger.info("Generating embeddings and querying MongoDB text index...")
+        query_embedding, lexical = await asyncio.gather(
+            get_embedding(request.query),
+            timed("retrieval", run_blocking(lexical_hits, request.query, request.condition, max(limit, HYBRID_CANDIDATES), request.organism))
+        )
+        chunks = (await timed("retrieval", run_blocking(
+            query_mongodb_hybrid, [query_embedding], [lexical], [request.condition], limit, [request.organism]
+        )))[0]
+    
+    elif mode == "vector":
+        # Step 1: Convert user query to embeddings
+        logger.info("Generating embeddings for user query...")
+        query_embedding = await get_embedding(request.query)
+        
+        # Step 2: Query MongoDB with embeddings
+        logger.info("Querying MongoDB with embeddings...")
+        chunks = await timed("retrieval", run_blocking(query_mongodb_with_embedding, query_embedding, request.condition, limit, request.organism))
+    
+    return chunks
+
+async def retrieve_chunks(request: SearchRequest) -> List[dict]:
+    """Retrieve the most relevant chunks for a search, raising 404 if none match"""
+    chunks = await find_chunks(request)
+    
+    if not chunks:
+        raise HTTPException(
+            status_code=404, 
+            detail="No relevant organism data found for the given query and condition"
+        )
+    
+    logger.info(f"Retrieved {len(chunks)} relevant chunks from database")
+    return chunks
+
+async def retrieve_chunks_batch(searches: List[SearchRequest], modes: List[str]) -> List[List[dict]]:
+    """
+    Retrieve chunks for many searches, which may be empty lists
+    
+    Lexical searches run first, each on its own; "auto" keyword guesses that find
+    nothing join the vector searches. Everything that needs an embedding is then
+    embedded with one call, and vector searches are scored together.
+    """
+    results: List[List[dict]] = [[] for _ in searches]
+    modes = list(modes)
+    
+    lexical = [i for i, mode in enumerate(modes) if mode == "lexical"]
+    lexical_results = await asyncio.gather(*(
+        timed("retrieval", run_blocking(query_mongodb_with_text, searches[i].query, searches[i].condition, CONTEXT_CANDIDATES, searches[i].organism))
+        for i in lexical
+    ))
+    for i, chunks in zip(lexical, lexical_results):
+        results[i] = chunks
+        if not chunks and (searches[i].retrieval_mode or RETRIEVAL_MODE) == "auto":
+            modes[i] = "vector"
+    
+    embedded = [i for i, mode in enumerate(modes) if mode != "lexical"]
+    if not embedded:
+        return results
+    query_embeddings = dict(zip(embedded, await get_embeddings([searches[i].query for i in embedded])))
+    
+    vector = [i for i in embedded if modes[i] == "vector"]
+    if vector:
+        chunk_lists = await timed("retrieval", run_blocking(
+            query_mongodb_with_embeddings, [query_embeddings[i] for i in vector], [searches[i].condition for i in vector],
+            CONTEXT_CANDIDATES, [searches[i].organism for i in vector]
+        ))
+        for i, chunks in zip(vector, chunk_lists):
+            results[i] = chunks
+    
+    hybrid = [i for i in embedded if modes[i] == "hybrid"]
+    if hybrid:
+        lexical_hit_lists = await asyncio.gather(*(
+            timed("retrieval", run_blocking(lexical_hits, searches[i].query, searches[i].condition, HYBRID_CANDIDATES, searches[i].organism))
+            for i in hybrid
+        ))
+        chunk_lists = await timed("retrieval", run_blocking(
+            query_mongodb_hybrid, [query_embeddings[i] for i in hybrid], list(lexical_hit_lists),
+            [searches[i].condition for i in hybrid], CONTEXT_CANDIDATES, [searches[i].organism for i in hybrid]
+        ))
+        for i, chunks in zip(hybrid, chunk_lists):
+            results[i] = chunks
+    
+    return results
+
+def relevant_chunk_texts(chunks: List[dict]) -> List[str]:
+    """Extract the chunk texts returned to the client"""
+    return [chunk.get('content', '') for chunk in chunks[:3]]  # Top 3 chunks
+
+def build_search_response(request: SearchRequest, chunks: List[dict], llm_response: dict) -> SearchResponse:
+    """Combine the LLM answer and retrieved chunks into a SearchResponse"""
+    return SearchResponse(
+        organism_name=llm_response.get('organism_name', 'Unknown'),
+        condition=llm_response.get('condition', request.condition),
+        description=llm_response.get('description', ''),
+        scientific_details=llm_response.get('scientific_details', {}),
+        relevant_chunks=relevant_chunk_texts(chunks),
+        extractive=llm_response.get("extractive", False)
+    )
+
+async def finish_llm_in_background(request: SearchRequest, chunks: List[dict], llm_task: asyncio.Future,
+                                   cache_key: str, version: int):
+    """Cache the LLM answer of a search that was already answered extractively"""
+    try:
+        llm_response = await llm_task
+    except Exception as e:
+        logger.error(f"Background LLM call failed: {e}")
+        return
+    response = build_search_response(request, chunks, llm_response)
+    await store_cached_response(cache_key, version, response, llm_response)
+    latency_budget_stats["background_completions"] += 1
+    logger.info("Cached LLM answer of a search answered extractively")
+
+async def get_llm_response_within(request: SearchRequest, chunks: List[dict], deadline: Optional[float],
+                                  cache_key: str, version: int) -> dict:
+    """Get the LLM answer, or an extractive answer if the LLM has not finished by the monotonic deadline"""
+    if deadline is None:
+        return await get_llm_response(request.query, chunks, request.condition)
+    
+    llm_task = asyncio.ensure_future(get_llm_response(request.query, chunks, request.condition))
+    try:
+        # Shielded so the timeout leaves the LLM call running
+        return await asyncio.wait_for(asyncio.shield(llm_task), max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        pass
+    
+    latency_budget_stats["extractive_answers"] += 1
+    if LLM_OVERRUN == "cancel":
+        llm_task.cancel()
+        latency_budget_stats["cancelled"] += 1
+        logger.warning("LLM missed the latency budget, cancelled it and answered extractively")
+    else:
+        task = asyncio.ensure_future(finish_llm_in_background(request, chunks, llm_task, cache_key, version))
+        background_llm_tasks.add(task)
+        task.add_done_callback(background_llm_tasks.discard)
+        logger.warning("LLM missed the latency budget, answered extractively while it finishes")
+    return extractive_answer(request.query, chunks, request.condition)
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.post("/search", response_model=SearchResponse)
 async def search_organism(request: SearchRequest):
     """
     Search for organism information using embedding-based retrieval and LLM processing
     
+    The response is due within the request's latency budget. If the LLM has not
+    answered by then, an extractive answer built from the retrieved chunks is
+    returned instead, with `extractive` set.
+    
     Args:
         request: SearchRequest containing query string and optional condition filter
         
     Returns:
         SearchResponse with comprehensive organism information
     """
+    # Monotonic time by which the response is due, whatever the LLM is doing
+    budget_ms = request.latency_budget_ms if request.latency_budget_ms is not None else SEARCH_LATENCY_BUDGET_MS
+    deadline = time.monotonic() + budget_ms / 1000 if budget_ms > 0 else None
+    
     try:
         logger.info(f"Processing search request: {request.query}, condition: {request.condition}")
         
-        # Step 1: Convert user query to embeddings
-        logger.info("Generating embeddings for user query...")
-        query_embedding = get_embedding(request.query)
+        # Serve repeated searches over an unchanged corpus from the response cache
+        cache_key, version, cached = await lookup_cached_response(request)
+        if cached is not None:
+            logger.info("Serving cached search response")
+            return SearchResponse(**cached)
         
-        # Step 2: Query MongoDB with embeddings
-        logger.info("Querying MongoDB with embeddings...")
-        chunks = query_mongodb_with_embedding(query_embedding, request.condition)
+        async def compute() -> SearchResponse:
+            chunks = await retrieve_chunks(request)
+            
+            # Step 3: Send to LLM for processing
+            logger.info("Processing with LLM...")
+            llm_response = await get_llm_response_within(request, chunks, deadline, cache_key, version)
+            
+            response = build_search_response(request, chunks, llm_response)
+            await store_cached_response(cache_key, version, response, llm_response)
+            return response
         
-        if not chunks:
-            raise HTTPException(
-                status_code=404, 
-                detail="No relevant organism data found for the given query and condition"
-            )
+        # Concurrent identical searches wait for the one already running. The flight's deadline is
+        # its starter's, so only searches with the same latency budget share it
+        response = await search_flight.run((cache_key, budget_ms), compute)
+        
+        logger.info("Search request completed successfully")
+        return response
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in search endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.post("/search/stream")
+async def search_organism_stream(request: SearchRequest):
+    """
+    Streaming variant of /search using Server-Sent Events
+    
+    Retrieval happens before the response starts, so errors still map to HTTP
+    status codes. The stream then carries:
+    
+    - `chunks`: {"relevant_chunks": [...]} as soon as retrieval finishes
+    - `token`: {"text": "..."} for each LLM delta
+    - `field`: {"name": "...", "value": ...} as each top-level answer field closes, defaults applied
+    - `result`: the final SearchResponse, same shape as /search
+    - `error`: {"detail": "..."} if the LLM stream fails part way
+    
+    Args:
+        request: SearchRequest containing query string and optional condition filter
         
-        logger.info(f"Retrieved {len(chunks)} relevant chunks from database")
+    Returns:
+        text/event-stream response
+    """
+    try:
+        logger.info(f"Processing streaming search request: {request.query}, condition: {request.condition}")
         
-        # Step 3: Send to LLM for processing
-        logger.info("Processing with LLM...")
-        llm_response = get_llm_response(request.query, chunks, request.condition)
+        cache_key, version, cached = await lookup_cached_response(request)
+        chunks = None if cached is not None else await retrieve_chunks(request)
         
-        # Extract relevant chunks for the response
-        relevant_chunks = [chunk.get('content', '') for chunk in chunks[:3]]  # Top 3 chunks
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in streaming search endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    async def events():
+        if cached is not None:
+            logger.info("Serving cached search response")
+            yield sse_event("chunks", {"relevant_chunks": cached.get("relevant_chunks", [])})
+            yield sse_event("result", cached)
+            return
         
-        # Create response
-        response = SearchResponse(
-            organism_name=llm_response.get('organism_name', 'Unknown'),
-            condition=llm_response.get('condition', request.condition),
-            description=llm_response.get('description', ''),
-            scientific_details=llm_response.get('scientific_details', {}),
-            relevant_chunks=relevant_chunks
-        )
+        yield sse_event("chunks", {"relevant_chunks": relevant_chunk_texts(chunks)})
         
-        logger.info("Search request completed successfully")
-        return response
+        context = await timed("context", run_blocking(build_llm_context, chunks))
+        if not context.strip():
+            llm_response = fallback_response(request.condition, "No valid scientific content found")
+        else:
+            try:
+                logger.info(f"Streaming LLM response with {len(context)} characters of context")
+                parser = ObjectStreamParser(LLM_FIELD_DEFAULTS)
+                received = False
+                async for delta, fields in stream_llm_fields(request.query, context, request.condition, parser):
+                    received = received or bool(delta.strip())
+                    yield sse_event("token", {"text": delta})
+                    for name, value in fields:
+                        yield sse_event("field", {"name": name, "value": value})
+                
+                llm_response = llm_answer(parser, received, request.query, request.condition)
+                
+            except Exception as e:
+                logger.error(f"Error streaming LLM response: {e}")
+                yield sse_event("error", {"detail": "Error in LLM processing"})
+                llm_response = fallback_response(request.condition, f"Error processing query: {request.query}", "Error in LLM processing")
+        
+        response = build_search_response(request, chunks, llm_response)
+        await store_cached_response(cache_key, version, response, llm_response)
+        yield sse_event("result", jsonable_encoder(response))
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_organism_batch(request: BatchSearchRequest):
+    """
+    Run many searches in one request
+    
+    All uncached queries are embedded with one embedding call and scored together
+    against the corpus. LLM calls then run with at most BATCH_LLM_CONCURRENCY in
+    flight. A failing item does not fail the batch; it carries its own error.
+    
+    Args:
+        request: BatchSearchRequest with a list of searches
         
+    Returns:
+        BatchSearchResponse with one item per search, in request order
+    """
+    searches = request.searches
+    if len(searches) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch size {len(searches)} exceeds the limit of {BATCH_MAX_SIZE}")
+    
+    logger.info(f"Processing batch search with {len(searches)} queries")
+    items = [BatchSearchItem(index=i) for i in range(len(searches))]
+    
+    # Serve what we can from the response cache
+    lookups = await asyncio.gather(*(lookup_cached_response(search) for search in searches))
+    pending = []
+    for i, (cache_key, version, cached) in enumerate(lookups):
+        if cached is not None:
+            items[i].result = SearchResponse(**cached)
+        else:
+            pending.append(i)
+    
+    # Unknown retrieval modes fail only their own item
+    modes = {}
+    for i in list(pending):
+        try:
+            modes[i] = retrieval_mode_for(searches[i])
+        except HTTPException as e:
+            items[i].error = e.detail
+            items[i].status_code = e.status_code
+            pending.remove(i)
+    
+    if pending:
+        try:
+            chunk_lists = await retrieve_chunks_batch([searches[i] for i in pending], [modes[i] for i in pending])
+        except HTTPException as e:
+            for i in pending:
+                items[i].error = e.detail
+                items[i].status_code = e.status_code
+            return BatchSearchResponse(results=items)
+        
+        semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+        
+        async def answer(i: int, chunks: List[dict]):
+            search = searches[i]
+            if not chunks:
+                items[i].error = "No relevant organism data found for the given query and condition"
+                items[i].status_code = 404
+                return
+            cache_key, version, _ = lookups[i]
+            
+            async def compute() -> SearchResponse:
+                async with semaphore:
+                    llm_response = await get_llm_response(search.query, chunks, search.condition)
+                response = build_search_response(search, chunks, llm_response)
+                await store_cached_response(cache_key, version, response, llm_response)
+                return response
+            
+            try:
+                # Duplicates within the batch, or of a /search without a latency budget, share one LLM call
+                items[i].result = await search_flight.run((cache_key, 0), compute)
+            except HTTPException as e:
+                # Raised by a joined /search computation
+                items[i].error = e.detail
+                items[i].status_code = e.status_code
+            except Exception as e:
+                logger.error(f"Error in batch item {i}: {e}")
+                items[i].error = f"Internal server error: {str(e)}"
+                items[i].status_code = 500
+        
+        await asyncio.gather(*(answer(i, chunks) for i, chunks in zip(pending, chunk_lists)))
+    
+    logger.info("Batch search completed")
+    return BatchSearchResponse(results=items)
+
+def encode_cursor(key: str, version: int, offset: int) -> str:
+    """Build the opaque /retrieve cursor for the page starting at `offset`"""
+    payload = json.dumps({"k": key[:16], "v": version, "o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, key: str, version: int) -> int:
+    """Return the offset of a /retrieve cursor, raising 400 if it belongs to another search or corpus version"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset = int(payload["o"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if payload.get("v") != version:
+        raise HTTPException(status_code=400, detail="The corpus changed since this cursor was issued; start again without a cursor")
+    if payload.get("k") != key[:16] or offset < 0:
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this search")
+    return offset
+
+def retrieved_chunk(rank: int, chunk: dict) -> RetrievedChunk:
+    """Convert a retrieved chunk document into its /retrieve representation"""
+    metadata = ("filename", "title", "author", "organism_name", "condition", "organism_tags", "condition_tags",
+                "chunk_index", "start_char", "end_char")
+    return RetrievedChunk(**{
+        **{field: chunk[field] for field in metadata if chunk.get(field) is not None},
+        "id": str(chunk["_id"]),
+        "rank": rank,
+        "score": float(chunk.get("similarity") or 0.0),
+        "content": chunk.get("content", "")
+    })
+
+@app.post("/retrieve", response_model=RetrieveResponse)
+async def retrieve(request: RetrieveRequest):
+    """
+    Return the ranked chunks for a query, without the LLM
+    
+    Latency is the embedding call (skipped for cached queries and lexical
+    mode) plus retrieval. Pages are cut from the top `offset + limit`
+    ranking, so following `next_cursor` re-ranks deeper but never re-embeds.
+    
+    Args:
+        request: RetrieveRequest with the search, page size and optional cursor
+        
+    Returns:
+        RetrieveResponse with one page of chunks and the cursor of the next page
+    """
+    if not 1 <= request.limit <= RETRIEVE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {RETRIEVE_MAX_LIMIT}")
+    
+    search = SearchRequest(query=request.query, condition=request.condition, organism=request.organism,
+                           retrieval_mode=request.retrieval_mode)
+    version = await run_blocking(current_corpus_version)
+    key = response_cache_key(search.query, search.condition, version, search.retrieval_mode or RETRIEVAL_MODE, search.organism)
+    offset = decode_cursor(request.cursor, key, version) if request.cursor else 0
+    
+    depth = min(offset + request.limit, RETRIEVE_MAX_DEPTH)
+    if offset >= depth:
+        return RetrieveResponse(chunks=[])
+    
+    try:
+        chunks = await find_chunks(search, depth)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Unexpected error in search endpoint: {e}")
+        logger.error(f"Unexpected error in retrieve endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    page = [retrieved_chunk(rank, chunk) for rank, chunk in enumerate(chunks[offset:depth], start=offset + 1)]
+    more = len(chunks) == depth and depth < RETRIEVE_MAX_DEPTH
+    return RetrieveResponse(chunks=page, next_cursor=encode_cursor(key, version, depth) if more else None)
 
 @app.get("/health")
 async def health_check():
@@ -451,7 +1174,7 @@ async def health_check():
     # Check MongoDB connection
     try:
         if mongo_client:
-            mongo_client.admin.command('ping')
+            await run_blocking(mongo_client.admin.command, 'ping')
             health_status["mongodb"] = "healthy"
         else:
             health_status["mongodb"] = "disconnected"
@@ -461,13 +1184,68 @@ async def health_check():
     # Check OpenAI connection
     try:
         # Simple test call
-        openai_client.models.list()
+        await openai_client.models.list()
         health_status["openai"] = "healthy"
     except Exception as e:
         health_status["openai"] = f"error: {str(e)}"
     
     return health_status
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics of this worker"""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/stats")
+async def stats():
+    """Cache statistics"""
+    return {
+        "corpus_version": corpus_version,
+        "embedding_cache": embedding_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "search_coalescing": search_flight.stats(),
+        "upstream_embeddings": embedding_caller.stats(),
+        "latency_budget": {**latency_budget_stats, "background_in_flight": len(background_llm_tasks)}
+    }
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+@app.get("/facets")
+async def get_facets(request: Request):
+    """
+    Organism and condition counts for building search filters
+    
+    Served from a summary that ingestion maintains incrementally, so no request
+    scans the chunk collection. The serialized summary is kept in memory per
+    corpus version; clients revalidate with If-None-Match and get 304 while
+    the corpus is unchanged.
+    
+    Returns:
+        Totals, organisms, conditions and organism/condition pairs with paper and chunk counts
+    """
+    global facets_snapshot
+    if mongo_client is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    
+    version = await run_blocking(current_corpus_version)
+    snapshot = facets_snapshot
+    if snapshot is None or snapshot[0] != version:
+        facets = await run_blocking(load_facets, db)
+        body = json.dumps({"corpus_version": version, **facets}).encode("utf-8")
+        etag = f'"facets-{version}-{hashlib.sha256(body).hexdigest()[:16]}"'
+        snapshot = facets_snapshot = (version, etag, body)
+    
+    _, etag, body = snapshot
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/test-llm")
 async def test_llm():
     """Test endpoint to verify LLM connectivity and response format"""
@@ -475,7 +1253,7 @@ async def test_llm():
         test_prompt = """You are a test assistant. Return ONLY this exact JSON:
 {"test": "success", "message": "LLM is working correctly"}"""
         
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model="gpt-4o",
             messages=[{"role": "user", "content": test_prompt}],
             temperature=0.1,
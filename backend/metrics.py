@@ -0,0 +1,272 @@
+"""
+Request stage timing and Prometheus metrics
+
+A small, dependency-free implementation of the Prometheus text format:
+counters, gauges and histograms with labels, plus callback metrics that read
+existing counters (cache stats and the like) only when `/metrics` is scraped.
+Each uvicorn worker keeps its own metrics, so scrape workers individually.
+
+`stage("embedding")` times one stage of a request. The duration goes to the
+`api_stage_duration_seconds` histogram and to the current request's timings,
+which `MetricsMiddleware` returns in a `Server-Timing` header.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; spans cache hits (sub-millisecond) to slow LLM completions
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        """
+        Initialize a metric
+
+        Args:
+            name: Metric name
+            help_text: Description shown in the HELP line
+            labelnames: Names of the labels every sample carries
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+
+    def key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """
+        (suffix, label string, value) for every sample
+        """
+        with self._lock:
+            return [("", format_labels(self.labelnames, key), value) for key, value in self._values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {value:g}" for suffix, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """
+        Count the enclosed block as in progress
+        """
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            states = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        samples = []
+        for key, counts, total, count in states:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", format_labels(self.labelnames, key, f'le="{bound:g}"'), cumulative))
+            samples.append(("_bucket", format_labels(self.labelnames, key, 'le="+Inf"'), count))
+            samples.append(("_sum", format_labels(self.labelnames, key), total))
+            samples.append(("_count", format_labels(self.labelnames, key), count))
+        return samples
+
+
+class CallbackMetric(Metric):
+    def __init__(self, name: str, help_text: str, kind: str, labelnames: Tuple[str, ...],
+                 collect: Callable[[], Dict[Labels, float]]):
+        """
+        Metric whose samples are read from existing state at scrape time
+
+        Args:
+            kind: "counter" or "gauge"
+            collect: Returns {label values: value}
+        """
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [("", format_labels(self.labelnames, key), float(value)) for key, value in self.collect().items()]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(self, name: str, help_text: str, kind: str, labelnames: Tuple[str, ...],
+                 collect: Callable[[], Dict[Labels, float]]) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help_text, kind, labelnames, collect))
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format (version 0.0.4)
+        """
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "api_stage_duration_seconds", "Duration of one stage of a request", ("stage",)
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "api_request_duration_seconds", "Request duration until the response starts", ("endpoint", "status")
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "api_requests_in_flight", "Requests being handled", ("endpoint",)
+)
+
+# Stage durations of the current request, in seconds; None outside instrumented requests
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+
+def record_stage(name: str, seconds: float):
+    """
+    Record a stage duration; repeated stages of one request add up in its Server-Timing
+    """
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time the enclosed block as a request stage
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    """
+    Format stage durations as a Server-Timing header value, in milliseconds
+    """
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class MetricsMiddleware:
+    def __init__(self, app, paths: Iterable[str]):
+        """
+        ASGI middleware timing requests to the given paths and adding a Server-Timing header
+
+        Only listed paths are instrumented, which keeps the endpoint label bounded.
+
+        Args:
+            app: ASGI application
+            paths: Request paths to instrument
+        """
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = scope["path"]
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                # Streaming responses start before the LLM finishes; they report the stages done so far
+                total = time.perf_counter() - start
+                REQUEST_SECONDS.observe(total, endpoint=endpoint, status=message["status"])
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(timings, total).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            with REQUESTS_IN_FLIGHT.track(endpoint=endpoint):
+                await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Convert stored chunk embeddings between storage formats
+
+  python migrate_embeddings.py float16   # packed half floats, ~6.8x smaller than a BSON array
+  python migrate_embeddings.py int8      # scalar-quantized, ~13x smaller
+  python migrate_embeddings.py array     # back to BSON arrays (precision is not restored)
+
+Set EMBEDDING_STORAGE to the same format so newly ingested chunks match. The
+vector index is rebuilt afterwards so the API reloads it.
+"""
+
+import argparse
+import sys
+
+from embedding_codec import STORAGE_FORMATS
+from pdf_processor import PDFProcessor
+
+
+def collection_size(processor: PDFProcessor) -> str:
+    """
+    Describe the collection size from collStats
+    """
+    stats = processor.db.command("collStats", processor.collection_name)
+    return (f"{stats.get('count', 0)} documents, {stats.get('size', 0) / 1e6:.1f} MB data, "
+            f"{stats.get('avgObjSize', 0) / 1e3:.1f} KB average, {stats.get('storageSize', 0) / 1e6:.1f} MB on disk")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("storage", choices=STORAGE_FORMATS, help="target storage format")
+    parser.add_argument("--batch-size", type=int, default=500, help="documents per bulk write")
+    parser.add_argument("--skip-index", action="store_true", help="do not rebuild the vector index afterwards")
+    args = parser.parse_args()
+
+    processor = PDFProcessor(".")
+    try:
+        print(f"Before: {collection_size(processor)}")
+        counts = processor.migrate_embedding_storage(args.storage, args.batch_size)
+        print(f"Converted {counts['converted']} embeddings to {args.storage} ({counts['unchanged']} unchanged)")
+        print(f"After:  {collection_size(processor)}")
+
+        if counts["converted"] and not args.skip_index:
+            print("\nRebuilding vector index...")
+            processor.build_vector_index()
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,36 @@
 import os
 import json
+import hashlib
+import queue
+import threading
 import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Iterable, Iterator, List, Dict, Any, Optional
 import re
+import time
 from dotenv import load_dotenv
 import tiktoken
 import numpy as np
 from openai import OpenAI
 import pymongo
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
 import PyPDF2
 import pdfplumber
 from datetime import datetime
+from chunking import ChunkingEngine, TextWindow
+from conditions import aliases_fingerprint, condition_key
+from corpus import CONDITION_KEYS_DOCUMENT_ID, CORPUS_META_COLLECTION, PENDING_FIELD, bump_corpus_version
+from facets import FACETS_COLLECTION, TOTALS_ID, file_facets, rebuild_facets, update_facets
+from tagger import default_tagger, organism_key
+from upstream import create_client, retry_call
+from embedding_codec import (
+    EMBEDDING_FIELDS, EMBEDDING_STORAGE, HAS_EMBEDDING_QUERY, check_storage_format, encode_embedding, storage_update
+)
+from vector_index import DEFAULT_INDEX_PATH, VectorIndex, build_index
 
 # Load environment variables
 load_dotenv()
@@ -30,24 +48,16 @@ class PDFProcessor:
             pdf_folder_path: Path to folder containing PDF files
         """
         self.pdf_folder_path = Path(pdf_folder_path)
-        self.openai_client = OpenAI(
-            base_url="https://api.aimlapi.com/v1",
-            api_key=os.getenv("AIMLAPI_KEY"),
-        )
+        
+        # Clients are created on first use so extraction-only worker processes never open them
+        self._openai_client = None
+        self._mongo_client = None
         
         # MongoDB connection
         self.mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
         self.db_name = os.getenv("MONGODB_DB_NAME", "nasa_hackathon")
         self.collection_name = os.getenv("MONGODB_COLLECTION_NAME", "organism_data")
-        
-        try:
-            self.mongo_client = MongoClient(self.mongodb_url)
-            self.db = self.mongo_client[self.db_name]
-            self.collection = self.db[self.collection_name]
-            logger.info("Successfully connected to MongoDB")
-        except Exception as e:
-            logger.error(f"Failed to connect to MongoDB: {e}")
-            raise
+        self.manifest_collection_name = os.getenv("MONGODB_MANIFEST_COLLECTION_NAME", "ingest_manifest")
         
         # Initialize tokenizer for chunking
         self.tokenizer = tiktoken.get_encoding("cl100k_base")
@@ -55,6 +65,87 @@ class PDFProcessor:
         # Chunking parameters
         self.chunk_size = 1000  # tokens per chunk
         self.chunk_overlap = 200  # overlap between chunks
+        self.chunk_boundary = os.getenv("CHUNK_BOUNDARY", "sentence")  # token, sentence or paragraph
+        
+        # Organism and condition are inferred from this many leading characters (title, abstract)
+        self.inference_chars = 20000
+        
+        # Chunks waiting between the extraction and embedding stages
+        self.pipeline_queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
+        
+        # Embedding batch limits (the API caps inputs per request and tokens per request)
+        self.embedding_batch_tokens = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+        
+        # How embeddings are stored: "array" (BSON doubles), or compact "float16" / "int8" BinData
+        self.embedding_storage = check_storage_format(EMBEDDING_STORAGE)
+    
+    @property
+    def openai_client(self) -> OpenAI:
+        """OpenAI client, created on first use"""
+        if self._openai_client is None:
+            self._openai_client = create_client()
+        return self._openai_client
+    
+    @property
+    def mongo_client(self) -> MongoClient:
+        """MongoDB client, created on first use"""
+        if self._mongo_client is None:
+            try:
+                self._mongo_client = MongoClient(self.mongodb_url)
+                logger.info("Successfully connected to MongoDB")
+            except Exception as e:
+                logger.error(f"Failed to connect to MongoDB: {e}")
+                raise
+        return self._mongo_client
+    
+    @property
+    def db(self):
+        return self.mongo_client[self.db_name]
+    
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
+    
+    @property
+    def manifest(self):
+        """Ingestion manifest: one document per PDF with its hash and chunk ids"""
+        return self.db[self.manifest_collection_name]
+    
+    def iter_page_texts(self, pdf_path: Path) -> Iterator[str]:
+        """
+        Yield the raw text of each page, one page in memory at a time
+        
+        Uses pdfplumber (better for complex layouts) and falls back to PyPDF2
+        when pdfplumber extracts almost nothing.
+        
+        Args:
+            pdf_path: Path to PDF file
+            
+        Yields:
+            Page text
+        """
+        extracted_chars = 0
+        
+        # Method 1: Using pdfplumber (better for complex layouts)
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                page_text = page.extract_text()
+                # Drop the page's parsed layout objects once its text is out
+                page.flush_cache()
+                if page_text:
+                    extracted_chars += len(page_text.strip())
+                    yield page_text
+        
+        # If pdfplumber didn't extract much text, try PyPDF2
+        if extracted_chars < 100:
+            logger.warning(f"pdfplumber extracted minimal text from {pdf_path.name}, trying PyPDF2")
+            with open(pdf_path, 'rb') as file:
+                pdf_reader = PyPDF2.PdfReader(file)
+                for page in pdf_reader.pages:
+                    page_text = page.extract_text()
+                    if page_text:
+                        yield page_text
     
     def extract_text_from_pdf(self, pdf_path: Path) -> str:
         """
@@ -66,28 +157,8 @@ class PDFProcessor:
         Returns:
             Extracted text as string
         """
-        text = ""
-        
         try:
-            # Method 1: Using pdfplumber (better for complex layouts)
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            
-            # If pdfplumber didn't extract much text, try PyPDF2
-            if len(text.strip()) < 100:
-                logger.warning(f"pdfplumber extracted minimal text from {pdf_path.name}, trying PyPDF2")
-                with open(pdf_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    for page in pdf_reader.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
-            
-            # Clean up the text
-            text = self.clean_text(text)
+            text = self.clean_text("\n".join(self.iter_page_texts(pdf_path)))
             
             if not text.strip():
                 logger.warning(f"No text extracted from {pdf_path.name}")
@@ -123,6 +194,46 @@ class PDFProcessor:
         
         return text.strip()
     
+    def chunking_engine(self) -> ChunkingEngine:
+        """
+        Create a chunking engine with this processor's settings
+        """
+        return ChunkingEngine(self.tokenizer, self.chunk_size, self.chunk_overlap, self.chunk_boundary)
+    
+    def window_to_chunk(self, window: TextWindow, metadata: Dict[str, Any], chunk_index: int) -> Optional[Dict[str, Any]]:
+        """
+        Build a chunk document from a token window
+        
+        The chunk is tagged with every dictionary organism and condition it
+        mentions (`organism_tags`, `condition_tags`), independent of the
+        document-level `organism_name` / `condition`.
+        
+        Args:
+            window: Window produced by the chunking engine
+            metadata: Metadata to include with the chunk
+            chunk_index: Position of the chunk in the document
+            
+        Returns:
+            Chunk with metadata, or None for very short windows
+        """
+        chunk_text = window.text.strip()
+        
+        # Skip very short chunks (likely artifacts)
+        if len(chunk_text) < 50:
+            return None
+        
+        return {
+            **metadata,
+            "content": chunk_text,
+            "chunk_index": chunk_index,
+            "token_count": window.token_count,
+            "start_token": window.start_token,
+            "end_token": window.end_token - 1,
+            "start_char": window.start_char,
+            "end_char": window.end_char,
+            **default_tagger.tag(chunk_text)
+        }
+    
     def split_text_into_chunks(self, text: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Split text into chunks based on token count
@@ -137,47 +248,83 @@ class PDFProcessor:
         if not text.strip():
             return []
         
-        # Tokenize the text
-        tokens = self.tokenizer.encode(text)
-        
         chunks = []
-        start_idx = 0
+        for window in self.chunking_engine().chunk_text(text):
+            chunk = self.window_to_chunk(window, metadata, len(chunks))
+            if chunk is not None:
+                chunks.append(chunk)
         
-        while start_idx < len(tokens):
-            # Calculate end index for this chunk
-            end_idx = min(start_idx + self.chunk_size, len(tokens))
-            
-            # Extract chunk tokens
-            chunk_tokens = tokens[start_idx:end_idx]
-            
-            # Decode back to text
-            chunk_text = self.tokenizer.decode(chunk_tokens)
+        return chunks
+    
+    def iter_chunks(self, pages: Iterable[str], metadata: Dict[str, Any], stats: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Clean, tokenize and chunk a stream of pages
+        
+        Each page is tokenized once and chunks are sliced from the page text,
+        holding at most one chunk plus one page in memory. Organism and condition
+        are inferred from the first `inference_chars` characters, so chunks are
+        held back only until that prefix is complete.
+        
+        Args:
+            pages: Raw page texts
+            metadata: Metadata to include with each chunk (organism and condition are added)
+            stats: Filled with "text_length", "total_tokens", "organism_name" and "condition"
             
-            # Skip very short chunks (likely artifacts)
-            if len(chunk_text.strip()) < 50:
-                start_idx += self.chunk_size - self.chunk_overlap
+        Yields:
+            Chunks with metadata
+        """
+        engine = self.chunking_engine()
+        chunk_index = 0
+        
+        prefix_parts: List[str] = []
+        prefix_length = 0
+        inferred = None
+        pending: List[Dict[str, Any]] = []
+        
+        def release(windows: Iterable[TextWindow]) -> List[Dict[str, Any]]:
+            # Hold chunks back until the inference prefix is complete
+            nonlocal chunk_index, inferred
+            for window in windows:
+                chunk = self.window_to_chunk(window, metadata, chunk_index)
+                if chunk is not None:
+                    pending.append(chunk)
+                    chunk_index += 1
+            if inferred is None:
+                if prefix_length < self.inference_chars:
+                    return []
+                inferred = self.infer_organism_and_condition("".join(prefix_parts))
+                prefix_parts.clear()
+            ready = list(pending)
+            pending.clear()
+            for item in ready:
+                item.update(inferred)
+            return ready
+        
+        for page in pages:
+            cleaned = self.clean_text(page)
+            if not cleaned:
                 continue
+            piece = cleaned if engine.total_chars == 0 else " " + cleaned
             
-            # Create chunk with metadata
-            chunk = {
-                **metadata,
-                "content": chunk_text.strip(),
-                "chunk_index": len(chunks),
-                "token_count": len(chunk_tokens),
-                "start_token": start_idx,
-                "end_token": end_idx - 1
-            }
-            
-            chunks.append(chunk)
-            
-            # Move start index with overlap
-            start_idx += self.chunk_size - self.chunk_overlap
+            if prefix_length < self.inference_chars:
+                prefix_parts.append(piece)
+                prefix_length += len(piece)
             
-            # Prevent infinite loop
-            if start_idx >= len(tokens):
-                break
+            yield from release(engine.feed(piece))
         
-        return chunks
+        # Remaining windows at the end of the document
+        yield from release(engine.finish())
+        
+        # Short documents never fill the prefix; infer from what there is
+        if inferred is None:
+            inferred = self.infer_organism_and_condition("".join(prefix_parts))
+        for chunk in pending:
+            chunk.update(inferred)
+        yield from pending
+        
+        stats["text_length"] = engine.total_chars
+        stats["total_tokens"] = engine.total_tokens
+        stats.update(inferred)
     
     def create_embedding(self, text: str) -> List[float]:
         """
@@ -190,15 +337,112 @@ class PDFProcessor:
             Embedding vector
         """
         try:
-            response = self.openai_client.embeddings.create(
+            response = retry_call(lambda: self.openai_client.embeddings.create(
                 model="text-embedding-3-large",
                 input=text
-            )
+            ), name="embedding")
             return response.data[0].embedding
         except Exception as e:
             logger.error(f"Error creating embedding: {e}")
             raise
     
+    def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Create embeddings for many texts with a single request
+        
+        Args:
+            texts: Texts to embed
+            
+        Returns:
+            Embedding vectors, in input order
+        """
+        response = retry_call(lambda: self.openai_client.embeddings.create(
+            model="text-embedding-3-large",
+            input=texts
+        ), name="embedding batch")
+        embeddings = [None] * len(texts)
+        for item in response.data:
+            embeddings[item.index] = item.embedding
+        return embeddings
+    
+    def batch_chunks(self, chunks: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Group chunks into embedding batches within the token and input budgets
+        
+        Args:
+            chunks: Chunks to group, possibly a stream
+            
+        Yields:
+            Batches, each as soon as it is full
+        """
+        batch = []
+        batch_tokens = 0
+        
+        for chunk in chunks:
+            tokens = chunk.get("token_count") or len(self.tokenizer.encode(chunk["content"]))
+            if batch and (batch_tokens + tokens > self.embedding_batch_tokens or len(batch) >= self.embedding_batch_size):
+                yield batch
+                batch = []
+                batch_tokens = 0
+            batch.append(chunk)
+            batch_tokens += tokens
+        
+        if batch:
+            yield batch
+    
+    def embed_batch(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Attach embeddings to a batch of chunks
+        
+        Falls back to one request per chunk if the batched request fails, so a
+        single bad chunk only loses itself.
+        
+        Args:
+            batch: Chunks to embed
+            
+        Returns:
+            Chunks that were embedded successfully
+        """
+        try:
+            embeddings = self.create_embeddings([chunk["content"] for chunk in batch])
+            for chunk, embedding in zip(batch, embeddings):
+                chunk.update(encode_embedding(embedding, self.embedding_storage))
+            return batch
+        except Exception as e:
+            logger.warning(f"Batched embedding failed ({e}), retrying {len(batch)} chunks individually")
+        
+        embedded = []
+        for chunk in batch:
+            try:
+                chunk.update(encode_embedding(self.create_embedding(chunk["content"]), self.embedding_storage))
+                embedded.append(chunk)
+            except Exception as e:
+                logger.error(f"Error creating embedding for chunk {chunk['chunk_index']}: {e}")
+        return embedded
+    
+    def insert_chunks(self, chunks: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Insert embedded chunks with one unordered bulk write
+        
+        Args:
+            chunks: Chunks with embeddings
+            
+        Returns:
+            IDs of the chunks inserted
+        """
+        if not chunks:
+            return []
+        try:
+            result = self.collection.insert_many(chunks, ordered=False)
+            return list(result.inserted_ids)
+        except BulkWriteError as e:
+            # Unordered writes keep going past failures; keep the ids that made it
+            failed = set()
+            for error in e.details.get("writeErrors", []):
+                failed.add(error["index"])
+                logger.error(f"Failed to store chunk {chunks[error['index']]['chunk_index']}: {error.get('errmsg')}")
+            return [chunk["_id"] for i, chunk in enumerate(chunks) if i not in failed]
+    
     def extract_metadata_from_pdf(self, pdf_path: Path) -> Dict[str, Any]:
         """
         Extract metadata from PDF file
@@ -245,60 +489,16 @@ class PDFProcessor:
         """
         Infer organism name and condition from text content
         
+        Uses the dictionary tagger: the most mentioned known organism and
+        condition win. Unknown species are not guessed.
+        
         Args:
             text: Text content to analyze
             
         Returns:
             Dictionary with inferred organism and condition
         """
-        # Common organism patterns
-        organism_patterns = [
-            r'([A-Z][a-z]+ [a-z]+)',  # Genus species
-            r'([A-Z][a-z]+ coli)',    # E. coli variations
-            r'(E\.? coli)',           # E. coli
-            r'(Saccharomyces cerevisiae)',  # Yeast
-            r'(Drosophila melanogaster)',   # Fruit fly
-            r'(Arabidopsis thaliana)',      # Plant
-            r'(Caenorhabditis elegans)',    # Worm
-            r'(Danio rerio)',               # Zebrafish
-            r'(Mus musculus)',              # Mouse
-        ]
-        
-        # Condition patterns
-        condition_patterns = [
-            r'(microgravity)',
-            r'(radiation)',
-            r'(temperature)',
-            r'(hypoxia)',
-            r'(hypergravity)',
-            r'(space environment)',
-            r'(zero gravity)',
-            r'(cosmic radiation)',
-            r'(thermal stress)',
-            r'(oxidative stress)'
-        ]
-        
-        organism_name = "Unknown"
-        condition = "Not specified"
-        
-        # Find organism
-        for pattern in organism_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                organism_name = match.group(1)
-                break
-        
-        # Find condition
-        for pattern in condition_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                condition = match.group(1).lower()
-                break
-        
-        return {
-            "organism_name": organism_name,
-            "condition": condition
-        }
+        return default_tagger.infer(text)
     
     def store_chunks_in_mongodb(self, chunks: List[Dict[str, Any]]) -> int:
         """
@@ -310,82 +510,191 @@ class PDFProcessor:
         Returns:
             Number of chunks successfully stored
         """
-        stored_count = 0
+        return len(self.embed_and_store_chunks(chunks))
+    
+    def embed_and_store_chunks(self, chunks: Iterable[Dict[str, Any]], stored_ids: Optional[List[Any]] = None) -> List[Any]:
+        """
+        Embed chunks in token-budgeted batches and write each batch with one bulk insert
         
-        for chunk in chunks:
+        Args:
+            chunks: Chunks to store, possibly a stream
+            stored_ids: List the ids are appended to as each batch is written, so
+                that a caller can remove them if a later batch fails. When an insert
+                fails part way, every id of that batch is appended, since some of
+                its chunks may have been written
+            
+        Returns:
+            IDs of the chunks successfully stored
+        """
+        if stored_ids is None:
+            stored_ids = []
+        
+        for batch_number, batch in enumerate(self.batch_chunks(chunks), start=1):
+            start_time = time.perf_counter()
+            embedded = self.embed_batch(batch)
+            embed_time = time.perf_counter() - start_time
+            
+            start_time = time.perf_counter()
             try:
-                # Create embedding for the chunk content
-                logger.info(f"Creating embedding for chunk {chunk['chunk_index']}...")
-                embedding = self.create_embedding(chunk["content"])
-                chunk["embedding"] = embedding
-                
-                # Store in MongoDB
-                result = self.collection.insert_one(chunk)
-                if result.inserted_id:
-                    stored_count += 1
-                    logger.info(f"Stored chunk {chunk['chunk_index']} with ID: {result.inserted_id}")
-                else:
-                    logger.error(f"Failed to store chunk {chunk['chunk_index']}")
-                
-            except Exception as e:
-                logger.error(f"Error storing chunk {chunk['chunk_index']}: {e}")
+                inserted = self.insert_chunks(embedded)
+            except Exception:
+                # e.g. AutoReconnect mid-write; insert_many has already assigned every _id
+                stored_ids.extend(chunk["_id"] for chunk in embedded if "_id" in chunk)
+                raise
+            insert_time = time.perf_counter() - start_time
+            
+            stored_ids.extend(inserted)
+            logger.info(
+                f"Batch {batch_number}: {len(inserted)}/{len(batch)} chunks stored "
+                f"(embedding {embed_time:.2f}s, insert {insert_time:.2f}s)"
+            )
         
-        return stored_count
+        return stored_ids
     
-    def process_pdf_file(self, pdf_path: Path) -> Dict[str, Any]:
+    def prepare_pdf_file(self, pdf_path: Path) -> Dict[str, Any]:
         """
-        Process a single PDF file
+        Run the CPU-bound stage for a PDF: extract, clean, infer metadata and chunk
+        
+        Uses no network clients, so it is safe to run in a worker process.
         
         Args:
             pdf_path: Path to PDF file
             
         Returns:
-            Processing results
+            Processing results; successful results carry the chunks under "chunks"
         """
         logger.info(f"Processing PDF: {pdf_path.name}")
         
         try:
-            # Extract text
-            text = self.extract_text_from_pdf(pdf_path)
-            if not text.strip():
-                return {
-                    "filename": pdf_path.name,
-                    "status": "failed",
-                    "error": "No text extracted",
-                    "chunks_created": 0,
-                    "chunks_stored": 0
-                }
-            
             # Extract metadata
             metadata = self.extract_metadata_from_pdf(pdf_path)
             
-            # Infer organism and condition
-            inferred_info = self.infer_organism_and_condition(text)
-            metadata.update(inferred_info)
+            # Extract, clean and chunk page by page
+            stats = {}
+            chunks = list(self.iter_chunks(self.iter_page_texts(pdf_path), metadata, stats))
+            if stats["text_length"] == 0:
+                return self.no_text_result(pdf_path)
             
             # Add text statistics
-            metadata.update({
-                "total_text_length": len(text),
-                "total_tokens": len(self.tokenizer.encode(text))
-            })
-            
-            # Split into chunks
-            chunks = self.split_text_into_chunks(text, metadata)
+            for chunk in chunks:
+                chunk.update({
+                    "total_text_length": stats["text_length"],
+                    "total_tokens": stats["total_tokens"]
+                })
             logger.info(f"Created {len(chunks)} chunks from {pdf_path.name}")
             
-            # Store chunks in MongoDB
-            stored_count = self.store_chunks_in_mongodb(chunks)
+            return {
+                **self.success_result(pdf_path, stats, len(chunks), 0),
+                "chunks": chunks
+            }
             
+        except Exception as e:
+            logger.error(f"Error processing {pdf_path.name}: {e}")
             return {
                 "filename": pdf_path.name,
-                "status": "success",
-                "text_length": len(text),
-                "total_tokens": len(self.tokenizer.encode(text)),
-                "chunks_created": len(chunks),
-                "chunks_stored": stored_count,
-                "organism_name": inferred_info["organism_name"],
-                "condition": inferred_info["condition"]
+                "status": "failed",
+                "error": str(e),
+                "chunks_created": 0,
+                "chunks_stored": 0
             }
+    
+    def stream_pdf_file(self, pdf_path: Path, source: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Process a PDF as a pipeline: extract → clean → chunk in a producer thread,
+        embed → store in this thread
+        
+        The stages are connected by a bounded queue, so extraction of later pages
+        overlaps with embedding of earlier chunks and memory stays roughly
+        constant regardless of PDF size.
+        
+        Args:
+            pdf_path: Path to PDF file
+            source: Manifest fields for the file (see `plan_ingestion`)
+            
+        Returns:
+            Processing results
+        """
+        logger.info(f"Processing PDF: {pdf_path.name}")
+        
+        stats: Dict[str, Any] = {}
+        chunk_queue: "queue.Queue" = queue.Queue(maxsize=self.pipeline_queue_size)
+        stop = threading.Event()
+        producer_errors: List[Exception] = []
+        chunks_created = 0
+        
+        def put(item) -> bool:
+            # Give up if the consumer has stopped, instead of blocking on a full queue
+            while not stop.is_set():
+                try:
+                    chunk_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce():
+            try:
+                metadata = self.extract_metadata_from_pdf(pdf_path)
+                for chunk in self.iter_chunks(self.iter_page_texts(pdf_path), metadata, stats):
+                    if not put(chunk):
+                        return
+            except Exception as e:
+                producer_errors.append(e)
+            finally:
+                put(_END_OF_STREAM)
+        
+        def consume() -> Iterator[Dict[str, Any]]:
+            nonlocal chunks_created
+            while True:
+                chunk = chunk_queue.get()
+                if chunk is _END_OF_STREAM:
+                    return
+                chunks_created += 1
+                yield chunk
+        
+        producer = threading.Thread(target=produce, name=f"extract-{pdf_path.name}", daemon=True)
+        producer.start()
+        # Filled batch by batch, so a failure part way still knows what to remove
+        chunk_ids: List[Any] = []
+        try:
+            chunks = consume()
+            if source is not None:
+                chunks = self.staged_chunks(chunks, self.begin_ingestion(source))
+            self.embed_and_store_chunks(chunks, chunk_ids)
+        except Exception as e:
+            producer_errors.append(e)
+        finally:
+            stop.set()
+            producer.join()
+        
+        try:
+            if producer_errors:
+                # Don't leave half a document behind; a failed cleanup must not hide the original error
+                if chunk_ids:
+                    try:
+                        self.collection.delete_many({"_id": {"$in": chunk_ids}})
+                    except Exception as cleanup_error:
+                        logger.error(f"Could not remove partial chunks of {pdf_path.name}: {cleanup_error}")
+                raise producer_errors[0]
+            
+            if stats.get("text_length", 0) == 0:
+                return self.no_text_result(pdf_path)
+            
+            # Text statistics are only known once the whole document has streamed through
+            if chunk_ids:
+                self.collection.update_many(
+                    {"_id": {"$in": chunk_ids}},
+                    {"$set": {"total_text_length": stats["text_length"], "total_tokens": stats["total_tokens"]}}
+                )
+            logger.info(f"Created {chunks_created} chunks from {pdf_path.name}")
+            
+            facets = file_facets(stats["organism_name"], stats["condition"], len(chunk_ids))
+            if source is not None:
+                self.record_ingestion(source, chunk_ids, complete=len(chunk_ids) == chunks_created, facets=facets)
+            else:
+                update_facets(self.db, None, facets)
+            
+            return self.success_result(pdf_path, stats, chunks_created, len(chunk_ids))
             
         except Exception as e:
             logger.error(f"Error processing {pdf_path.name}: {e}")
@@ -397,10 +706,357 @@ class PDFProcessor:
                 "chunks_stored": 0
             }
     
-    def process_all_pdfs(self) -> Dict[str, Any]:
+    def success_result(self, pdf_path: Path, stats: Dict[str, Any], chunks_created: int, chunks_stored: int) -> Dict[str, Any]:
+        """
+        Processing result for a PDF that produced text
+        """
+        return {
+            "filename": pdf_path.name,
+            "status": "success",
+            "text_length": stats["text_length"],
+            "total_tokens": stats["total_tokens"],
+            "chunks_created": chunks_created,
+            "chunks_stored": chunks_stored,
+            "organism_name": stats["organism_name"],
+            "condition": stats["condition"]
+        }
+    
+    def no_text_result(self, pdf_path: Path) -> Dict[str, Any]:
+        """
+        Processing result for a PDF with no extractable text
+        """
+        logger.warning(f"No text extracted from {pdf_path.name}")
+        return {
+            "filename": pdf_path.name,
+            "status": "failed",
+            "error": "No text extracted",
+            "chunks_created": 0,
+            "chunks_stored": 0
+        }
+    
+    def store_prepared_pdf(self, prepared: Dict[str, Any], source: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Run the network-bound stage for a prepared PDF: embed and store its chunks
+        
+        Args:
+            prepared: Result of `prepare_pdf_file`
+            source: Manifest fields for the file (see `plan_ingestion`); when
+                given, the manifest is updated and the file's previous chunks removed
+            
+        Returns:
+            Processing results
+        """
+        chunks = prepared.pop("chunks", None)
+        if prepared["status"] != "success":
+            return prepared
+        
+        chunk_ids: List[Any] = []
+        try:
+            # Store chunks in MongoDB
+            stored = chunks if source is None else self.staged_chunks(chunks, self.begin_ingestion(source))
+            self.embed_and_store_chunks(stored, chunk_ids)
+            prepared["chunks_stored"] = len(chunk_ids)
+            facets = file_facets(prepared["organism_name"], prepared["condition"], len(chunk_ids))
+            if source is not None:
+                self.record_ingestion(source, chunk_ids, complete=len(chunk_ids) == len(chunks), facets=facets)
+            else:
+                update_facets(self.db, None, facets)
+            return prepared
+            
+        except Exception as e:
+            logger.error(f"Error processing {prepared['filename']}: {e}")
+            # Don't leave half a document behind; it is not in the manifest and would be stored again
+            if chunk_ids:
+                try:
+                    self.collection.delete_many({"_id": {"$in": chunk_ids}})
+                except Exception as cleanup_error:
+                    logger.error(f"Could not remove partial chunks of {prepared['filename']}: {cleanup_error}")
+            return {
+                "filename": prepared["filename"],
+                "status": "failed",
+                "error": str(e),
+                "chunks_created": 0,
+                "chunks_stored": 0
+            }
+    
+    def plan_ingestion(self, pdf_files: List[Path], force: bool = False) -> Dict[str, Any]:
+        """
+        Compare the folder against the ingestion manifest
+        
+        A file is unchanged when its manifest entry is complete and either its
+        size and mtime match (no read needed) or its SHA-256 matches.
+        
+        Args:
+            pdf_files: PDFs currently in the folder
+            force: Treat every file as changed
+            
+        Returns:
+            Dictionary with "changed" (list of (path, source) pairs), "unchanged"
+            (list of paths) and "removed" (manifest entries whose file is gone)
+        """
+        folder = str(self.pdf_folder_path.resolve())
+        entries = {entry["_id"]: entry for entry in self.manifest.find({"folder": folder})}
+        
+        changed = []
+        unchanged = []
+        for pdf_file in pdf_files:
+            key = str(pdf_file.resolve())
+            entry = entries.pop(key, None)
+            stat = pdf_file.stat()
+            up_to_date = not force and entry is not None and entry.get("complete")
+            
+            if up_to_date and entry["file_size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                unchanged.append(pdf_file)
+                continue
+            
+            digest = file_sha256(pdf_file)
+            if up_to_date and entry["sha256"] == digest:
+                # Touched but identical: remember the new mtime so the next run skips hashing
+                self.manifest.update_one({"_id": key}, {"$set": {"file_size": stat.st_size, "mtime_ns": stat.st_mtime_ns}})
+                unchanged.append(pdf_file)
+                continue
+            
+            changed.append((pdf_file, self.file_source(pdf_file, folder, digest)))
+        
+        # Whatever is left in the manifest no longer exists in the folder
+        return {"changed": changed, "unchanged": unchanged, "removed": list(entries.values())}
+    
+    def file_source(self, pdf_file: Path, folder: str = None, digest: str = None) -> Dict[str, Any]:
+        """
+        Manifest fields identifying a file's current contents
+        
+        Args:
+            pdf_file: PDF file
+            folder: Resolved folder the manifest groups it under, defaults to the file's own folder
+            digest: SHA-256 of the file, if already computed
+            
+        Returns:
+            Source dictionary for `record_ingestion`
+        """
+        stat = pdf_file.stat()
+        return {
+            "_id": str(pdf_file.resolve()),
+            "folder": folder or str(pdf_file.resolve().parent),
+            "filename": pdf_file.name,
+            "sha256": digest or file_sha256(pdf_file),
+            "file_size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns
+        }
+    
+    def begin_ingestion(self, source: Dict[str, Any]) -> ObjectId:
+        """
+        Open an ingestion of a file before any of its chunks are stored
+        
+        The manifest entry records the ingestion's id first, so if the process
+        dies before `record_ingestion` commits, the next run can find and delete
+        the chunks (see `recover_ingestion`). Leftovers of an earlier interrupted
+        ingestion of the same file are dealt with here.
+        
+        Args:
+            source: Manifest fields from `plan_ingestion`
+            
+        Returns:
+            Ingestion id, to be stored on each chunk with `staged_chunks`
+        """
+        ingestion_id = ObjectId()
+        previous = self.manifest.find_one_and_update(
+            {"_id": source["_id"]},
+            {"$set": {PENDING_FIELD: ingestion_id, "folder": source["folder"], "filename": source["filename"]}},
+            upsert=True
+        )
+        if previous:
+            self.recover_ingestion(previous)
+        return ingestion_id
+    
+    def staged_chunks(self, chunks: Iterable[Dict[str, Any]], ingestion_id: ObjectId) -> Iterator[Dict[str, Any]]:
+        """
+        Mark chunks as belonging to an uncommitted ingestion, hidden from searches
+        """
+        for chunk in chunks:
+            chunk[PENDING_FIELD] = ingestion_id
+            yield chunk
+    
+    def record_ingestion(self, source: Dict[str, Any], chunk_ids: List[Any], complete: bool,
+                         facets: Optional[Dict[str, Any]] = None):
+        """
+        Commit an ingestion: point the manifest entry at the file's new chunks,
+        make them visible, then delete the old ones
+        
+        The entry is replaced in one write that also records the old chunks
+        still to delete (`stale_chunk_ids`), so a run interrupted after it is
+        finished by the next run. Searches see the old chunks until the new
+        ones are published, then the new ones, never a file without chunks.
+        The facet summary swaps the file's previous contribution for the new one.
+        
+        Args:
+            source: Manifest fields from `plan_ingestion`
+            chunk_ids: IDs of the newly stored chunks
+            complete: False if some chunks failed, so the next run retries the file
+            facets: The file's facet contribution (see `facets.file_facets`)
+        """
+        current_ids = set(chunk_ids)
+        entry = self.manifest.find_one({"_id": source["_id"]}) or {}
+        stale_ids = [chunk_id for chunk_id in entry.get("chunk_ids", []) if chunk_id not in current_ids]
+        previous_facets = self.previous_facets(entry) if entry else None
+        
+        self.manifest.replace_one(
+            {"_id": source["_id"]},
+            {**source, "chunk_ids": chunk_ids, "stale_chunk_ids": stale_ids, "complete": complete,
+             "facets": facets, "ingested_at": datetime.utcnow().isoformat()},
+            upsert=True
+        )
+        update_facets(self.db, previous_facets, facets)
+        self.finish_ingestion(source["_id"], chunk_ids, stale_ids)
+        if stale_ids:
+            logger.info(f"Replaced {len(stale_ids)} old chunks of {source['filename']}")
+    
+    def finish_ingestion(self, entry_id: str, chunk_ids: List[Any], stale_ids: List[Any]):
+        """
+        Publish a committed ingestion's chunks and delete the chunks they replace
+        """
+        self.collection.update_many({"_id": {"$in": chunk_ids}, PENDING_FIELD: {"$exists": True}},
+                                    {"$unset": {PENDING_FIELD: ""}})
+        if stale_ids:
+            self.collection.delete_many({"_id": {"$in": stale_ids}})
+        self.manifest.update_one({"_id": entry_id}, {"$unset": {"stale_chunk_ids": ""}})
+    
+    def recover_ingestion(self, entry: Dict[str, Any]) -> bool:
+        """
+        Clean up after an ingestion of this entry's file that did not finish
+        
+        Chunks of an uncommitted ingestion are deleted; a committed one whose
+        chunks were not yet published or whose old chunks were not yet deleted
+        is finished.
+        
+        Args:
+            entry: Manifest entry
+            
+        Returns:
+            Whether stored chunks changed
+        """
+        changed = False
+        if "stale_chunk_ids" in entry:
+            self.finish_ingestion(entry["_id"], entry.get("chunk_ids", []), entry["stale_chunk_ids"])
+            changed = True
+        if PENDING_FIELD in entry:
+            deleted = self.collection.delete_many({PENDING_FIELD: entry[PENDING_FIELD]}).deleted_count
+            self.manifest.update_one({"_id": entry["_id"], PENDING_FIELD: entry[PENDING_FIELD]},
+                                     {"$unset": {PENDING_FIELD: ""}})
+            if deleted:
+                logger.info(f"Removed {deleted} chunks of an interrupted ingestion of {entry['filename']}")
+                changed = True
+        return changed
+    
+    def recover_interrupted_ingestions(self) -> int:
+        """
+        Finish or roll back every ingestion a previous run left open
+        
+        Returns:
+            Number of files whose stored chunks changed
+        """
+        entries = self.manifest.find({"$or": [{PENDING_FIELD: {"$exists": True}}, {"stale_chunk_ids": {"$exists": True}}]})
+        return sum(self.recover_ingestion(entry) for entry in entries)
+    
+    def previous_facets(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Facet contribution of a manifest entry's stored chunks
+        
+        Entries written before facets existed don't record it, so it is read
+        back from one of their chunks (before they are deleted).
+        """
+        if "facets" in entry:
+            return entry["facets"]
+        chunk_ids = entry.get("chunk_ids", [])
+        chunk = self.collection.find_one({"_id": {"$in": chunk_ids}}, {"organism_name": 1, "condition": 1}) if chunk_ids else None
+        if chunk is None:
+            return None
+        return file_facets(chunk.get("organism_name"), chunk.get("condition"),
+                           self.collection.count_documents({"_id": {"$in": chunk_ids}}))
+    
+    def remove_ingested_file(self, entry: Dict[str, Any]) -> int:
+        """
+        Delete the chunks and manifest entry of a file that no longer exists
+        
+        Args:
+            entry: Manifest entry
+            
+        Returns:
+            Number of chunks deleted
+        """
+        facets = self.previous_facets(entry)
+        deleted = self.collection.delete_many({"_id": {"$in": entry.get("chunk_ids", [])}}).deleted_count
+        self.manifest.delete_one({"_id": entry["_id"]})
+        update_facets(self.db, facets, None)
+        logger.info(f"Removed {deleted} chunks of deleted file {entry['filename']}")
+        return deleted
+    
+    def process_pdf_file(self, pdf_path: Path) -> Dict[str, Any]:
+        """
+        Process a single PDF file
+        
+        The file is recorded in the ingestion manifest like a folder run would,
+        replacing its previous chunks and facet counts, so a later folder run
+        skips it. Once it is stored the vector index is rebuilt, which also
+        bumps the corpus version for running API workers.
+        
+        Args:
+            pdf_path: Path to PDF file
+            
+        Returns:
+            Processing results
+        """
+        result = self.stream_pdf_file(pdf_path, self.file_source(pdf_path))
+        if result["status"] == "success":
+            self.build_vector_index()
+        return result
+    
+    def iter_prepared_pdfs(self, pdf_files: List[Path], workers: int = 1) -> Iterator[Dict[str, Any]]:
+        """
+        Prepare PDFs, optionally in a process pool, yielding results in file order
+        
+        At most `2 * workers` files are in flight, so prepared chunks never pile
+        up in memory while the parent is busy embedding.
+        
+        Args:
+            pdf_files: PDFs to prepare
+            workers: Number of worker processes; 1 prepares in this process
+            
+        Yields:
+            Results of `prepare_pdf_file`
+        """
+        if workers <= 1:
+            for pdf_file in pdf_files:
+                yield self.prepare_pdf_file(pdf_file)
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(str(self.pdf_folder_path),)) as executor:
+            pending = deque()
+            files = iter(pdf_files)
+            for pdf_file in files:
+                pending.append(executor.submit(_prepare_in_worker, pdf_file))
+                if len(pending) >= 2 * workers:
+                    break
+            
+            while pending:
+                result = pending.popleft().result()
+                next_file = next(files, None)
+                if next_file is not None:
+                    pending.append(executor.submit(_prepare_in_worker, next_file))
+                yield result
+    
+    def process_all_pdfs(self, workers: int = 1, force: bool = False) -> Dict[str, Any]:
         """
         Process all PDF files in the specified folder
         
+        Only new or modified files are processed; unchanged files are skipped and
+        chunks of files deleted from the folder are removed (see `plan_ingestion`).
+        
+        Args:
+            workers: Number of processes for extraction and chunking; embedding
+                and storage always run in this process
+            force: Re-ingest every file even if unchanged
+        
         Returns:
             Processing summary
         """
@@ -413,17 +1069,43 @@ class PDFProcessor:
             logger.warning(f"No PDF files found in {self.pdf_folder_path}")
             return {"total_files": 0, "processed_files": 0, "results": []}
         
-        logger.info(f"Found {len(pdf_files)} PDF files to process")
+        logger.info(f"Found {len(pdf_files)} PDF files")
         
-        # Process each PDF file
-        results = []
-        for pdf_file in pdf_files:
-            result = self.process_pdf_file(pdf_file)
-            results.append(result)
+        # A run that died mid-file left uncommitted chunks or an unfinished swap behind
+        recovered = self.recover_interrupted_ingestions()
+        if recovered:
+            logger.info(f"Recovered {recovered} interrupted ingestions")
+        
+        plan = self.plan_ingestion(pdf_files, force=force)
+        logger.info(
+            f"{len(plan['changed'])} new or modified, {len(plan['unchanged'])} unchanged, "
+            f"{len(plan['removed'])} deleted since the last run"
+        )
+        
+        # Remove chunks of deleted files
+        for entry in plan["removed"]:
+            self.remove_ingested_file(entry)
+        
+        # Process each new or modified PDF file
+        results_by_file = {
+            pdf_file.name: {"filename": pdf_file.name, "status": "skipped", "chunks_created": 0, "chunks_stored": 0}
+            for pdf_file in plan["unchanged"]
+        }
+        changed_files = [pdf_file for pdf_file, _ in plan["changed"]]
+        sources = dict(plan["changed"])
+        if workers <= 1:
+            # Single process: stream each file through the extract/embed pipeline
+            for pdf_file in changed_files:
+                results_by_file[pdf_file.name] = self.stream_pdf_file(pdf_file, sources[pdf_file])
+        else:
+            for pdf_file, prepared in zip(changed_files, self.iter_prepared_pdfs(changed_files, workers)):
+                results_by_file[pdf_file.name] = self.store_prepared_pdf(prepared, sources[pdf_file])
+        results = [results_by_file[pdf_file.name] for pdf_file in pdf_files]
         
         # Calculate summary
         successful_files = [r for r in results if r["status"] == "success"]
         failed_files = [r for r in results if r["status"] == "failed"]
+        skipped_files = [r for r in results if r["status"] == "skipped"]
         
         total_chunks_created = sum(r["chunks_created"] for r in successful_files)
         total_chunks_stored = sum(r["chunks_stored"] for r in successful_files)
@@ -432,16 +1114,162 @@ class PDFProcessor:
             "total_files": len(pdf_files),
             "successful_files": len(successful_files),
             "failed_files": len(failed_files),
+            "skipped_files": len(skipped_files),
+            "removed_files": len(plan["removed"]),
             "total_chunks_created": total_chunks_created,
             "total_chunks_stored": total_chunks_stored,
+            "corpus_changed": bool(successful_files or plan["removed"] or recovered),
             "results": results
         }
         
-        logger.info(f"Processing complete: {len(successful_files)}/{len(pdf_files)} files processed successfully")
+        logger.info(f"Processing complete: {len(successful_files)}/{len(changed_files)} changed files processed successfully, {len(skipped_files)} unchanged files skipped")
         logger.info(f"Total chunks created: {total_chunks_created}, stored: {total_chunks_stored}")
         
         return summary
     
+    def build_vector_index(self, index_path: str = DEFAULT_INDEX_PATH) -> VectorIndex:
+        """
+        Build the retrieval index over all stored chunks and save it for the API
+        
+        Bumps the corpus version afterwards so running API workers reload the
+        index and stop serving cached responses computed from the old corpus.
+        
+        Args:
+            index_path: Where to save the index
+            
+        Returns:
+            The built index
+        """
+        index = build_index(VectorIndex.from_collection(self.collection))
+        index.save(index_path)
+        bump_corpus_version(self.db)
+        return index
+    
+    def migrate_embedding_storage(self, storage: str, batch_size: int = 500) -> Dict[str, int]:
+        """
+        Convert every stored embedding to another storage format
+        
+        Documents are rewritten in unordered bulk batches and documents already
+        in the target format are left alone, so an interrupted migration can
+        simply be run again. Converting compact vectors back to "array" does not
+        restore the precision lost when they were compacted.
+        
+        Args:
+            storage: Target format ("array", "float16" or "int8")
+            batch_size: Documents per bulk write
+            
+        Returns:
+            Counts of "converted" and "unchanged" documents
+        """
+        check_storage_format(storage)
+        projection = {field: 1 for field in EMBEDDING_FIELDS}
+        counts = {"converted": 0, "unchanged": 0}
+        operations = []
+        
+        def flush():
+            if operations:
+                result = self.collection.bulk_write(operations, ordered=False)
+                counts["converted"] += result.modified_count
+                operations.clear()
+        
+        for document in self.collection.find(HAS_EMBEDDING_QUERY, projection).batch_size(batch_size):
+            update = storage_update(document, storage)
+            if update is None:
+                counts["unchanged"] += 1
+                continue
+            operations.append(UpdateOne({"_id": document["_id"]}, update))
+            if len(operations) >= batch_size:
+                flush()
+                logger.info(f"Converted {counts['converted']} embeddings to {storage}")
+        flush()
+        
+        logger.info(f"Embedding migration to {storage}: {counts['converted']} converted, {counts['unchanged']} already in that format")
+        return counts
+    
+    def backfill_condition_keys(self) -> int:
+        """
+        Set `condition_key` on chunks stored before it existed or whose key is stale
+        
+        Only chunks without a key are touched, through the `condition_key`
+        index. Every chunk is re-keyed once when CONDITION_ALIASES changes,
+        detected with a fingerprint of the table kept in `corpus_meta`.
+        
+        Returns:
+            Number of documents updated
+        """
+        meta = self.db[CORPUS_META_COLLECTION]
+        fingerprint = aliases_fingerprint()
+        marker = meta.find_one({"_id": CONDITION_KEYS_DOCUMENT_ID})
+        rekey = marker is None or marker.get("aliases") != fingerprint
+        missing = {"condition_key": {"$exists": False}}
+        
+        updated = 0
+        conditions = self.collection.distinct("condition", {} if rekey else missing)
+        for condition in conditions + [None]:
+            key = condition_key(condition)
+            query = {"condition": condition, "condition_key": {"$ne": key}} if rekey else {"condition": condition, **missing}
+            updated += self.collection.update_many(query, {"$set": {"condition_key": key}}).modified_count
+        
+        if rekey:
+            meta.update_one({"_id": CONDITION_KEYS_DOCUMENT_ID}, {"$set": {"aliases": fingerprint}}, upsert=True)
+        if updated:
+            logger.info(f"Backfilled condition_key on {updated} chunks")
+        return updated
+    
+    def backfill_chunk_tags(self, batch_size: int = 500) -> int:
+        """
+        Tag chunks stored before per-chunk tags or organism keys existed
+        
+        Only chunks without `organism_keys` are read, so repeated runs are cheap.
+        Chunks that already have tags only get their tags case-folded.
+        
+        Args:
+            batch_size: Updates per bulk write
+            
+        Returns:
+            Number of documents updated
+        """
+        updated = 0
+        operations = []
+        
+        def flush():
+            nonlocal updated
+            if operations:
+                updated += self.collection.bulk_write(operations, ordered=False).modified_count
+                operations.clear()
+        
+        untagged = self.collection.find({"organism_keys": {"$exists": False}}, {"content": 1, "organism_tags": 1})
+        for document in untagged:
+            if document.get("organism_tags") is not None:
+                tags = {"organism_keys": [organism_key(name) for name in document["organism_tags"]]}
+            else:
+                tags = default_tagger.tag(document.get("content") or "")
+            operations.append(UpdateOne({"_id": document["_id"]}, {"$set": tags}))
+            if len(operations) >= batch_size:
+                flush()
+        flush()
+        
+        if updated:
+            logger.info(f"Backfilled organism/condition tags on {updated} chunks")
+        return updated
+    
+    def ensure_facets(self) -> int:
+        """
+        Build the facet summary from stored chunks if it has never been built
+        
+        Returns:
+            Number of papers counted, 0 if the summary already existed
+        """
+        if self.db[FACETS_COLLECTION].find_one({"_id": TOTALS_ID}) is not None:
+            return 0
+        if self.collection.estimated_document_count() == 0:
+            return 0
+        papers = rebuild_facets(self.db, self.collection)
+        
+        # Running API workers cache facets per corpus version
+        bump_corpus_version(self.db)
+        return papers
+    
     def create_mongodb_indexes(self):
         """
         Create indexes for better query performance
@@ -454,17 +1282,60 @@ class PDFProcessor:
                 ("content", "text")
             ])
             
+            # Condition filters match the canonical key exactly
+            self.collection.create_index("condition_key")
+            
+            # Per-chunk tags are arrays, so these are multikey indexes; organism
+            # filters match the case-folded keys
+            self.collection.create_index("organism_keys")
+            self.collection.create_index("condition_tags")
+            
             # Create index on filename
             self.collection.create_index("filename")
             
+            # Only chunks of uncommitted ingestions have the field
+            self.collection.create_index(PENDING_FIELD, sparse=True)
+            
             # Create index on processed_at
             self.collection.create_index("processed_at")
             
+            # Manifest entries are looked up by folder on every run
+            self.manifest.create_index("folder")
+            
             logger.info("MongoDB indexes created successfully")
             
         except Exception as e:
             logger.error(f"Error creating indexes: {e}")
 
+# Marks the end of a chunk stream between pipeline stages
+_END_OF_STREAM = object()
+
+# Per-process processor used by extraction workers
+_worker_processor = None
+
+def _init_worker(pdf_folder_path: str):
+    """
+    Create the worker's processor; its network clients stay unopened
+    """
+    global _worker_processor
+    _worker_processor = PDFProcessor(pdf_folder_path)
+
+def _prepare_in_worker(pdf_path: Path) -> Dict[str, Any]:
+    """
+    Prepare one PDF in a worker process
+    """
+    return _worker_processor.prepare_pdf_file(pdf_path)
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """
+    Hash a file's contents without reading it into memory at once
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
 def main():
     """
     Main function to run the PDF processor
@@ -485,6 +1356,9 @@ def main():
         
         # Create MongoDB indexes
         processor.create_mongodb_indexes()
+        backfilled = processor.backfill_condition_keys()
+        backfilled += processor.backfill_chunk_tags()
+        processor.ensure_facets()
         
         # Process all PDFs
         summary = processor.process_all_pdfs()
@@ -496,6 +1370,8 @@ def main():
         print(f"Total files: {summary['total_files']}")
         print(f"Successful: {summary['successful_files']}")
         print(f"Failed: {summary['failed_files']}")
+        print(f"Skipped (unchanged): {summary['skipped_files']}")
+        print(f"Removed (deleted): {summary['removed_files']}")
         print(f"Total chunks created: {summary['total_chunks_created']}")
         print(f"Total chunks stored: {summary['total_chunks_stored']}")
         
@@ -505,6 +1381,11 @@ def main():
                 if result['status'] == 'failed':
                     print(f"  - {result['filename']}: {result.get('error', 'Unknown error')}")
         
+        # Rebuild the retrieval index so the API picks up the new chunks
+        if summary['corpus_changed'] or backfilled:
+            print("Building vector index...")
+            processor.build_vector_index()
+        
         # Save detailed results to JSON
         output_file = f"processing_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         with open(output_file, 'w') as f:
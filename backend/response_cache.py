@@ -0,0 +1,153 @@
+"""
+Two-tier cache of finished search responses
+
+An in-process LRU sits in front of a local SQLite file. The SQLite tier
+survives restarts and is shared by every uvicorn worker on the machine.
+Keys include the corpus version, so re-ingestion invalidates old entries
+without any explicit flush.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from cache import TTLCache, normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+def response_cache_key(query: str, condition: Optional[str], corpus_version: int, retrieval_mode: str = "vector",
+                       organism: Optional[str] = None) -> str:
+    """
+    Build the cache key for a search
+
+    Args:
+        query: User query
+        condition: Optional condition filter
+        corpus_version: Corpus version the response is computed from
+        retrieval_mode: Retrieval mode the response is computed with
+        organism: Optional organism filter
+
+    Returns:
+        Hex digest identifying the search
+    """
+    parts = [normalize_query(query), normalize_query(condition or ""), corpus_version, retrieval_mode]
+    if organism:
+        # Only appended when set, so keys of unfiltered searches are unchanged
+        parts.append(normalize_query(organism))
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str, memory_size: int = 512, ttl_seconds: float = 7 * 24 * 3600):
+        """
+        Initialize response cache
+
+        Args:
+            path: SQLite database file
+            memory_size: Maximum entries held in the in-process tier
+            ttl_seconds: Entry lifetime in both tiers
+        """
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(max_size=memory_size, ttl_seconds=ttl_seconds)
+        self.disk_hits = 0
+        self.disk_misses = 0
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5)
+        # WAL lets several workers read while one writes
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, corpus_version INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a response, promoting disk hits into memory
+
+        Args:
+            key: Key from `response_cache_key`
+
+        Returns:
+            Cached response dict, or None
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        try:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading response cache: {e}")
+            return None
+
+        if row is None or row[1] + self.ttl_seconds < time.time():
+            self.disk_misses += 1
+            return None
+
+        self.disk_hits += 1
+        value = json.loads(row[0])
+        self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any], corpus_version: int):
+        """
+        Store a response in both tiers
+
+        Args:
+            key: Key from `response_cache_key`
+            value: JSON-serializable response
+            corpus_version: Corpus version the response was computed from
+        """
+        self.memory.set(key, value)
+        try:
+            with self._lock:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, corpus_version, created_at, value) VALUES (?, ?, ?, ?)",
+                    (key, corpus_version, time.time(), json.dumps(value))
+                )
+                self._connection.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing response cache: {e}")
+
+    def purge(self, current_version: int):
+        """
+        Drop entries from older corpus versions or past their lifetime
+
+        Args:
+            current_version: Current corpus version
+        """
+        self.memory.clear()
+        try:
+            with self._lock:
+                deleted = self._connection.execute(
+                    "DELETE FROM responses WHERE corpus_version < ? OR created_at < ?",
+                    (current_version, time.time() - self.ttl_seconds)
+                ).rowcount
+                self._connection.commit()
+            if deleted:
+                logger.info(f"Purged {deleted} stale cached responses")
+        except sqlite3.Error as e:
+            logger.error(f"Error purging response cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit/miss counters for both tiers
+        """
+        return {
+            "memory": self.memory.stats(),
+            "disk_hits": self.disk_hits,
+            "disk_misses": self.disk_misses,
+        }
@@ -3,6 +3,7 @@
 Simple script to run the PDF processor with a specified folder
 """
 
+import argparse
 import sys
 import os
 from pathlib import Path
@@ -12,12 +13,15 @@ def main():
     """
     Main function to run PDF processor with command line arguments
     """
-    # Check if PDF folder path is provided
-    if len(sys.argv) > 1:
-        pdf_folder_path = sys.argv[1]
-    else:
-        # Default to 'pdfs' folder in current directory
-        pdf_folder_path = "./pdfs"
+    parser = argparse.ArgumentParser(description="Extract, chunk, embed and store PDFs in MongoDB")
+    # Default to 'pdfs' folder in current directory
+    parser.add_argument("pdf_folder_path", nargs="?", default="./pdfs", help="folder containing PDF files")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes for PDF extraction and chunking (embedding stays in the main process)")
+    parser.add_argument("--force", action="store_true",
+                        help="re-ingest every PDF even if it is unchanged since the last run")
+    args = parser.parse_args()
+    pdf_folder_path = args.pdf_folder_path
     
     # Check if folder exists
     if not Path(pdf_folder_path).exists():
@@ -26,6 +30,7 @@ def main():
         print("\nUsage examples:")
         print(f"  python {sys.argv[0]} ./my_pdfs")
         print(f"  python {sys.argv[0]} /path/to/pdf/folder")
+        print(f"  python {sys.argv[0]} ./my_pdfs --workers 8")
         print(f"  python {sys.argv[0]}  # Uses ./pdfs by default")
         return 1
     
@@ -48,8 +53,23 @@ def main():
         print("Setting up MongoDB indexes...")
         processor.create_mongodb_indexes()
         
+        # Give chunks stored before condition keys existed their canonical key
+        backfilled = processor.backfill_condition_keys()
+        if backfilled:
+            print(f"Backfilled condition_key on {backfilled} chunks")
+        
+        # Tag chunks stored before per-chunk organism/condition tags (or organism keys) existed
+        tagged = processor.backfill_chunk_tags()
+        if tagged:
+            print(f"Tagged {tagged} existing chunks")
+        backfilled += tagged
+        
+        # Build the facet summary once for corpora ingested before it existed
+        if processor.ensure_facets():
+            print("Built facet summary from stored chunks")
+        
         # Process all PDFs
-        summary = processor.process_all_pdfs()
+        summary = processor.process_all_pdfs(workers=args.workers, force=args.force)
         
         # Print summary
         print("\n" + "="*50)
@@ -58,6 +78,8 @@ def main():
         print(f"Total files: {summary['total_files']}")
         print(f"Successful: {summary['successful_files']}")
         print(f"Failed: {summary['failed_files']}")
+        print(f"Skipped (unchanged): {summary['skipped_files']}")
+        print(f"Removed (deleted): {summary['removed_files']}")
         print(f"Total chunks created: {summary['total_chunks_created']}")
         print(f"Total chunks stored: {summary['total_chunks_stored']}")
         
@@ -67,6 +89,13 @@ def main():
                 if result['status'] == 'failed':
                     print(f"  - {result['filename']}: {result.get('error', 'Unknown error')}")
         
+        # Rebuild the retrieval index so the API picks up the new chunks
+        if summary['corpus_changed'] or backfilled:
+            print("\nBuilding vector index...")
+            processor.build_vector_index()
+        else:
+            print("\nNo changes since the last run, vector index is up to date")
+        
         print("\nProcessing completed successfully!")
         return 0
         
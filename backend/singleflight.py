@@ -0,0 +1,69 @@
+"""
+Single-flight coalescing of identical concurrent work
+
+When a query trends, many identical searches arrive within the same second,
+before the first one has finished and populated the response cache. A
+`SingleFlight` runs the work once per key: the first caller starts it and
+every concurrent caller with the same key awaits the same result.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Initialize an empty set of in-flight calls
+        """
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `work` unless a call with the same key is already in flight, then share its result
+
+        The work runs as its own task, so a caller that disconnects (and is
+        cancelled) does not cancel it for the others. Exceptions are shared too.
+
+        Args:
+            key: Identifies identical work
+            work: Starts the work when called
+
+        Returns:
+            Result of the shared call
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(work())
+            self._calls[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Executions, coalesced callers (calls saved) and calls currently in flight
+        """
+        calls = self.executions + self.coalesced
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+            "coalesced_rate": self.coalesced / calls if calls else 0.0,
+        }
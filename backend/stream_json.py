@@ -0,0 +1,194 @@
+"""
+Incremental parsing of a JSON object streamed by the LLM
+
+The LLM answers with one JSON object, sometimes wrapped in markdown fences or
+prose. `ObjectStreamParser` consumes the completion delta by delta and hands
+back each top-level field as soon as its value closes, so callers can show
+`organism_name` while `description` is still being generated. Only the text
+of each top-level value is kept and decoded, once, when it closes; there is no
+second pass over the whole completion.
+
+Schema defaults are applied as fields close (missing keys of object fields are
+filled in) and on `close()` (fields that never arrived get their default).
+"""
+
+import copy
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Inside a string only quotes and backslashes matter; outside, only structure
+_STRING_STOP = re.compile(r'["\\]')
+_VALUE_STOP = re.compile(r'["{}\[\],]')
+
+
+class ObjectStreamParser:
+    def __init__(self, defaults: Optional[Dict[str, Any]] = None):
+        """
+        Initialize a parser for one streamed JSON object
+
+        Args:
+            defaults: Default value of each expected top-level field; object
+                defaults also fill in missing keys of the received object
+        """
+        self.defaults = defaults or {}
+        self.fields: Dict[str, Any] = {}
+        self.started = False  # Saw the opening brace
+        self.complete = False  # Saw the closing brace
+        self.errors = 0  # Values that could not be decoded
+
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expecting = "key"  # key, colon, value or comma
+        self._key: Optional[str] = None
+        self._buffer: List[str] = []
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        Consume the next piece of the completion
+
+        Args:
+            text: Delta as received
+
+        Returns:
+            (field, value) pairs for the top-level fields closed by this delta, defaults applied
+        """
+        closed: List[Tuple[str, Any]] = []
+        i = 0
+        n = len(text)
+        while i < n and not self.complete:
+            if not self.started:
+                # Skip fences or prose before the object
+                start = text.find("{", i)
+                if start < 0:
+                    return closed
+                self.started = True
+                self._depth = 1
+                i = start + 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._buffer.append(text[i])
+                    self._escape = False
+                    i += 1
+                    continue
+                match = _STRING_STOP.search(text, i)
+                if match is None:
+                    self._buffer.append(text[i:])
+                    return closed
+                stop = match.start()
+                self._buffer.append(text[i:stop + 1])
+                i = stop + 1
+                if text[stop] == "\\":
+                    self._escape = True
+                    continue
+                self._in_string = False
+                if self._depth == 1:
+                    if self._expecting == "key":
+                        self._key = self._decode()
+                        self._expecting = "colon"
+                    elif self._expecting == "value":
+                        self._close_value(closed)
+                continue
+
+            char = text[i]
+            if self._expecting == "key":
+                if char == '"':
+                    self._buffer = ['"']
+                    self._in_string = True
+                elif char == "}":
+                    self.complete = True
+                i += 1
+            elif self._expecting == "colon":
+                if char == ":":
+                    self._expecting = "value"
+                    self._buffer = []
+                i += 1
+            elif self._expecting == "comma":
+                if char == ",":
+                    self._expecting = "key"
+                elif char == "}":
+                    self.complete = True
+                i += 1
+            else:
+                # Inside a value: copy everything up to the next structural character
+                match = _VALUE_STOP.search(text, i)
+                if match is None:
+                    self._buffer.append(text[i:])
+                    return closed
+                stop = match.start()
+                self._buffer.append(text[i:stop])
+                char = text[stop]
+                i = stop + 1
+                if char == '"':
+                    self._buffer.append(char)
+                    self._in_string = True
+                elif char in "{[":
+                    self._buffer.append(char)
+                    self._depth += 1
+                elif char in "}]":
+                    if self._depth == 1:
+                        # The object closed right after a number, boolean or null
+                        self._close_value(closed)
+                        self.complete = True
+                    else:
+                        self._buffer.append(char)
+                        self._depth -= 1
+                        if self._depth == 1:
+                            self._close_value(closed)
+                elif self._depth == 1:
+                    # A comma ends a number, boolean or null
+                    self._close_value(closed)
+                    self._expecting = "key"
+                else:
+                    self._buffer.append(char)
+        return closed
+
+    def _decode(self) -> Any:
+        text = "".join(self._buffer).strip()
+        self._buffer = []
+        return json.loads(text)
+
+    def _close_value(self, closed: List[Tuple[str, Any]]):
+        self._expecting = "comma"
+        try:
+            value = self._decode()
+        except json.JSONDecodeError as e:
+            self.errors += 1
+            logger.warning(f"Could not decode streamed field '{self._key}': {e}")
+            return
+        value = self.with_defaults(self._key, value)
+        self.fields[self._key] = value
+        closed.append((self._key, value))
+
+    def with_defaults(self, field: str, value: Any) -> Any:
+        """
+        Fill in the missing keys of an object field from its default
+        """
+        default = self.defaults.get(field)
+        if isinstance(default, dict) and isinstance(value, dict):
+            for key, default_value in default.items():
+                if key not in value:
+                    logger.warning(f"Missing '{key}' in streamed field '{field}'")
+                    value[key] = copy.deepcopy(default_value)
+        return value
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Finish parsing
+
+        Returns:
+            Received fields plus defaults for the expected fields that never arrived
+        """
+        result = dict(self.fields)
+        for field, default in self.defaults.items():
+            if field not in result:
+                if self.started:
+                    logger.warning(f"Missing required field '{field}' in LLM response")
+                result[field] = copy.deepcopy(default)
+        return result
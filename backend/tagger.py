@@ -0,0 +1,250 @@
+"""
+Dictionary-driven organism and condition tagger
+
+All organism and condition aliases are compiled into one regex, so a text is
+tagged in a single `finditer` pass no matter how many aliases there are. The
+aliases are laid out as a character trie ("e(?:\\.\\s*coli|uprymna ...)") and
+matched against lowercased text: with shared prefixes and no IGNORECASE the
+engine rejects most positions after one character, about 5x faster than a flat
+case-insensitive alternation. Matches are mapped back to canonical names
+(organisms) and canonical keys (conditions, see `conditions`).
+
+Only dictionary entries are tagged. There is deliberately no generic
+"Genus species" pattern, which under IGNORECASE matches almost any two words.
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from conditions import CONDITION_ALIASES, UNSPECIFIED_KEY
+
+# Alias (lowercase) -> canonical organism name
+ORGANISM_ALIASES: Dict[str, str] = {
+    "escherichia coli": "Escherichia coli",
+    "e. coli": "Escherichia coli",
+    "saccharomyces cerevisiae": "Saccharomyces cerevisiae",
+    "s. cerevisiae": "Saccharomyces cerevisiae",
+    "budding yeast": "Saccharomyces cerevisiae",
+    "drosophila melanogaster": "Drosophila melanogaster",
+    "d. melanogaster": "Drosophila melanogaster",
+    "fruit fly": "Drosophila melanogaster",
+    "fruit flies": "Drosophila melanogaster",
+    "arabidopsis thaliana": "Arabidopsis thaliana",
+    "a. thaliana": "Arabidopsis thaliana",
+    "arabidopsis": "Arabidopsis thaliana",
+    "caenorhabditis elegans": "Caenorhabditis elegans",
+    "c. elegans": "Caenorhabditis elegans",
+    "danio rerio": "Danio rerio",
+    "zebrafish": "Danio rerio",
+    "mus musculus": "Mus musculus",
+    "mouse": "Mus musculus",
+    "mice": "Mus musculus",
+    "rattus norvegicus": "Rattus norvegicus",
+    "rat": "Rattus norvegicus",
+    "rats": "Rattus norvegicus",
+    "homo sapiens": "Homo sapiens",
+    "astronaut": "Homo sapiens",
+    "astronauts": "Homo sapiens",
+    "bacillus subtilis": "Bacillus subtilis",
+    "b. subtilis": "Bacillus subtilis",
+    "deinococcus radiodurans": "Deinococcus radiodurans",
+    "d. radiodurans": "Deinococcus radiodurans",
+    "pseudomonas aeruginosa": "Pseudomonas aeruginosa",
+    "p. aeruginosa": "Pseudomonas aeruginosa",
+    "staphylococcus aureus": "Staphylococcus aureus",
+    "s. aureus": "Staphylococcus aureus",
+    "salmonella enterica": "Salmonella enterica",
+    "salmonella typhimurium": "Salmonella enterica",
+    "s. typhimurium": "Salmonella enterica",
+    "euprymna scolopes": "Euprymna scolopes",
+    "oryzias latipes": "Oryzias latipes",
+    "medaka": "Oryzias latipes",
+    "hypsibius dujardini": "Hypsibius dujardini",
+    "ramazzottius varieornatus": "Ramazzottius varieornatus",
+    "tardigrade": "Tardigrada",
+    "tardigrades": "Tardigrada",
+    "physcomitrella patens": "Physcomitrella patens",
+    "brassica rapa": "Brassica rapa",
+    "triticum aestivum": "Triticum aestivum",
+    "wheat": "Triticum aestivum",
+}
+
+_WHITESPACE = re.compile(r"\s+")
+_ABBREVIATION_SPACE = re.compile(r"\.\s*")
+_DOTS_AND_SPACES = re.compile(r"[.\s]+")
+
+
+def normalize_alias(text: str) -> str:
+    """
+    Normalize an alias or matched text for lookup: lowercase, single spaces, no space after dots
+    """
+    return _ABBREVIATION_SPACE.sub(".", _WHITESPACE.sub(" ", text.strip().lower()))
+
+
+def compact_name(name: str) -> str:
+    """
+    Lowercase a name and drop dots and whitespace, for loose comparison
+    """
+    return _DOTS_AND_SPACES.sub("", name.lower())
+
+
+def organism_key(name: str) -> str:
+    """
+    Case-folded organism name, compared by organism filters in MongoDB and in the vector index
+    """
+    return name.strip().lower()
+
+
+def character_pattern(char: str) -> str:
+    """
+    Regex source for one alias character, tolerant of line breaks and "E.coli" / "E. coli"
+    """
+    if char == " ":
+        return r"\s+"
+    if char == ".":
+        return r"\.\s*"
+    return re.escape(char)
+
+
+def trie_pattern(aliases: List[str]) -> str:
+    """
+    Regex source matching any of the aliases, with shared prefixes factored out
+
+    Where one alias is a prefix of another ("rat", "rats"), the longer one is
+    tried first, so the longest alias wins at each position.
+
+    Args:
+        aliases: Normalized aliases
+
+    Returns:
+        Regex source (a non-capturing group)
+    """
+    trie: Dict[str, Any] = {}
+    for alias in aliases:
+        node = trie
+        for char in alias:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, Any]) -> str:
+        branches = [character_pattern(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        source = "(?:" + "|".join(branches) + ")"
+        return source + "?" if "" in node else source
+
+    return emit(trie)
+
+
+class Tagger:
+    def __init__(self, organisms: Dict[str, str] = ORGANISM_ALIASES, conditions: Dict[str, str] = CONDITION_ALIASES):
+        """
+        Compile the alias dictionaries into one pattern
+
+        Args:
+            organisms: Alias -> canonical organism name
+            conditions: Alias -> canonical condition key
+        """
+        self.lookup: Dict[str, Tuple[str, str]] = {}
+        for alias, name in organisms.items():
+            self.lookup[normalize_alias(alias)] = ("organism", name)
+        for alias, key in conditions.items():
+            if key != UNSPECIFIED_KEY:
+                self.lookup[normalize_alias(alias)] = ("condition", key)
+
+        # Matched against lowercased text, see the module docstring
+        self.pattern = re.compile(r"\b" + trie_pattern(list(self.lookup)) + r"\b")
+
+        # Request filters are matched loosely: "c elegans", "C.elegans" and "Caenorhabditis elegans" are equal
+        self.organism_names = {compact_name(name): name for name in organisms.values()}
+        self.organism_names.update({compact_name(alias): name for alias, name in organisms.items()})
+
+    def counts(self, text: str) -> Tuple[Counter, Counter]:
+        """
+        Count organism and condition mentions in one pass
+
+        Args:
+            text: Text to scan
+
+        Returns:
+            (organism name counts, condition key counts), in order of first mention
+        """
+        organisms: Counter = Counter()
+        conditions: Counter = Counter()
+        for match in self.pattern.finditer(text.lower()):
+            alias = match.group(0)
+            # Matches only need normalizing when they span a line break or "e.coli"-style spacing
+            kind, value = self.lookup.get(alias) or self.lookup[normalize_alias(alias)]
+            (organisms if kind == "organism" else conditions)[value] += 1
+        return organisms, conditions
+
+    def tag(self, text: str) -> Dict[str, List[str]]:
+        """
+        Tag a chunk
+
+        Args:
+            text: Chunk text
+
+        Returns:
+            {"organism_tags": [...], "organism_keys": [...], "condition_tags": [...]},
+            most mentioned first; `organism_keys` are the tags case-folded for filtering
+        """
+        organisms, conditions = self.counts(text)
+        organism_tags = [name for name, _ in organisms.most_common()]
+        return {
+            "organism_tags": organism_tags,
+            "organism_keys": [organism_key(name) for name in organism_tags],
+            "condition_tags": [key for key, _ in conditions.most_common()],
+        }
+
+    def infer(self, text: str) -> Dict[str, str]:
+        """
+        Pick the main organism and condition of a document
+
+        Args:
+            text: Leading part of the document (title, abstract)
+
+        Returns:
+            Dictionary with "organism_name", "condition" and "condition_key"
+        """
+        organisms, conditions = self.counts(text)
+        key = conditions.most_common(1)[0][0] if conditions else UNSPECIFIED_KEY
+        return {
+            "organism_name": organisms.most_common(1)[0][0] if organisms else "Unknown",
+            "condition": key.replace("_", " ") if conditions else "Not specified",
+            "condition_key": key
+        }
+
+    def canonical_organism(self, organism: Optional[str]) -> Optional[str]:
+        """
+        Map an organism filter (name or alias, any case) to the canonical name used in tags
+
+        Returns:
+            Canonical name, the stripped input if it is not in the dictionary, or None for no filter
+        """
+        if not organism or not organism.strip():
+            return None
+        return self.organism_names.get(compact_name(organism), organism.strip())
+
+
+# Shared instance; compiling the pattern once is the expensive part
+default_tagger = Tagger()
+
+
+def organism_filter(organism: str) -> Dict[str, Any]:
+    """
+    Build the MongoDB filter for chunks mentioning an organism
+
+    Matches the case-folded `organism_keys` (multikey index), the same way the
+    in-memory index compares names, so both retrieval paths agree.
+
+    Args:
+        organism: Organism name or alias from a request
+
+    Returns:
+        MongoDB filter
+    """
+    return {"organism_keys": organism_key(default_tagger.canonical_organism(organism))}
@@ -0,0 +1,59 @@
+"""
+IVF recall under rare filters, checked against the exact index
+
+Run from backend/: python -m pytest -q test_vector_index.py
+"""
+
+import numpy as np
+import pytest
+
+from vector_index import IVFIndex, VectorIndex
+
+ROWS = 6000
+DIMENSION = 32
+LIMIT = 5
+QUERIES = 100
+
+
+@pytest.fixture(scope="module")
+def indexes():
+    """
+    Clustered synthetic rows where "hypoxia" and "Danio rerio" tag 0.5% and 0.2% of them
+    """
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(40, DIMENSION))
+    matrix = centers[rng.integers(0, len(centers), ROWS)] + 0.5 * rng.normal(size=(ROWS, DIMENSION))
+    matrix = (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+    conditions = np.where(rng.random(ROWS) < 0.005, "hypoxia", "microgravity")
+    tags = [["Danio rerio"] if rng.random() < 0.002 else ["Escherichia coli"] for _ in range(ROWS)]
+    exact = VectorIndex(list(range(ROWS)), matrix, list(conditions), tags)
+    return exact, IVFIndex.build(exact, nprobe=8)
+
+
+def recall(exact: VectorIndex, ivf: IVFIndex, **filters) -> float:
+    """
+    Mean share of the exact top hits the IVF index also returns; every query must return LIMIT hits
+    """
+    rng = np.random.default_rng(1)
+    shares = []
+    for _ in range(QUERIES):
+        query = rng.normal(size=DIMENSION)
+        expected = {doc_id for doc_id, _ in exact.search(query, LIMIT, **filters)}
+        found = {doc_id for doc_id, _ in ivf.search(query, LIMIT, **filters)}
+        assert len(found) == LIMIT
+        shares.append(len(found & expected) / len(expected))
+    return float(np.mean(shares))
+
+
+def test_rare_condition_recall(indexes):
+    # The partition is smaller than the probed lists, so it is scanned exactly
+    assert recall(*indexes, condition="hypoxia") == 1.0
+
+
+def test_rare_organism_recall(indexes):
+    # Few rows are tagged, so they are scanned exactly
+    assert recall(*indexes, organism="zebrafish") == 1.0
+
+
+def test_common_filter_recall(indexes):
+    assert recall(*indexes, condition="microgravity", organism="E. coli") >= 0.6
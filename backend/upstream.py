@@ -0,0 +1,302 @@
+"""
+Shared upstream (OpenAI-compatible API) client layer
+
+The API and the ingestion pipeline both talk to the same embedding and chat
+endpoints. This module builds their clients with one configuration: a sized,
+keep-alive connection pool and explicit timeouts, with the SDK's own retries
+turned off so retries are decided here.
+
+`UpstreamCaller` wraps idempotent calls (embeddings) with a per-call deadline
+and jittered exponential backoff. It can also hedge: once enough latencies
+have been observed, a call still running after the `HEDGE_QUANTILE` latency
+(p95 by default) gets a duplicate request, and whichever answers first wins.
+This trims the slow tail at the cost of a few percent more requests.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import httpx
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+UPSTREAM_BASE_URL = os.getenv("AIMLAPI_BASE_URL", "https://api.aimlapi.com/v1")
+
+# Connection pool shared by all calls of one client
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+
+# Transport timeouts in seconds; the read timeout also bounds LLM and ingestion calls
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "60"))
+
+# Query embeddings: total deadline across attempts, retries and backoff
+EMBEDDING_DEADLINE = float(os.getenv("EMBEDDING_DEADLINE", "10"))
+EMBEDDING_RETRIES = int(os.getenv("EMBEDDING_RETRIES", "2"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.2"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "2"))
+
+# Hedged embedding requests
+HEDGE_EMBEDDINGS = os.getenv("HEDGE_EMBEDDINGS", "false").lower() == "true"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "50"))
+
+# Ingestion embeds large batches; it retries longer and has no deadline of its own
+INGEST_EMBEDDING_RETRIES = int(os.getenv("INGEST_EMBEDDING_RETRIES", "5"))
+
+
+def connection_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+
+
+def transport_timeout() -> httpx.Timeout:
+    return httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT)
+
+
+def create_async_client(base_url: str = None, api_key: str = None) -> AsyncOpenAI:
+    """
+    Build the API's async client on a pooled keep-alive transport
+
+    Args:
+        base_url: API base URL, defaults to AIMLAPI_BASE_URL
+        api_key: API key, defaults to AIMLAPI_KEY
+
+    Returns:
+        AsyncOpenAI client with SDK retries disabled
+    """
+    return AsyncOpenAI(
+        base_url=base_url or UPSTREAM_BASE_URL,
+        api_key=api_key or os.getenv("AIMLAPI_KEY"),
+        http_client=httpx.AsyncClient(limits=connection_limits(), timeout=transport_timeout()),
+        timeout=transport_timeout(),
+        max_retries=0,
+    )
+
+
+def create_client(base_url: str = None, api_key: str = None) -> OpenAI:
+    """
+    Build a synchronous client (ingestion) with the same pool and timeouts
+
+    Args:
+        base_url: API base URL, defaults to AIMLAPI_BASE_URL
+        api_key: API key, defaults to AIMLAPI_KEY
+
+    Returns:
+        OpenAI client with SDK retries disabled
+    """
+    return OpenAI(
+        base_url=base_url or UPSTREAM_BASE_URL,
+        api_key=api_key or os.getenv("AIMLAPI_KEY"),
+        http_client=httpx.Client(limits=connection_limits(), timeout=transport_timeout()),
+        timeout=transport_timeout(),
+        max_retries=0,
+    )
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether a failed call may succeed if repeated: timeouts, connection errors, 408, 409, 429 and 5xx
+    """
+    if isinstance(error, (APITimeoutError, APIConnectionError, asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int, base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY) -> float:
+    """
+    Full-jitter exponential backoff: uniform in [0, min(max_delay, base_delay * 2^attempt)]
+
+    Jitter keeps clients that failed together from retrying in lockstep.
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry_call(call: Callable[[], T], retries: int = INGEST_EMBEDDING_RETRIES, name: str = "upstream call") -> T:
+    """
+    Run a blocking idempotent call, retrying retryable errors with jittered backoff
+
+    Args:
+        call: Makes the call
+        retries: Retries after the first attempt
+        name: Used in log messages
+
+    Returns:
+        Result of the first successful attempt
+    """
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{name} failed ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 1000):
+        """
+        Keep the latencies of the last `window` successful calls
+
+        Args:
+            window: Number of samples kept
+        """
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Latency quantile in seconds, or None before any samples
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class UpstreamCaller:
+    def __init__(self, name: str, deadline: float = EMBEDDING_DEADLINE, retries: int = EMBEDDING_RETRIES,
+                 hedge: bool = HEDGE_EMBEDDINGS, hedge_quantile: float = HEDGE_QUANTILE,
+                 hedge_min_samples: int = HEDGE_MIN_SAMPLES):
+        """
+        Deadline, retry and hedging policy for one kind of idempotent call
+
+        Args:
+            name: Used in logs and stats
+            deadline: Seconds allowed for the whole call, including retries
+            retries: Retries after the first attempt
+            hedge: Send a duplicate request when an attempt outlives the hedge threshold
+            hedge_quantile: Latency quantile used as the hedge threshold
+            hedge_min_samples: Latencies observed before hedging starts
+        """
+        self.name = name
+        self.deadline = deadline
+        self.retries = retries
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies = LatencyTracker()
+
+        self.calls = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+        self.failures = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Seconds to wait before hedging, or None when hedging is off or there are too few samples
+        """
+        if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return self.latencies.quantile(self.hedge_quantile)
+
+    async def attempt(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        """
+        One attempt, hedged with a duplicate request if it runs past the hedge threshold
+        """
+        start = time.monotonic()
+        tasks = [asyncio.ensure_future(make_call())]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self.hedged += 1
+                    tasks.append(asyncio.ensure_future(make_call()))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.hedge_wins += 1
+                        self.latencies.record(time.monotonic() - start)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The losing request (or both, if the deadline cancelled us) is abandoned
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run an idempotent call within the deadline, retrying retryable errors
+
+        Args:
+            make_call: Starts one request when called
+
+        Returns:
+            Result of the first successful request
+
+        Raises:
+            asyncio.TimeoutError: The deadline passed
+            Exception: The last error, if it is not retryable or retries ran out
+        """
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(self.attempt(make_call), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                self.deadline_exceeded += 1
+                logger.warning(f"{self.name} exceeded its {self.deadline:g}s deadline")
+                raise
+            except Exception as e:
+                delay = backoff_delay(attempt)
+                if attempt >= self.retries or not is_retryable(e) or time.monotonic() + delay >= deadline:
+                    self.failures += 1
+                    raise
+                logger.warning(f"{self.name} failed ({e}), retrying in {delay:.2f}s")
+                self.retried += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Call, retry and hedge counters with the current latency quantiles
+        """
+        p50 = self.latencies.quantile(0.5)
+        p95 = self.latencies.quantile(0.95)
+        return {
+            "calls": self.calls,
+            "retried": self.retried,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "deadline_exceeded": self.deadline_exceeded,
+            "failures": self.failures,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedge_enabled": self.hedge,
+        }
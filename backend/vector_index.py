@@ -0,0 +1,950 @@
+"""
+In-memory vector index for chunk retrieval
+
+Loads every chunk embedding from MongoDB once into a contiguous, pre-normalized
+float32 matrix so a query is answered with a single matrix-vector product
+instead of a per-document `$reduce` inside an aggregation pipeline.
+
+`IVFIndex` adds an inverted-file approximate search on top: rows are clustered
+with spherical k-means and a query only scores the `nprobe` closest clusters.
+Both index types can be saved to and loaded from a single `.npz` file, which the
+ingestion pipeline writes and the API loads at startup.
+
+Either index can also search in two stages. text-embedding-3-large vectors are
+trained so that a truncated, renormalized prefix is still a usable embedding, so
+a coarse scan over the first `PREFIX_DIMS` dimensions picks candidates cheaply
+and only those are rescored with the full vectors.
+"""
+
+import logging
+import math
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from bson import ObjectId
+
+from conditions import condition_filter, condition_key, matching_keys
+from corpus import COMMITTED_CHUNKS
+from embedding_codec import EMBEDDING_FIELDS, HAS_EMBEDDING_QUERY, decode_embedding
+from tagger import default_tagger, organism_filter, organism_key
+
+logger = logging.getLogger(__name__)
+
+# Where the ingestion pipeline saves the index and the API loads it from
+DEFAULT_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", str(Path(__file__).parent / "vector_index.npz"))
+
+# Below this many chunks an exact scan is cheap enough that IVF is not worth building
+ANN_MIN_CHUNKS = int(os.getenv("ANN_MIN_CHUNKS", "5000"))
+
+# Two-stage (Matryoshka) search: scan a truncated prefix of every vector, then
+# rescore the best candidates with full vectors. 0 disables the coarse stage.
+PREFIX_DIMS = int(os.getenv("MATRYOSHKA_DIMS", "0"))
+RESCORE_CANDIDATES = int(os.getenv("MATRYOSHKA_CANDIDATES", "300"))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize the rows of a matrix in place
+
+    Args:
+        matrix: 2-D float32 array
+
+    Returns:
+        The same array, normalized
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def normalize_vector(vector: List[float]) -> np.ndarray:
+    """
+    Convert a query embedding to a normalized float32 vector
+
+    Args:
+        vector: Embedding as returned by the embedding API
+
+    Returns:
+        Unit-length float32 vector
+    """
+    query = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    if norm > 0:
+        query = query / norm
+    return query
+
+
+def top_k(scores: np.ndarray, limit: int) -> np.ndarray:
+    """
+    Return the positions of the `limit` highest scores, best first
+
+    Args:
+        scores: 1-D array of similarity scores
+        limit: Number of positions to return
+
+    Returns:
+        Array of positions into `scores`
+    """
+    if limit <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if limit >= scores.size:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, limit - 1)[:limit]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+# Rows to score: None for every row, a slice for a contiguous block, or an array of row positions
+Rows = Union[None, slice, np.ndarray]
+
+
+def row_count(rows: Rows, total: int) -> int:
+    """
+    Number of rows selected out of `total`
+    """
+    if rows is None:
+        return total
+    if isinstance(rows, slice):
+        return rows.stop - rows.start
+    return rows.size
+
+
+def take_rows(matrix: np.ndarray, rows: Rows) -> np.ndarray:
+    """
+    Select rows of a matrix; slices are views, arrays copy
+    """
+    return matrix if rows is None else matrix[rows]
+
+
+def row_positions(rows: Rows, positions: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Map positions within selected rows back to matrix rows
+
+    Args:
+        rows: Selected rows (not None)
+        positions: Positions within the selection, or None for all of them
+
+    Returns:
+        Row positions in the matrix
+    """
+    if isinstance(rows, slice):
+        return np.arange(rows.start, rows.stop) if positions is None else positions + rows.start
+    return rows if positions is None else rows[positions]
+
+
+def restrict_rows(rows: Rows, tagged: np.ndarray) -> np.ndarray:
+    """
+    Keep only the selected rows that are also in `tagged`
+
+    Args:
+        rows: Selected rows
+        tagged: Sorted row positions
+
+    Returns:
+        Row positions, in the order of `rows`
+    """
+    if rows is None:
+        return tagged
+    if isinstance(rows, slice):
+        return tagged[np.searchsorted(tagged, rows.start):np.searchsorted(tagged, rows.stop)]
+    return rows[np.isin(rows, tagged)]
+
+
+def build_tag_rows(tags: List[List[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Invert per-row tag lists into sorted row lists per tag (CSR layout)
+
+    Args:
+        tags: Tags of each row
+
+    Returns:
+        (values, offsets, rows): rows tagged `values[i]` are `rows[offsets[i]:offsets[i + 1]]`, ascending
+    """
+    pairs = [(str(tag), row) for row, row_tags in enumerate(tags) for tag in set(row_tags or [])]
+    if not pairs:
+        return np.empty(0, dtype=str), np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pairs.sort()
+    values, counts = np.unique(np.array([tag for tag, _ in pairs], dtype=str), return_counts=True)
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    return values, offsets, np.array([row for _, row in pairs], dtype=np.int64)
+
+
+def tag_lists(values: np.ndarray, offsets: np.ndarray, rows: np.ndarray, row_total: int) -> List[List[str]]:
+    """
+    Turn a CSR tag layout from `build_tag_rows` back into per-row tag lists
+    """
+    tags: List[List[str]] = [[] for _ in range(row_total)]
+    for code, value in enumerate(values):
+        for row in rows[offsets[code]:offsets[code + 1]]:
+            tags[row].append(str(value))
+    return tags
+
+
+DEFAULT_PIPELINE_PROJECTION = {
+    "_id": 1,
+    "organism_name": 1,
+    "condition": 1,
+    "description": 1,
+    "scientific_details": 1,
+    "content": 1
+}
+
+
+def aggregation_similarity_pipeline(query_embedding: List[float], condition: Optional[str] = None, limit: int = 5,
+                                    organism: Optional[str] = None,
+                                    projection: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Build the MongoDB aggregation pipeline that scores every document server-side
+
+    This is the original retrieval strategy. It is kept as a fallback when the
+    in-memory index is unavailable and as the baseline for benchmarks.
+
+    Args:
+        query_embedding: Query vector
+        condition: Optional condition filter (see `conditions.condition_filter`)
+        limit: Number of documents to return
+        organism: Optional organism filter on the indexed per-chunk tags
+        projection: Fields to return besides `similarity`; never include the embedding
+
+    Returns:
+        Aggregation pipeline
+    """
+    # Only array embeddings can be scored server-side (see embedding_codec)
+    match: Dict[str, Any] = {"embedding": {"$exists": True}, **COMMITTED_CHUNKS}
+
+    # Add condition filter if provided
+    if condition:
+        match.update(condition_filter(condition))
+    if organism:
+        match.update(organism_filter(organism))
+
+    pipeline = [{"$match": match}]
+
+    pipeline.extend([
+        {
+            "$addFields": {
+                "similarity": {
+                    "$reduce": {
+                        "input": {"$range": [0, {"$size": "$embedding"}]},
+                        "initialValue": 0,
+                        "in": {
+                            "$add": [
+                                "$$value",
+                                {
+                                    "$multiply": [
+                                        {"$arrayElemAt": ["$embedding", "$$this"]},
+                                        {"$arrayElemAt": [query_embedding, "$$this"]}
+                                    ]
+                                }
+                            ]
+                        }
+                    }
+                }
+            }
+        },
+        {"$sort": {"similarity": -1}},
+        {"$limit": limit},
+        {
+            "$project": {**(projection or DEFAULT_PIPELINE_PROJECTION), "similarity": 1}
+        }
+    ])
+
+    return pipeline
+
+
+class VectorIndex:
+    def __init__(self, ids: List[Any], matrix: np.ndarray, conditions: List[str],
+                 organism_tags: Optional[List[List[str]]] = None):
+        """
+        Initialize vector index
+
+        Args:
+            ids: Document `_id` for each row of the matrix
+            matrix: (n, dim) float32 matrix of normalized embeddings
+            conditions: Condition label for each row
+            organism_tags: Organisms mentioned in each row's chunk, if tagged
+        """
+        if len(ids) != matrix.shape[0] or len(conditions) != matrix.shape[0]:
+            raise ValueError("ids, matrix rows and conditions must have the same length")
+
+        self.ids = np.asarray(ids, dtype=object)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+        # Store canonical condition keys as integer codes; the rows of each key form a partition
+        labels, label_codes = np.unique(np.asarray(conditions, dtype=object).astype(str), return_inverse=True)
+        keys = np.array([condition_key(label) for label in labels], dtype=str)
+        self.condition_values, key_codes = np.unique(keys, return_inverse=True)
+        self.condition_codes = key_codes[label_codes].astype(np.int32)
+        self.condition_lookup = {str(value): code for code, value in enumerate(self.condition_values)}
+        self.partitions = self.build_partitions()
+
+        # Organism filters intersect the candidate rows with the sorted rows of the organism
+        self.organism_values, self.organism_offsets, self.organism_rows = build_tag_rows(
+            organism_tags if organism_tags is not None else [[] for _ in ids]
+        )
+        self.organism_lookup = {organism_key(str(value)): code for code, value in enumerate(self.organism_values)}
+
+        # Row of each document id, built on first use by `vectors`
+        self.row_lookup: Optional[Dict[Any, int]] = None
+
+        # Two-stage search is off until `set_prefix` is called
+        self.prefix_dims = 0
+        self.prefix_matrix: Optional[np.ndarray] = None
+        self.rescore_candidates = RESCORE_CANDIDATES
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1]
+
+    @classmethod
+    def from_collection(cls, collection, batch_size: int = 1000) -> "VectorIndex":
+        """
+        Load every committed chunk embedding from a MongoDB collection
+
+        Embeddings may be stored in any format from `embedding_codec`. Rows are
+        grouped by condition key so filtered searches scan a contiguous block.
+
+        Args:
+            collection: pymongo collection holding chunk documents
+            batch_size: Cursor batch size
+
+        Returns:
+            Loaded VectorIndex
+        """
+        start_time = time.perf_counter()
+        query = {**HAS_EMBEDDING_QUERY, **COMMITTED_CHUNKS}
+        expected = collection.count_documents(query)
+
+        ids: List[Any] = []
+        conditions: List[str] = []
+        organism_tags: List[List[str]] = []
+        matrix: Optional[np.ndarray] = None
+        row = 0
+
+        projection = {field: 1 for field in EMBEDDING_FIELDS}
+        projection.update({"condition": 1, "condition_key": 1, "organism_tags": 1})
+        cursor = collection.find(query, projection).batch_size(batch_size)
+        for document in cursor:
+            embedding = decode_embedding(document)
+            if embedding is None or embedding.size == 0:
+                continue
+
+            if matrix is None:
+                matrix = np.empty((max(expected, 1), len(embedding)), dtype=np.float32)
+            elif len(embedding) != matrix.shape[1]:
+                logger.warning(f"Skipping document {document['_id']}: embedding has {len(embedding)} dimensions, expected {matrix.shape[1]}")
+                continue
+
+            # Grow if documents were inserted after counting
+            if row >= matrix.shape[0]:
+                matrix = np.resize(matrix, (matrix.shape[0] * 2, matrix.shape[1]))
+
+            matrix[row] = embedding
+            ids.append(document["_id"])
+            conditions.append(document.get("condition_key") or condition_key(document.get("condition")))
+            organism_tags.append(document.get("organism_tags") or [])
+            row += 1
+
+        if matrix is None:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        else:
+            # Group rows by condition so each condition is one contiguous block of the matrix
+            order = np.argsort(np.asarray(conditions, dtype=str), kind="stable")
+            matrix = normalize_rows(matrix[:row][order])
+            ids = [ids[i] for i in order]
+            conditions = [conditions[i] for i in order]
+            organism_tags = [organism_tags[i] for i in order]
+
+        index = cls(ids, matrix, conditions, organism_tags)
+        logger.info(f"Loaded vector index with {len(index)} chunks in {time.perf_counter() - start_time:.2f}s")
+        return index
+
+    def set_prefix(self, dims: int, candidates: int = RESCORE_CANDIDATES, prefix_matrix: Optional[np.ndarray] = None):
+        """
+        Enable or disable two-stage search
+
+        Args:
+            dims: Prefix dimensions scanned in the coarse stage; 0 (or the full
+                dimension) disables two-stage search
+            candidates: Rows kept by the coarse stage and rescored with full vectors
+            prefix_matrix: Precomputed normalized prefix rows, derived from the
+                matrix when not given
+        """
+        self.rescore_candidates = candidates
+        if dims <= 0 or dims >= self.dimension:
+            self.prefix_dims = 0
+            self.prefix_matrix = None
+            return
+        if prefix_matrix is None:
+            if dims == self.prefix_dims:
+                return
+            prefix_matrix = normalize_rows(self.matrix[:, :dims].copy())
+        self.prefix_dims = dims
+        self.prefix_matrix = np.ascontiguousarray(prefix_matrix, dtype=np.float32)
+
+    def shortlist_size(self, row_count: int, limit: int) -> int:
+        """
+        Number of coarse candidates to rescore, or 0 to score rows directly
+
+        Args:
+            row_count: Rows that would otherwise be scored with full vectors
+            limit: Number of results requested
+        """
+        if self.prefix_matrix is None:
+            return 0
+        size = max(self.rescore_candidates, limit)
+        return size if row_count > size else 0
+
+    def rescore(self, query: np.ndarray, rows: Rows, limit: int) -> List[Tuple[Any, float]]:
+        """
+        Score rows with full vectors and return the best hits
+
+        Args:
+            query: Normalized query vector
+            rows: Rows to score (see `Rows`)
+            limit: Number of results
+
+        Returns:
+            List of (document id, cosine similarity), best first
+        """
+        scores = take_rows(self.matrix, rows) @ query
+        positions = top_k(scores, limit)
+        ids = positions if rows is None else row_positions(rows, positions)
+        return [(self.ids[i], float(scores[p])) for i, p in zip(ids, positions)]
+
+    def build_partitions(self) -> List[Rows]:
+        """
+        Rows of each condition code
+
+        Rows loaded with `from_collection` are grouped by condition, so each
+        partition is a slice and scoring it uses a view of the matrix instead
+        of copying rows out.
+
+        Returns:
+            Slice (contiguous rows) or row array for each condition code
+        """
+        order = np.argsort(self.condition_codes, kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(self.condition_codes, minlength=len(self.condition_values)))))
+        partitions: List[Rows] = []
+        for code in range(len(self.condition_values)):
+            rows = order[bounds[code]:bounds[code + 1]]
+            if rows.size and rows[-1] - rows[0] + 1 == rows.size:
+                partitions.append(slice(int(rows[0]), int(rows[-1]) + 1))
+            else:
+                partitions.append(rows)
+        return partitions
+
+    def matching_codes(self, condition: Optional[str]) -> Optional[List[int]]:
+        """
+        Resolve a condition filter to condition codes
+
+        Args:
+            condition: Condition filter, or None for no filter
+
+        Returns:
+            Matching codes (see `conditions.matching_keys`), or None when no filter applies
+        """
+        if not condition:
+            return None
+        return [self.condition_lookup[key] for key in matching_keys(condition, self.condition_lookup)]
+
+    def condition_mask(self, condition: Optional[str]) -> Optional[np.ndarray]:
+        """
+        Build a boolean row mask for a condition filter
+
+        Args:
+            condition: Condition filter, or None for no filter
+
+        Returns:
+            Boolean mask over rows, or None when no filter applies
+        """
+        codes = self.matching_codes(condition)
+        if codes is None:
+            return None
+        return np.isin(self.condition_codes, codes)
+
+    def tagged_rows(self, organism: Optional[str]) -> Optional[np.ndarray]:
+        """
+        Rows whose chunk mentions an organism
+
+        Args:
+            organism: Organism name or alias, or None for no filter
+
+        Returns:
+            Sorted row positions, or None when no filter applies
+        """
+        name = default_tagger.canonical_organism(organism)
+        if name is None:
+            return None
+        code = self.organism_lookup.get(organism_key(name))
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return self.organism_rows[self.organism_offsets[code]:self.organism_offsets[code + 1]]
+
+    def condition_rows(self, condition: Optional[str]) -> Rows:
+        """
+        Rows of the partitions matching a condition filter
+        """
+        codes = self.matching_codes(condition)
+        if codes is None:
+            return None
+        if len(codes) == 1:
+            return self.partitions[codes[0]]
+        if not codes:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([row_positions(self.partitions[code], None) for code in codes])
+
+    def candidate_rows(self, query: np.ndarray, condition: Optional[str] = None, organism: Optional[str] = None,
+                       limit: int = 1) -> Rows:
+        """
+        Select the rows to score for a query
+
+        Args:
+            query: Normalized query vector
+            condition: Optional condition filter
+            organism: Optional organism filter
+            limit: Number of results wanted; approximate indexes select at least
+                this many rows when the filters allow it
+
+        Returns:
+            Rows to score: None for every row, a slice or an array of row positions
+        """
+        rows = self.condition_rows(condition)
+        tagged = self.tagged_rows(organism)
+        return rows if tagged is None else restrict_rows(rows, tagged)
+
+    def search(self, query_embedding: List[float], limit: int = 5, condition: Optional[str] = None,
+               organism: Optional[str] = None) -> List[Tuple[Any, float]]:
+        """
+        Find the chunks most similar to a query embedding
+
+        Args:
+            query_embedding: Query vector
+            limit: Number of results
+            condition: Optional condition filter
+            organism: Optional organism filter (chunks tagged with the organism)
+
+        Returns:
+            List of (document id, cosine similarity), best first
+        """
+        if len(self) == 0:
+            return []
+
+        query = normalize_vector(query_embedding)
+        if query.shape[0] != self.dimension:
+            raise ValueError(f"Query has {query.shape[0]} dimensions, index has {self.dimension}")
+
+        rows = self.candidate_rows(query, condition, organism, limit)
+        shortlist_size = self.shortlist_size(row_count(rows, len(self)), limit)
+        if shortlist_size:
+            # Coarse stage over the prefix, then full vectors for the shortlist only
+            prefix_query = normalize_vector(query[:self.prefix_dims])
+            shortlist = top_k(take_rows(self.prefix_matrix, rows) @ prefix_query, shortlist_size)
+            rows = shortlist if rows is None else row_positions(rows, shortlist)
+
+        return self.rescore(query, rows, limit)
+
+    def search_batch(self, query_embeddings: List[List[float]], limit: int = 5,
+                     conditions: Optional[List[Optional[str]]] = None,
+                     block_size: int = 64,
+                     organisms: Optional[List[Optional[str]]] = None) -> List[List[Tuple[Any, float]]]:
+        """
+        Search many queries at once with matrix-matrix products
+
+        Queries sharing condition and organism filters are scored together
+        against the same rows; `block_size` bounds the (rows, queries) score matrix.
+
+        Args:
+            query_embeddings: Query vectors
+            limit: Number of results per query
+            conditions: Optional condition filter per query
+            block_size: Queries scored per matmul
+            organisms: Optional organism filter per query
+
+        Returns:
+            Hits for each query, in input order
+        """
+        if conditions is None:
+            conditions = [None] * len(query_embeddings)
+        if organisms is None:
+            organisms = [None] * len(query_embeddings)
+        results: List[List[Tuple[Any, float]]] = [[] for _ in query_embeddings]
+        if len(self) == 0 or not query_embeddings:
+            return results
+
+        queries = np.stack([normalize_vector(q) for q in query_embeddings])
+        if queries.shape[1] != self.dimension:
+            raise ValueError(f"Queries have {queries.shape[1]} dimensions, index has {self.dimension}")
+
+        groups: Dict[Tuple[Optional[str], Optional[str]], List[int]] = {}
+        for position, (condition, organism) in enumerate(zip(conditions, organisms)):
+            groups.setdefault((condition or None, organism or None), []).append(position)
+
+        for (condition, organism), positions in groups.items():
+            rows = VectorIndex.candidate_rows(self, None, condition, organism)
+            shortlist_size = self.shortlist_size(row_count(rows, len(self)), limit)
+            if shortlist_size:
+                matrix = take_rows(self.prefix_matrix, rows)
+                block_queries = normalize_rows(queries[:, :self.prefix_dims].copy())
+            else:
+                matrix = take_rows(self.matrix, rows)
+                block_queries = queries
+
+            for block_start in range(0, len(positions), block_size):
+                block = positions[block_start:block_start + block_size]
+                scores = matrix @ block_queries[block].T
+                for column, position in enumerate(block):
+                    column_scores = scores[:, column]
+                    if shortlist_size:
+                        shortlist = top_k(column_scores, shortlist_size)
+                        results[position] = self.rescore(
+                            queries[position], shortlist if rows is None else row_positions(rows, shortlist), limit
+                        )
+                        continue
+                    best = top_k(column_scores, limit)
+                    ids = best if rows is None else row_positions(rows, best)
+                    results[position] = [(self.ids[i], float(column_scores[b])) for i, b in zip(ids, best)]
+
+        return results
+
+    def vectors(self, ids: List[Any]) -> Optional[np.ndarray]:
+        """
+        Normalized embeddings of documents by `_id`
+
+        Args:
+            ids: Document ids
+
+        Returns:
+            (len(ids), dim) array, or None if any id is not in the index
+        """
+        if self.row_lookup is None:
+            self.row_lookup = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        rows = [self.row_lookup.get(doc_id) for doc_id in ids]
+        if any(row is None for row in rows):
+            return None
+        return self.matrix[rows]
+
+    def conditions(self) -> np.ndarray:
+        """
+        Condition label for each row
+        """
+        return self.condition_values[self.condition_codes]
+
+    def organism_tags(self) -> List[List[str]]:
+        """
+        Organism tags of each row
+        """
+        return tag_lists(self.organism_values, self.organism_offsets, self.organism_rows, len(self))
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Arrays that fully describe this index, for saving
+        """
+        arrays = {
+            "kind": np.array("exact"),
+            "ids": np.array([str(doc_id) for doc_id in self.ids]),
+            "matrix": self.matrix,
+            "conditions": self.conditions().astype(str),
+            "organism_values": self.organism_values.astype(str),
+            "organism_offsets": self.organism_offsets,
+            "organism_rows": self.organism_rows,
+        }
+        if self.prefix_matrix is not None:
+            arrays.update({
+                "prefix_matrix": self.prefix_matrix,
+                "rescore_candidates": np.array(self.rescore_candidates),
+            })
+        return arrays
+
+    def save(self, path: str = DEFAULT_INDEX_PATH):
+        """
+        Save the index to an `.npz` file
+
+        The file is written under a temporary name and renamed into place so a
+        running API never loads a half-written index.
+
+        Args:
+            path: Destination path
+        """
+        path = Path(path)
+        temp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(temp_path, **self.arrays())
+        os.replace(temp_path, path)
+        logger.info(f"Saved {type(self).__name__} with {len(self)} chunks to {path}")
+
+
+class IVFIndex(VectorIndex):
+    def __init__(self, ids: List[Any], matrix: np.ndarray, conditions: List[str],
+                 centroids: np.ndarray, list_offsets: np.ndarray, nprobe: int = 8,
+                 organism_tags: Optional[List[List[str]]] = None):
+        """
+        Initialize inverted-file index
+
+        Rows must already be grouped by list: rows of list `i` are
+        `list_offsets[i]:list_offsets[i + 1]`.
+
+        Args:
+            ids: Document `_id` for each row
+            matrix: (n, dim) float32 matrix of normalized embeddings, grouped by list
+            conditions: Condition label for each row
+            centroids: (n_lists, dim) normalized list centroids
+            list_offsets: (n_lists + 1,) row offsets of each list
+            nprobe: Number of lists scanned per query (recall/latency trade-off)
+            organism_tags: Organisms mentioned in each row's chunk, if tagged
+        """
+        super().__init__(ids, matrix, conditions, organism_tags)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.nprobe = nprobe
+
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, index: VectorIndex, n_lists: Optional[int] = None, iterations: int = 10,
+              nprobe: int = 8, seed: int = 0) -> "IVFIndex":
+        """
+        Cluster an exact index into an inverted-file index
+
+        Args:
+            index: Exact index to cluster
+            n_lists: Number of lists, defaults to 4 * sqrt(n)
+            iterations: k-means iterations
+            nprobe: Default number of lists scanned per query
+            seed: Random seed for k-means initialization
+
+        Returns:
+            Built IVFIndex
+        """
+        start_time = time.perf_counter()
+        if n_lists is None:
+            n_lists = int(4 * math.sqrt(len(index)))
+        n_lists = max(1, min(n_lists, len(index)))
+
+        centroids = spherical_kmeans(index.matrix, n_lists, iterations=iterations, seed=seed)
+        assignments = assign_to_centroids(index.matrix, centroids)
+
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+        list_offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        organism_tags = index.organism_tags()
+        ivf = cls(index.ids[order], index.matrix[order], index.conditions()[order],
+                  centroids, list_offsets, nprobe=nprobe,
+                  organism_tags=[organism_tags[i] for i in order])
+        logger.info(f"Built IVF index with {n_lists} lists over {len(ivf)} chunks in {time.perf_counter() - start_time:.2f}s")
+        return ivf
+
+    def list_rows(self, lists: np.ndarray) -> np.ndarray:
+        """
+        Row positions of the given inverted lists
+        """
+        if len(lists) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([
+            np.arange(self.list_offsets[i], self.list_offsets[i + 1]) for i in lists
+        ])
+
+    def probe_size(self) -> int:
+        """
+        Rows scanned by an unfiltered query on average: `nprobe` lists of mean size
+        """
+        return -(-len(self) * self.nprobe // self.n_lists)
+
+    def candidate_rows(self, query: np.ndarray, condition: Optional[str] = None, organism: Optional[str] = None,
+                       limit: int = 1) -> Rows:
+        """
+        Select the rows of the `nprobe` lists closest to the query
+
+        A condition partition or tagged organism rows no bigger than the probed
+        lists would be are scanned exactly. Otherwise the probed rows are filtered and, while fewer
+        than `limit` pass, the next closest lists are probed too (doubling the
+        probe count each round), so filtered queries still fill their results.
+        """
+        if self.nprobe >= self.n_lists:
+            return super().candidate_rows(query, condition, organism, limit)
+
+        codes = self.matching_codes(condition)
+        tagged = self.tagged_rows(organism)
+        if codes is not None:
+            partition = self.condition_rows(condition)
+            if row_count(partition, len(self)) <= self.probe_size():
+                # Usually a slice, scored as a view of the matrix
+                return partition if tagged is None else restrict_rows(partition, tagged)
+        if tagged is not None and tagged.size <= self.probe_size():
+            if codes is None:
+                return tagged
+            return tagged[np.isin(self.condition_codes[tagged], codes)]
+        list_scores = self.centroids @ query
+        if codes is None and tagged is None:
+            return self.list_rows(top_k(list_scores, self.nprobe))
+
+        # Filter only the probed rows rather than building a mask over the whole index
+        order = np.argsort(-list_scores, kind="stable")
+        selected: List[np.ndarray] = []
+        found = 0
+        probed = 0
+        probe = self.nprobe
+        while probed < self.n_lists and found < max(limit, 1):
+            rows = self.list_rows(order[probed:probed + probe])
+            if codes is not None:
+                rows = rows[np.isin(self.condition_codes[rows], codes)]
+            if tagged is not None:
+                rows = restrict_rows(rows, tagged)
+            selected.append(rows)
+            found += rows.size
+            probed += probe
+            probe *= 2
+        return np.concatenate(selected)
+
+    def search_batch(self, query_embeddings: List[List[float]], limit: int = 5,
+                     conditions: Optional[List[Optional[str]]] = None,
+                     block_size: int = 64,
+                     organisms: Optional[List[Optional[str]]] = None) -> List[List[Tuple[Any, float]]]:
+        """
+        Search many queries; each probes its own lists so they are scored one by one
+        """
+        if conditions is None:
+            conditions = [None] * len(query_embeddings)
+        if organisms is None:
+            organisms = [None] * len(query_embeddings)
+        return [
+            self.search(query, limit, condition, organism)
+            for query, condition, organism in zip(query_embeddings, conditions, organisms)
+        ]
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        arrays = super().arrays()
+        arrays.update({
+            "kind": np.array("ivf"),
+            "centroids": self.centroids,
+            "list_offsets": self.list_offsets,
+            "nprobe": np.array(self.nprobe),
+        })
+        return arrays
+
+
+def assign_to_centroids(matrix: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """
+    Assign each row to its most similar centroid
+
+    Args:
+        matrix: (n, dim) normalized rows
+        centroids: (k, dim) normalized centroids
+        batch_size: Rows scored per matmul, bounds temporary memory
+
+    Returns:
+        (n,) array of centroid positions
+    """
+    assignments = np.empty(matrix.shape[0], dtype=np.int64)
+    for start in range(0, matrix.shape[0], batch_size):
+        end = start + batch_size
+        assignments[start:end] = np.argmax(matrix[start:end] @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(matrix: np.ndarray, n_clusters: int, iterations: int = 10,
+                     max_samples_per_cluster: int = 256, seed: int = 0) -> np.ndarray:
+    """
+    Cluster normalized rows by cosine similarity
+
+    Trains on a sample of at most `max_samples_per_cluster * n_clusters` rows.
+
+    Args:
+        matrix: (n, dim) normalized rows
+        n_clusters: Number of clusters
+        iterations: Lloyd iterations
+        max_samples_per_cluster: Training sample size per cluster
+        seed: Random seed
+
+    Returns:
+        (n_clusters, dim) normalized centroids
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(matrix.shape[0], max_samples_per_cluster * n_clusters)
+    if sample_size < matrix.shape[0]:
+        sample = matrix[rng.choice(matrix.shape[0], size=sample_size, replace=False)]
+    else:
+        sample = matrix
+
+    centroids = sample[rng.choice(sample.shape[0], size=n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign_to_centroids(sample, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+
+        # Sum members of each cluster with one sorted reduce instead of a Python loop
+        order = np.argsort(assignments, kind="stable")
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+
+        # Reseed empty clusters with random rows
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = sample[rng.choice(sample.shape[0], size=empty.size)]
+
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+def build_index(index: VectorIndex, n_lists: Optional[int] = None, nprobe: int = 8,
+                prefix_dims: int = PREFIX_DIMS) -> VectorIndex:
+    """
+    Build the best index type for the corpus size
+
+    Args:
+        index: Exact index loaded from the collection
+        n_lists: Number of IVF lists, defaults to 4 * sqrt(n)
+        nprobe: Default number of IVF lists scanned per query
+        prefix_dims: Prefix dimensions for two-stage search, 0 to disable
+
+    Returns:
+        IVFIndex for large corpora, otherwise the exact index
+    """
+    if len(index) < ANN_MIN_CHUNKS:
+        logger.info(f"{len(index)} chunks is below ANN_MIN_CHUNKS={ANN_MIN_CHUNKS}, keeping exact index")
+    else:
+        index = IVFIndex.build(index, n_lists=n_lists, nprobe=nprobe)
+    index.set_prefix(prefix_dims)
+    return index
+
+
+def load_index(path: str = DEFAULT_INDEX_PATH, nprobe: Optional[int] = None) -> VectorIndex:
+    """
+    Load an index saved with `VectorIndex.save`
+
+    Args:
+        path: Path to the `.npz` file
+        nprobe: Override the saved nprobe for IVF indexes
+
+    Returns:
+        Loaded VectorIndex or IVFIndex
+    """
+    start_time = time.perf_counter()
+    with np.load(path, allow_pickle=False) as data:
+        ids = [ObjectId(doc_id) if ObjectId.is_valid(doc_id) else doc_id for doc_id in data["ids"]]
+        kind = str(data["kind"])
+        organism_tags = None
+        if "organism_values" in data:
+            organism_tags = tag_lists(data["organism_values"], data["organism_offsets"], data["organism_rows"], len(ids))
+        if kind == "ivf":
+            index = IVFIndex(ids, data["matrix"], data["conditions"], data["centroids"], data["list_offsets"],
+                             nprobe=int(data["nprobe"]) if nprobe is None else nprobe, organism_tags=organism_tags)
+        else:
+            index = VectorIndex(ids, data["matrix"], data["conditions"], organism_tags)
+        if "prefix_matrix" in data:
+            prefix_matrix = data["prefix_matrix"]
+            index.set_prefix(prefix_matrix.shape[1], int(data["rescore_candidates"]), prefix_matrix)
+
+    logger.info(f"Loaded {type(index).__name__} with {len(index)} chunks from {path} in {time.perf_counter() - start_time:.2f}s")
+    return index